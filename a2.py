@@ -1,26 +1,63 @@
+import argparse
+import functools
 import shlex
+import sys
+from typing import Callable, Iterable, TextIO
+
 import game_print
 import game_logic
 
 
-def get_input_set_field() -> game_logic.GameState:
+ENGINES = ('list', 'array', 'sparse', 'parallel')
+FRAME_MODES = ('all', 'final', 'events')
+DISPLAY_MODES = ('full', *game_print.RENDER_MODES)
+
+
+def engine_class(engine: str) -> type:
+    """
+    Returns the GameState class for an engine name.
+
+    Args:
+        engine (str): 'list', 'array', 'sparse' or 'parallel'.
+
+    Returns:
+        type: The GameState class used as the engine.
+    """
+    if engine == 'array':
+        import game_array  # needs numpy, so only imported when asked for
+        return game_array.ArrayGameState
+    if engine == 'sparse':
+        import game_sparse
+        return game_sparse.SparseGameState
+    if engine == 'parallel':
+        import game_parallel  # needs numpy
+        return game_parallel.ParallelGameState
+    return game_logic.GameState
+
+
+def get_input_set_field(state_class: type = game_logic.GameState,
+                        read_line: Callable[[], str] = input) -> game_logic.GameState:
     """
     Reads input to set up the game field and returns the initial game state.
 
+    Args:
+        state_class (type, optional): The GameState class used as the engine.
+        read_line (Callable[[], str], optional): Returns the next input line.
+
     Returns:
         GameState: The initialized game state.
     """
-    rows = int(input())
-    columns = int(input())
-    field_setting = input().strip().upper()
+    rows = int(read_line())
+    columns = int(read_line())
+    field_setting = read_line().strip().upper()
 
     if field_setting == 'EMPTY':
-        game_state = game_logic.GameState()
+        game_state = state_class()
         game_state.initialize_field(rows, columns, 'EMPTY')
 
     elif field_setting == 'CONTENTS':
-        contents = [input() for _ in range(rows)]
-        game_state = game_logic.GameState()
+        contents = [read_line() for _ in range(rows)]
+        game_state = state_class()
         game_state.initialize_field(rows, columns, 'CONTENTS', contents)
 
     else:
@@ -29,51 +66,198 @@ def get_input_set_field() -> game_logic.GameState:
     return game_state
 
 
+def run_command(game_state: game_logic.GameState, command: str) -> None:
+    """
+    Applies one command line (anything but Q) to the game state.
+
+    Args:
+        game_state (GameState): The current state of the game.
+        command (str): The command line, an empty line lets time pass.
+    """
+    if command.strip() == '':
+        game_state.time_passed()
+        return
+
+    command_lst = shlex.split(command)
+
+    if command_lst[0] == 'F':
+        left_color = command_lst[1]
+        right_color = command_lst[2]
+        game_state.create_faller(left_color, right_color)
+
+    elif command_lst[0] == 'V':
+        row = int(command_lst[1])
+        column = int(command_lst[2])
+        color = command_lst[3]
+        game_state.create_virus(row, column, color)
+
+    elif command_lst[0] == 'A':
+        game_state.rotate_clockwise()
+
+    elif command_lst[0] == 'B':
+        game_state.rotate_counterclockwise()
+
+    elif command_lst[0] == '<':
+        game_state.move_left()
+
+    elif command_lst[0] == '>':
+        game_state.move_right()
+
+    elif command_lst[0] == 'D':
+        game_state.hard_drop()
+
+
+def frame_mode(value: str) -> str | int:
+    """
+    Parses the --frames option.
+
+    Args:
+        value (str): 'all', 'final', 'events' or a positive number N.
+
+    Returns:
+        str | int: The mode name, or N to render every Nth frame.
+    """
+    if value in FRAME_MODES:
+        return value
+    if value.isdigit() and int(value) > 0:
+        return int(value)
+    raise argparse.ArgumentTypeError(f"expected one of {', '.join(FRAME_MODES)} or a positive number")
+
+
+def add_config_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Adds the --match-length and --colors options, see config_from_args.
+
+    Args:
+        parser (argparse.ArgumentParser): The parser of a command that plays games.
+    """
+    parser.add_argument('--match-length', type=int, default=game_logic.DEFAULT_CONFIG.match_length,
+                        help='fewest cells of one color in a row or column that are cleared')
+    parser.add_argument('--colors', default=''.join(game_logic.DEFAULT_CONFIG.colors),
+                        help='field characters of the viruses, one per color, e.g. rbyg')
+
+
+def config_from_args(parser: argparse.ArgumentParser, args: argparse.Namespace) -> game_logic.GameConfig:
+    """
+    Args:
+        parser (argparse.ArgumentParser): The parser given to add_config_arguments, used to report errors.
+        args (argparse.Namespace): The parsed arguments.
+
+    Returns:
+        GameConfig: The rules chosen with --match-length and --colors.
+    """
+    if args.match_length < 2:
+        parser.error('--match-length must be at least 2')
+    return game_logic.GameConfig(args.match_length, tuple(args.colors.lower()))
+
+
+def stream_game(lines: Iterable[str], out: TextIO, frames: str | int = 'all',
+                state_class: type = game_logic.GameState,
+                renderer: game_print.FieldRenderer | None = None) -> None:
+    """
+    Plays a whole game from already read input lines. With frames='all' the
+    output is the same as the interactive loop; the end of the input counts as Q.
+
+    Args:
+        lines (Iterable[str]): The field header followed by the commands.
+        out (TextIO): Where the output is written.
+        frames (str | int, optional): 'all' renders every frame, N every Nth frame
+            and the last one, 'final' only the last frame, and 'events' no frames,
+            only LEVEL CLEARED (once each time the level becomes cleared) and GAME OVER.
+        state_class (type, optional): The GameState class used as the engine.
+        renderer (FieldRenderer, optional): Draws the frames as diffs instead of printing them in full.
+    """
+    lines = iter(lines)
+    game_state = get_input_set_field(state_class, lambda: next(lines))
+    frame = 0
+    cleared = False
+
+    while True:
+        game_state.test_faller_state()
+        command = next(lines, 'Q')
+        last = command.strip().upper() == 'Q'
+
+        if frames == 'events':
+            now_cleared = not game_state.detect_viruses()
+            if now_cleared and not cleared:
+                game_print.level_cleared(game_state, out)
+            cleared = now_cleared
+        elif frames == 'all' or last or (frames != 'final' and frame % frames == 0):
+            if renderer is not None:
+                renderer.render(game_state)
+            else:
+                game_print.print_field(game_state, out)
+                game_print.level_cleared(game_state, out)
+        if last:
+            break
+
+        run_command(game_state, command)
+        if game_state.game_over:  # only create_faller can end the game
+            game_state.test_faller_state()
+            if frames == 'events':
+                game_print.game_over(out)
+            elif renderer is not None:
+                renderer.render(game_state, game_over=True)
+            else:
+                game_print.print_field(game_state, out)
+                game_print.game_over(out)
+            break
+        frame += 1
+
+
 if __name__ == '__main__':
     """
     Main loop that runs the Dr. Mario game logic. It reads commands
     from the user and updates the game state until the player quits.
     """
-    game_state = get_input_set_field()
+    parser = argparse.ArgumentParser(description='Text version of Dr. Mario.')
+    parser.add_argument('--engine', choices=ENGINES, default='list',
+                        help="'array' stores the field in a NumPy array (requires numpy), "
+                             "'sparse' only the occupied cells, for large boards that are mostly empty, "
+                             "'parallel' scans large NumPy fields for matches in several processes")
+    parser.add_argument('--stream', action='store_true',
+                        help='read all input at once and buffer the output, for scripted runs')
+    parser.add_argument('--frames', type=frame_mode, default='all',
+                        help="with --stream: 'all', 'final', 'events' or N to render every Nth frame")
+    parser.add_argument('--display', choices=DISPLAY_MODES, default='full',
+                        help="'full' prints every frame, 'tty' redraws only changed cells, "
+                             "'diff' writes only changed lines and 'auto' picks tty on a terminal")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    if args.frames != 'all' and not args.stream:
+        parser.error('--frames needs --stream')
+    config = config_from_args(parser, args)
+    state_class = functools.partial(engine_class(args.engine), config=config)
+
+    if args.stream:
+        lines = sys.stdin.read().split('\n')
+        if lines[-1] == '':
+            lines.pop()  # the input ended with a newline
+        with open(sys.stdout.fileno(), 'w', buffering=1 << 20, closefd=False) as out:
+            renderer = None if args.display == 'full' else game_print.FieldRenderer(out, args.display)
+            stream_game(lines, out, args.frames, state_class, renderer)
+        sys.exit()
+
+    renderer = None if args.display == 'full' else game_print.FieldRenderer(mode=args.display)
+    game_state = get_input_set_field(state_class)
 
     while True:
         game_state.test_faller_state()
-        game_print.print_field(game_state)
-        game_print.level_cleared(game_state)
+        if renderer is not None:
+            renderer.render(game_state)
+        else:
+            game_print.print_field(game_state)
+            game_print.level_cleared(game_state)
         command = input()
         if command.strip().upper() == 'Q':
             break
 
-        if command.strip() == '':
-            game_state.time_passed()
-            continue
-
-        command_lst = shlex.split(command)
-
-        if command_lst[0] == 'F':
-            left_color = command_lst[1]
-            right_color = command_lst[2]
-            game_state.create_faller(left_color, right_color)
-            if game_state.game_over:
-                game_state.test_faller_state()
+        run_command(game_state, command)
+        if game_state.game_over:  # only create_faller can end the game
+            game_state.test_faller_state()
+            if renderer is not None:
+                renderer.render(game_state, game_over=True)
+            else:
                 game_print.print_field(game_state)
                 game_print.game_over()
-                break
-
-        elif command_lst[0] == 'V':
-            row = int(command_lst[1])
-            column = int(command_lst[2])
-            color = command_lst[3]
-            game_state.create_virus(row, column, color)
-
-        elif command_lst[0] == 'A':
-            game_state.rotate_clockwise()
-
-        elif command_lst[0] == 'B':
-            game_state.rotate_counterclockwise()
-
-        elif command_lst[0] == '<':
-            game_state.move_left()
-
-        elif command_lst[0] == '>':
-            game_state.move_right()
+            break
@@ -0,0 +1,277 @@
+from typing import Iterator
+
+import numpy as np
+
+import game_logic
+
+
+FIELD_CHARS = [' ']  # code -> field character
+FIELD_CODES = {' ': 0}  # field character -> code
+MATCH_KEYS = np.zeros(256, dtype=np.uint8)  # code -> code of the upper-case character
+
+
+def encode_character(character: str) -> int:
+    """
+    Returns the integer code of a field character, registering it if it is new.
+
+    Args:
+        character (str): A single field character.
+
+    Returns:
+        int: The code stored in the array for that character.
+    """
+    code = FIELD_CODES.get(character)
+    if code is None:
+        if len(FIELD_CHARS) >= len(MATCH_KEYS):
+            raise ValueError("The array engine supports at most 256 distinct field characters.")
+        code = len(FIELD_CHARS)
+        FIELD_CHARS.append(character)
+        FIELD_CODES[character] = code
+        MATCH_KEYS[code] = encode_character(character.upper())
+    return code
+
+
+def match_mask(codes: np.ndarray, matchable: np.ndarray, match_keys: np.ndarray = None,
+               length: int = 4) -> np.ndarray:
+    """
+    Marks every cell that is part of length or more same-colored, matchable
+    cells in a row or column. The last two axes are rows and columns, so a
+    stack of fields can be scanned at once.
+
+    Args:
+        codes (np.ndarray): Field codes.
+        matchable (np.ndarray): Boolean mask of cells that may be matched.
+        match_keys (np.ndarray, optional): Code -> code of the upper-case character,
+            defaults to MATCH_KEYS of this process.
+        length (int, optional): The fewest cells in a run that match, at least 2.
+
+    Returns:
+        np.ndarray: Boolean mask of matched cells.
+    """
+    if match_keys is None:
+        match_keys = MATCH_KEYS
+    rows, columns = codes.shape[-2:]
+    size = rows * columns
+    # each field is scanned as one flat line so the comparisons run over long
+    # contiguous arrays; pairs that wrap around a row end are masked out
+    keys = np.where(matchable, match_keys[codes], 0).reshape(codes.shape[:-2] + (size,))
+    matched = np.zeros(keys.shape, dtype=bool)
+
+    # horizontal matching: run[j] is set if cells j to j + length - 1 match
+    if columns >= length:
+        pair = (keys[..., :-1] == keys[..., 1:]) & (keys[..., :-1] != 0)
+        pair &= np.arange(1, size) % columns != 0
+        starts = size - length + 1
+        run = pair[..., :starts].copy()
+        for i in range(1, length - 1):
+            run &= pair[..., i:i + starts]
+        for i in range(length):
+            matched[..., i:i + starts] |= run
+
+    # vertical matching
+    if rows >= length:
+        pair = (keys[..., :-columns] == keys[..., columns:]) & (keys[..., :-columns] != 0)
+        starts = size - (length - 1) * columns
+        run = pair[..., :starts].copy()
+        for i in range(1, length - 1):
+            run &= pair[..., i * columns:i * columns + starts]
+        for i in range(length):
+            matched[..., i * columns:i * columns + starts] |= run
+
+    matched = matched.reshape(codes.shape)
+    return matched
+
+
+def line_runs(keys: np.ndarray, length: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Finds every run of length or more equal, non-zero keys along the rows of
+    a 2D array, with one comparison of each cell with its left neighbor.
+
+    Args:
+        keys (np.ndarray): Match keys, one line per row, 0 where nothing may be matched.
+        length (int): The fewest cells in a run that match.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: Line, start and stop of every run.
+    """
+    if keys.size == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    boundary = np.ones(keys.shape, dtype=bool)  # set where a run starts, which every line does
+    boundary[:, 1:] = keys[:, 1:] != keys[:, :-1]
+    starts = np.flatnonzero(boundary)
+    stops = np.empty_like(starts)
+    stops[:-1] = starts[1:]
+    stops[-1] = keys.size
+    keep = (stops - starts >= length) & (keys.reshape(-1)[starts] != 0)
+    line, start = np.divmod(starts[keep], keys.shape[1])
+    return line, start, start + (stops - starts)[keep]
+
+
+class ArrayFieldRow:
+    """
+    A list-like view of one row of the code array.
+
+    Args:
+        codes (np.ndarray): The row of the code array.
+    """
+    __slots__ = ('_codes',)
+
+    def __init__(self, codes: np.ndarray) -> None:
+        self._codes = codes
+
+    def __getitem__(self, col: int) -> str:
+        return FIELD_CHARS[self._codes[col]]
+
+    def __setitem__(self, col: int, character: str) -> None:
+        self._codes[col] = encode_character(character)
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def __iter__(self):
+        return (FIELD_CHARS[code] for code in self._codes.tolist())
+
+
+class ArrayField:
+    """
+    A list-of-lists compatible view of the code array, so that GameState methods
+    and game_print can keep reading and writing field[row][col] as characters.
+
+    Args:
+        codes (np.ndarray): The 2D code array.
+    """
+    def __init__(self, codes: np.ndarray) -> None:
+        self.codes = codes
+        self._rows = [ArrayFieldRow(codes[r]) for r in range(codes.shape[0])]
+
+    def __getitem__(self, row: int) -> ArrayFieldRow:
+        return self._rows[row]
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def tolist(self) -> list[list[str]]:
+        """
+        Returns:
+            list[list[str]]: A plain copy of the field as characters.
+        """
+        return [[FIELD_CHARS[code] for code in row] for row in self.codes.tolist()]
+
+
+class ArrayGameState(game_logic.GameState):
+    """
+    A GameState whose field is stored as an ndarray of small integer color codes.
+    The matched runs of every row and column are kept as in GameState, and
+    the rows and columns of changed cells are rescanned with array
+    comparisons instead of Python loops. The mask of matchable cells is kept
+    up to date as half capsules are added, removed or change state.
+
+    Args:
+        config (GameConfig, optional): The match length and virus colors to play with.
+    """
+    def __init__(self, config: game_logic.GameConfig = game_logic.DEFAULT_CONFIG) -> None:
+        self.codes = np.zeros((0, 0), dtype=np.uint8)
+        self._field_view = ArrayField(self.codes)
+        super().__init__(config)
+
+    @property
+    def field(self) -> ArrayField:
+        return self._field_view
+
+    @field.setter
+    def field(self, value) -> None:
+        if not isinstance(value, ArrayField):
+            columns = len(value[0]) if value else 0
+            codes = np.array([[encode_character(character) for character in row] for row in value], dtype=np.uint8)
+            value = ArrayField(codes.reshape(len(value), columns))
+        self.codes = value.codes
+        self._field_view = value
+        self._matchable = np.ones(self.codes.shape, dtype=bool)  # the half capsules are added after the field
+
+    def _copy_field(self) -> ArrayField:
+        """
+        Returns:
+            ArrayField: A view of a copy of the code array.
+        """
+        return ArrayField(self.codes.copy())
+
+    def clone(self) -> 'ArrayGameState':
+        """
+        Returns:
+            ArrayGameState: An independent copy, see GameState.clone.
+        """
+        clone = super().clone()
+        clone._matchable = self._matchable.copy()
+        return clone
+
+    def _refresh_cell(self, position: tuple[int, int]) -> None:
+        """
+        Updates whether a cell can be matched, in the mask as well, see
+        GameState._refresh_cell.
+
+        Args:
+            position (tuple[int, int]): The cell to update.
+        """
+        super()._refresh_cell(position)
+        self._matchable[position] = position not in self._unmatchable
+
+    def _occupied_cells(self) -> Iterator[tuple[int, int, str]]:
+        """
+        Yields:
+            tuple[int, int, str]: Row, column and character of every non-empty cell.
+        """
+        rows, cols = np.nonzero(self.codes)
+        for r, c, code in zip(rows.tolist(), cols.tolist(), self.codes[rows, cols].tolist()):
+            yield r, c, FIELD_CHARS[code]
+
+    def matchable_mask(self) -> np.ndarray:
+        """
+        Returns the mask of cells that may take part in a match, which is every
+        cell not held by a half capsule that is still falling or landed. The
+        mask is the one the state keeps up to date and must not be changed.
+
+        Returns:
+            np.ndarray: Boolean array with the shape of the field.
+        """
+        return self._matchable
+
+    def find_matching(self) -> set[tuple[int, int]]:
+        """
+        Finds all matched positions on the field, see GameState.find_matching.
+        Only the rows and columns of the cells that changed since the last
+        call are scanned again, all of a row or column at once.
+
+        Returns:
+            set[tuple[int, int]]: Positions that is matched and should be cleared.
+        """
+        dirty = self._dirty_cells
+        if self._rescan_all:
+            self._rescan_all = False
+            self._row_windows = {}
+            self._col_windows = {}
+            rows, cols = list(range(self.rows)), list(range(self.columns))
+        elif not dirty:
+            return self.matched_set
+        else:
+            rows = sorted({r for r, _ in dirty})
+            cols = sorted({c for _, c in dirty})
+            dirty.clear()
+        # the rows and then the columns, as lines padded with empty cells to the same length
+        keys = np.zeros((len(rows) + len(cols), max(self.rows, self.columns)), dtype=np.uint8)
+        keys[:len(rows), :self.columns] = np.where(self._matchable[rows], MATCH_KEYS[self.codes[rows]], 0)
+        keys[len(rows):, :self.rows] = np.where(self._matchable[:, cols], MATCH_KEYS[self.codes[:, cols]], 0).T
+        for r in rows:
+            self._row_windows.pop(r, None)
+        for c in cols:
+            self._col_windows.pop(c, None)
+        for line, start, stop in zip(*(part.tolist() for part in line_runs(keys, self.config.match_length))):
+            if line < len(rows):
+                self._row_windows.setdefault(rows[line], set()).add((start, stop))
+            else:
+                self._col_windows.setdefault(cols[line - len(rows)], set()).add((start, stop))
+        self.matched_set = self._matched_cells()
+        return self.matched_set
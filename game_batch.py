@@ -0,0 +1,806 @@
+import numpy as np
+
+import game_level
+import game_logic
+from game_array import FIELD_CHARS, encode_character, match_mask
+
+
+# piece states
+NO_PIECE = 0
+FALLING = 1
+LANDED = 2
+FROZEN = 3
+STATE_NAMES = {FALLING: 'falling', LANDED: 'landed', FROZEN: 'frozen'}
+STATE_CODES = {name: code for code, name in STATE_NAMES.items()}
+
+# orientations
+HORIZONTAL = 1
+VERTICAL = 2
+ORIENTATION_NAMES = {0: None, HORIZONTAL: 'horizontal', VERTICAL: 'vertical'}
+ORIENTATION_CODES = {name: code for code, name in ORIENTATION_NAMES.items()}
+
+# where the other half of a capsule is, seen from a half capsule
+NO_LINK = 0
+LINK_RIGHT = 1  # left half of a horizontal capsule (capsule[0])
+LINK_LEFT = 2  # right half of a horizontal capsule (capsule[1])
+LINK_UP = 3  # bottom half of a vertical capsule (capsule[0])
+LINK_DOWN = 4  # top half of a vertical capsule (capsule[1])
+LINK_ROW = np.array([0, 0, 0, -1, 1])
+LINK_COL = np.array([0, 1, -1, 0, 0])
+
+MAX_RECOLOR_ROUNDS = 64  # rounds random_levels recolors matching runs before it drops them
+
+
+class GameBatch:
+    """
+    Holds many boards of the same size in a few arrays and steps them together.
+    Every command takes an optional selection of boards and applies the same
+    rules as game_logic.GameState to each of them.
+
+    Boards that are game over keep their last field and ignore further commands,
+    like a2.py, which stops reading commands after GAME OVER.
+
+    Args:
+        count (int): Number of boards.
+        rows (int): Number of rows of every board.
+        columns (int): Number of columns of every board.
+        config (GameConfig, optional): The match length and virus colors of every board.
+    """
+    def __init__(self, count: int, rows: int, columns: int,
+                 config: game_logic.GameConfig = game_logic.DEFAULT_CONFIG) -> None:
+        if rows < 2 or columns < 2:
+            raise ValueError("Boards need at least 2 rows and 2 columns.")
+        self.count = count
+        self.config = config
+        self.rows = rows
+        self.columns = columns
+        shape = (count, rows, columns)
+        self.codes = np.zeros(shape, dtype=np.uint8)  # field characters, see game_array
+        # one entry per half capsule, stored at its cell
+        self.state = np.zeros(shape, dtype=np.int8)
+        self.link = np.zeros(shape, dtype=np.int8)
+        self.order = np.zeros(shape, dtype=np.int64)  # creation order of capsules
+        self.delay = np.zeros(shape, dtype=bool)
+        self.color = np.zeros(shape, dtype=np.uint8)  # HalfCapsule.color, as a code
+        self.orientation = np.zeros(shape, dtype=np.int8)
+        self._piece_arrays = (self.state, self.link, self.order, self.delay, self.color, self.orientation)
+        # the faller is stored by the cell of capsule[0]
+        self.has_faller = np.zeros(count, dtype=bool)
+        self.faller_row = np.zeros(count, dtype=np.int64)
+        self.faller_col = np.zeros(count, dtype=np.int64)
+        self.faller_orientation = np.zeros(count, dtype=np.int8)
+        self.game_over = np.zeros(count, dtype=bool)
+        self.matched = np.zeros(shape, dtype=bool)
+        self._next_order = 1
+
+    @classmethod
+    def from_states(cls, states: list[game_logic.GameState]) -> 'GameBatch':
+        """
+        Builds a batch from game states that all have the same field size and config.
+
+        Args:
+            states (list[GameState]): The boards to copy.
+
+        Returns:
+            GameBatch: A batch with one board per game state.
+        """
+        batch = cls(len(states), states[0].rows, states[0].columns, states[0].config)
+        for board, game_state in enumerate(states):
+            batch.load(board, game_state)
+        return batch
+
+    @classmethod
+    def random_levels(cls, count: int, rows: int, columns: int, level: int = 0, density: float = None,
+                      seed: int = None, colors: str = None,
+                      config: game_logic.GameConfig = game_logic.DEFAULT_CONFIG) -> 'GameBatch':
+        """
+        Generates a batch of random levels at once, with the virus count and
+        height of game_level.generate_level. Colors are drawn at random and
+        the viruses in a run of config.match_length are drawn again until no
+        run is left; a run still left after MAX_RECOLOR_ROUNDS loses its
+        viruses. With three colors that does not happen from match length 3
+        on, but at match length 2 dense boards keep runs and end up with
+        fewer viruses, e.g. about two thirds of them at level 20. The boards
+        differ from the ones generate_level makes with the same seed.
+
+        Args:
+            count (int): Number of boards.
+            rows (int): Number of rows of every board.
+            columns (int): Number of columns of every board.
+            level (int, optional): The level.
+            density (float, optional): Share of the cells from virus_top down that hold
+                a virus, instead of the number of viruses of the level.
+            seed (int, optional): Seed of the random generator.
+            colors (str, optional): The field characters of the viruses, by
+                default game_level.virus_colors(config).
+            config (GameConfig, optional): The match length and virus colors of the boards.
+
+        Returns:
+            GameBatch: The boards, without fallers.
+        """
+        batch = cls(count, rows, columns, config)
+        if colors is None:
+            colors = game_level.virus_colors(config)
+        top = game_level.virus_top(level, rows)
+        region = (rows - top) * columns
+        if density is None:
+            viruses = game_level.virus_count(level, rows, columns)
+        else:
+            viruses = round(density * region)
+        if not 0 <= viruses <= region:
+            raise ValueError(f"{viruses} viruses do not fit in the {region} cells from row {top} down.")
+        if count == 0 or viruses == 0:
+            return batch
+
+        rng = np.random.default_rng(seed)
+        keys = rng.random((count, region))
+        if viruses < region:  # the cells with the smallest keys hold a virus
+            occupied = keys < np.partition(keys, viruses, axis=1)[:, viruses:viruses + 1]
+        else:
+            occupied = np.ones(keys.shape, dtype=bool)
+        shape = (count, rows - top, columns)
+        occupied = occupied.reshape(shape)
+        palette = np.array([encode_character(color) for color in colors], dtype=np.uint8)
+        cells = np.where(occupied, palette[rng.integers(0, len(palette), shape)], 0).astype(np.uint8)
+
+        boards = np.arange(count)  # boards that may still have a run
+        for _ in range(MAX_RECOLOR_ROUNDS):
+            part = cells[boards]
+            runs = match_mask(part, np.ones(part.shape, dtype=bool), length=config.match_length)
+            left = runs.any(axis=(1, 2))
+            if not left.any():
+                break
+            boards, part, runs = boards[left], part[left], runs[left]
+            part[runs] = palette[rng.integers(0, len(palette), int(runs.sum()))]  # draw their colors again
+            cells[boards] = part
+        else:
+            part = cells[boards]
+            part[match_mask(part, np.ones(part.shape, dtype=bool), length=config.match_length)] = 0
+            cells[boards] = part
+        batch.codes[:, top:] = cells
+        return batch
+
+    def load(self, board: int, game_state: game_logic.GameState) -> None:
+        """
+        Copies a game state into one board of the batch.
+
+        Args:
+            board (int): Index of the board.
+            game_state (GameState): A game state with the same field size.
+        """
+        if (game_state.rows, game_state.columns) != (self.rows, self.columns):
+            raise ValueError("The game state must have the same size as the batch.")
+        if game_state.config != self.config:
+            raise ValueError("The game state must have the same config as the batch.")
+        for array in self._piece_arrays:
+            array[board] = 0
+        for r in range(self.rows):
+            for c in range(self.columns):
+                self.codes[board, r, c] = encode_character(game_state.field[r][c])
+
+        for half_capsule in game_state.half_capsules:
+            self._load_half(board, half_capsule, NO_LINK, 0)
+        for capsule in game_state.capsules:
+            if capsule[0].orientation == 'horizontal':
+                links = (LINK_RIGHT, LINK_LEFT)
+            else:
+                links = (LINK_UP, LINK_DOWN)
+            for half_capsule, link in zip(capsule, links):
+                self._load_half(board, half_capsule, link, self._next_order)
+            self._next_order += 1
+
+        faller = game_state.faller
+        self.has_faller[board] = faller is not None
+        if faller is not None:
+            self.faller_row[board] = faller[0].row
+            self.faller_col[board] = faller[0].col
+            self.faller_orientation[board] = ORIENTATION_CODES[faller[0].orientation]
+        self.game_over[board] = game_state.game_over
+        self.matched[board] = False
+        for r, c in game_state.matched_set:
+            self.matched[board, r, c] = True
+
+    def _load_half(self, board: int, half_capsule: game_logic.HalfCapsule, link: int, order: int) -> None:
+        """
+        Writes one half capsule into the piece arrays.
+        """
+        position = (board, half_capsule.row, half_capsule.col)
+        self.state[position] = STATE_CODES[half_capsule.state]
+        self.link[position] = link
+        self.order[position] = order
+        self.delay[position] = half_capsule.delay
+        self.color[position] = encode_character(half_capsule.color)
+        self.orientation[position] = ORIENTATION_CODES[half_capsule.orientation]
+
+    def to_game_state(self, board: int) -> game_logic.GameState:
+        """
+        Builds a GameState with the contents of one board, e.g. for printing.
+
+        Args:
+            board (int): Index of the board.
+
+        Returns:
+            GameState: An independent copy of the board.
+        """
+        game_state = game_logic.GameState(self.config)
+        game_state.initialize_field(self.rows, self.columns, 'EMPTY')
+        rows, cols = np.nonzero(self.codes[board])
+        for r, c, code in zip(rows.tolist(), cols.tolist(), self.codes[board][rows, cols].tolist()):
+            game_state.field[r][c] = FIELD_CHARS[code]
+
+        def make_half(r: int, c: int) -> game_logic.HalfCapsule:
+            half_capsule = game_logic.HalfCapsule(FIELD_CHARS[self.color[board, r, c]], r, c,
+                                                  STATE_NAMES[self.state[board, r, c]],
+                                                  ORIENTATION_NAMES[self.orientation[board, r, c]])
+            half_capsule.delay = bool(self.delay[board, r, c])
+            return half_capsule
+
+        capsules = []
+        rows, cols = np.nonzero(self.state[board])
+        for r, c in zip(rows.tolist(), cols.tolist()):
+            link = self.link[board, r, c]
+            if link == NO_LINK:
+                half_capsule = make_half(r, c)
+                game_state.half_capsules[half_capsule] = None
+                game_state._add_half(half_capsule)
+            elif link in (LINK_RIGHT, LINK_UP):
+                capsule = (make_half(r, c), make_half(r + int(LINK_ROW[link]), c + int(LINK_COL[link])))
+                capsules.append((self.order[board, r, c], capsule))
+        capsules.sort(key=lambda item: item[0])
+        for _, capsule in capsules:
+            game_state._add_capsule(capsule)
+            if self.has_faller[board] and (capsule[0].row, capsule[0].col) == \
+                    (self.faller_row[board], self.faller_col[board]):
+                game_state.faller = capsule
+
+        game_state.game_over = bool(self.game_over[board])
+        game_state._reset_field_counts()
+        game_state._reset_zobrist()
+        game_state.invalidate_matching()
+        game_state.find_matching()
+        return game_state
+
+    def _boards(self, boards) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Turns a board selection into the indices of the boards to update.
+
+        Args:
+            boards: None for every board, a boolean mask or a sequence of indices.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The indices of the boards that are not
+            game over, and a mask over the selection telling which ones were kept.
+        """
+        if boards is None:
+            indices = np.arange(self.count)
+        else:
+            indices = np.asarray(boards)
+            if indices.dtype == bool:
+                indices = np.nonzero(indices)[0]
+            else:
+                indices = indices.astype(np.int64)
+        keep = ~self.game_over[indices]
+        return indices[keep], keep
+
+    def _is_empty(self, b: np.ndarray, r: np.ndarray, c: np.ndarray) -> np.ndarray:
+        """
+        Checks if cells are on the field and empty.
+        """
+        inside = (0 <= r) & (r < self.rows) & (0 <= c) & (c < self.columns)
+        rr = np.clip(r, 0, self.rows - 1)
+        cc = np.clip(c, 0, self.columns - 1)
+        return inside & (self.codes[b, rr, cc] == 0)
+
+    def _move_pieces(self, b: np.ndarray, r: np.ndarray, c: np.ndarray, new_r: np.ndarray, new_c: np.ndarray) -> None:
+        """
+        Moves the piece data of some cells to other cells.
+        """
+        for array in self._piece_arrays:
+            values = array[b, r, c]
+            array[b, r, c] = 0
+            array[b, new_r, new_c] = values
+
+    def _faller_boards(self, boards) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: The selected boards that have a faller.
+        """
+        b, _ = self._boards(boards)
+        return b[self.has_faller[b]]
+
+    def create_virus(self, row, col, color, boards=None) -> None:
+        """
+        Puts a virus on each selected board, if the cell is on the field and empty.
+
+        Args:
+            row: Row position, or one per selected board.
+            col: Column position, or one per selected board.
+            color: Color of the virus, or one per selected board.
+            boards: None for every board, a boolean mask or a sequence of indices.
+        """
+        b, keep = self._boards(boards)
+        size = len(keep)
+        row = np.broadcast_to(np.asarray(row), size)[keep]
+        col = np.broadcast_to(np.asarray(col), size)[keep]
+        colors = np.broadcast_to(np.asarray(color, dtype=object), size)[keep]
+        codes = np.array([encode_character(str(color).lower()) for color in colors], dtype=np.uint8)
+        ok = self._is_empty(b, row, col)
+        self.codes[b[ok], row[ok], col[ok]] = codes[ok]
+
+    def create_faller(self, color1, color2, boards=None) -> None:
+        """
+        Adds a new falling capsule to each selected board that has no faller.
+
+        Args:
+            color1: The color of the left half, or one per selected board.
+            color2: The color of the right half, or one per selected board.
+            boards: None for every board, a boolean mask or a sequence of indices.
+        """
+        b, keep = self._boards(boards)
+        size = len(keep)
+        colors1 = np.broadcast_to(np.asarray(color1, dtype=object), size)[keep]
+        colors2 = np.broadcast_to(np.asarray(color2, dtype=object), size)[keep]
+        new = ~self.has_faller[b]
+        b, colors1, colors2 = b[new], colors1[new], colors2[new]
+        if len(b) == 0:
+            return
+
+        if self.columns % 2 != 0:
+            col = self.columns // 2
+        else:
+            col = self.columns // 2 - 1
+
+        self.game_over[b] |= (self.codes[b, 1, col] != 0) | (self.codes[b, 1, col + 1] != 0)
+
+        for c, colors, link in ((col, colors1, LINK_RIGHT), (col + 1, colors2, LINK_LEFT)):
+            self.codes[b, 1, c] = [encode_character(str(color)) for color in colors]
+            self.color[b, 1, c] = [encode_character(str(color).upper()) for color in colors]
+            self.state[b, 1, c] = FALLING
+            self.link[b, 1, c] = link
+            self.order[b, 1, c] = self._next_order
+            self.delay[b, 1, c] = False
+            self.orientation[b, 1, c] = HORIZONTAL
+        self._next_order += 1
+
+        self.has_faller[b] = True
+        self.faller_row[b] = 1
+        self.faller_col[b] = col
+        self.faller_orientation[b] = HORIZONTAL
+
+    def test_faller_state(self, boards=None) -> None:
+        """
+        Checks and updates the faller's state (falling or landed) on each selected board.
+
+        Args:
+            boards: None for every board, a boolean mask or a sequence of indices.
+        """
+        b = self._faller_boards(boards)
+        r, c = self.faller_row[b], self.faller_col[b]
+        horizontal = self.faller_orientation[b] == HORIZONTAL
+        r1 = np.where(horizontal, r, r - 1)
+        c1 = np.where(horizontal, c + 1, c)
+        state0 = self.state[b, r, c]
+        state1 = self.state[b, r1, c1]
+
+        below_free = self._is_empty(b, r + 1, c) & (~horizontal | self._is_empty(b, r + 1, c + 1))
+        falling = (state0 == FALLING) & (state1 == FALLING)
+        landing = falling & ((r == self.rows - 1) | ~below_free)
+        lifting = (state0 == LANDED) & (state1 == LANDED) & (0 <= r) & (r < self.rows - 1) & below_free
+
+        for new_state, mask in ((LANDED, landing), (FALLING, lifting)):
+            self.state[b[mask], r[mask], c[mask]] = new_state
+            self.state[b[mask], r1[mask], c1[mask]] = new_state
+
+    def move_left(self, boards=None) -> None:
+        """
+        Moves the faller to the left (one space) on each selected board.
+
+        Args:
+            boards: None for every board, a boolean mask or a sequence of indices.
+        """
+        b = self._faller_boards(boards)
+        r, c = self.faller_row[b], self.faller_col[b]
+        horizontal = self.faller_orientation[b] == HORIZONTAL
+
+        ok = horizontal & (c > 0) & self._is_empty(b, r, c - 1)
+        hb, hr, hc = b[ok], r[ok], c[ok]
+        color0, color1 = self.color[hb, hr, hc], self.color[hb, hr, hc + 1]
+        self.codes[hb, hr, hc - 1] = color0
+        self.codes[hb, hr, hc] = color1
+        self.codes[hb, hr, hc + 1] = 0
+        self._move_pieces(hb, hr, hc, hr, hc - 1)
+        self._move_pieces(hb, hr, hc + 1, hr, hc)
+        self.faller_col[hb] -= 1
+
+        ok = ~horizontal & (c > 0) & self._is_empty(b, r, c - 1) & self._is_empty(b, r - 1, c - 1)
+        vb, vr, vc = b[ok], r[ok], c[ok]
+        self.codes[vb, vr, vc - 1] = self.color[vb, vr, vc]
+        self.codes[vb, vr - 1, vc - 1] = self.color[vb, vr - 1, vc]
+        self.codes[vb, vr, vc] = 0
+        self.codes[vb, vr - 1, vc] = 0
+        self._move_pieces(vb, vr, vc, vr, vc - 1)
+        self._move_pieces(vb, vr - 1, vc, vr - 1, vc - 1)
+        self.faller_col[vb] -= 1
+
+    def move_right(self, boards=None) -> None:
+        """
+        Moves the faller to the right (one space) on each selected board.
+
+        Args:
+            boards: None for every board, a boolean mask or a sequence of indices.
+        """
+        b = self._faller_boards(boards)
+        r, c = self.faller_row[b], self.faller_col[b]
+        horizontal = self.faller_orientation[b] == HORIZONTAL
+
+        ok = horizontal & (c + 1 < self.columns - 1) & self._is_empty(b, r, c + 2)
+        hb, hr, hc = b[ok], r[ok], c[ok]
+        color0, color1 = self.color[hb, hr, hc], self.color[hb, hr, hc + 1]
+        self.codes[hb, hr, hc + 2] = color1
+        self.codes[hb, hr, hc + 1] = color0
+        self.codes[hb, hr, hc] = 0
+        self._move_pieces(hb, hr, hc + 1, hr, hc + 2)
+        self._move_pieces(hb, hr, hc, hr, hc + 1)
+        self.faller_col[hb] += 1
+
+        ok = ~horizontal & (c < self.columns - 1) & self._is_empty(b, r, c + 1) & self._is_empty(b, r - 1, c + 1)
+        vb, vr, vc = b[ok], r[ok], c[ok]
+        self.codes[vb, vr, vc + 1] = self.color[vb, vr, vc]
+        self.codes[vb, vr - 1, vc + 1] = self.color[vb, vr - 1, vc]
+        self.codes[vb, vr, vc] = 0
+        self.codes[vb, vr - 1, vc] = 0
+        self._move_pieces(vb, vr, vc, vr, vc + 1)
+        self._move_pieces(vb, vr - 1, vc, vr - 1, vc + 1)
+        self.faller_col[vb] += 1
+
+    def _first_occupied(self, b: np.ndarray, c: np.ndarray, below: np.ndarray) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: For each board, the first occupied row of column c among
+            the rows marked in below, or rows if there is none.
+        """
+        occupied = (self.codes[b, :, c] != 0) & below
+        return np.where(occupied.any(axis=1), occupied.argmax(axis=1), self.rows)
+
+    def hard_drop(self, boards=None) -> None:
+        """
+        Moves the faller on each selected board straight down to the row it
+        lands on, without letting time pass.
+
+        Args:
+            boards: None for every board, a boolean mask or a sequence of indices.
+        """
+        b = self._faller_boards(boards)
+        r, c = self.faller_row[b], self.faller_col[b]
+        horizontal = self.faller_orientation[b] == HORIZONTAL
+        below = np.arange(self.rows) > r[:, None]
+        landing = self._first_occupied(b, c, below)
+        right = self._first_occupied(b, np.minimum(c + 1, self.columns - 1), below)
+        landing = np.where(horizontal, np.minimum(landing, right), landing)
+
+        ok = landing - r > 1
+        b, r, c, horizontal = b[ok], r[ok], c[ok], horizontal[ok]
+        distance = landing[ok] - r - 1
+        r1 = np.where(horizontal, r, r - 1)  # the cell of capsule[1]
+        c1 = np.where(horizontal, c + 1, c)
+        color0, color1 = self.color[b, r, c], self.color[b, r1, c1]
+        self.codes[b, r, c] = 0
+        self.codes[b, r1, c1] = 0
+        self.codes[b, r + distance, c] = color0
+        self.codes[b, r1 + distance, c1] = color1
+        self._move_pieces(b, r, c, r + distance, c)  # capsule[0] is the bottom half, so it moves first
+        self._move_pieces(b, r1, c1, r1 + distance, c1)
+        self.faller_row[b] += distance
+
+    def _make_vertical(self, b: np.ndarray, r: np.ndarray, c: np.ndarray) -> None:
+        """
+        Marks the faller at (r, c) and (r - 1, c) as a vertical capsule.
+        """
+        self.link[b, r, c] = LINK_UP
+        self.link[b, r - 1, c] = LINK_DOWN
+        self.orientation[b, r, c] = VERTICAL
+        self.orientation[b, r - 1, c] = VERTICAL
+        self.faller_orientation[b] = VERTICAL
+
+    def _make_horizontal(self, b: np.ndarray, r: np.ndarray, c: np.ndarray) -> None:
+        """
+        Marks the faller at (r, c) and (r, c + 1) as a horizontal capsule.
+        """
+        self.link[b, r, c] = LINK_RIGHT
+        self.link[b, r, c + 1] = LINK_LEFT
+        self.orientation[b, r, c] = HORIZONTAL
+        self.orientation[b, r, c + 1] = HORIZONTAL
+        self.faller_orientation[b] = HORIZONTAL
+
+    def _rotate(self, boards, clockwise: bool) -> None:
+        """
+        Rotates the faller on each selected board.
+        """
+        b = self._faller_boards(boards)
+        r, c = self.faller_row[b], self.faller_col[b]
+        horizontal = self.faller_orientation[b] == HORIZONTAL
+        in_rows = (0 < r) & (r < self.rows)
+
+        # horizontal to vertical: capsule[1] moves on top of capsule[0]
+        ok = horizontal & in_rows & (c < self.columns - 1) & self._is_empty(b, r - 1, c)
+        hb, hr, hc = b[ok], r[ok], c[ok]
+        color0, color1 = self.color[hb, hr, hc], self.color[hb, hr, hc + 1]
+        if clockwise:
+            self.codes[hb, hr - 1, hc] = color0
+            self.codes[hb, hr, hc] = color1
+        else:
+            self.codes[hb, hr - 1, hc] = color1
+        self.codes[hb, hr, hc + 1] = 0
+        self._move_pieces(hb, hr, hc + 1, hr - 1, hc)
+        if clockwise:  # keep capsule[0] the bottom half
+            self.color[hb, hr, hc] = color1
+            self.color[hb, hr - 1, hc] = color0
+        self._make_vertical(hb, hr, hc)
+
+        # vertical to horizontal: capsule[1] moves right of capsule[0]
+        ok = ~horizontal & in_rows & (c < self.columns - 1) & self._is_empty(b, r, c + 1)
+        vb, vr, vc = b[ok], r[ok], c[ok]
+        color0, color1 = self.color[vb, vr, vc], self.color[vb, vr - 1, vc]
+        if clockwise:
+            self.codes[vb, vr, vc + 1] = color1
+        else:
+            self.codes[vb, vr, vc] = color1
+            self.codes[vb, vr, vc + 1] = color0
+        self.codes[vb, vr - 1, vc] = 0
+        self._move_pieces(vb, vr - 1, vc, vr, vc + 1)
+        if not clockwise:
+            self.color[vb, vr, vc] = color1
+            self.color[vb, vr, vc + 1] = color0
+        self._make_horizontal(vb, vr, vc)
+
+        # wall kick: the capsule ends up one column to the left
+        ok = ~horizontal & ~ok & in_rows & (0 < c) & self._is_empty(b, r, c - 1)
+        kb, kr, kc = b[ok], r[ok], c[ok]
+        color0, color1 = self.color[kb, kr, kc], self.color[kb, kr - 1, kc]
+        if clockwise:
+            self.codes[kb, kr, kc - 1] = color0
+            self.codes[kb, kr, kc] = color1
+        else:
+            self.codes[kb, kr, kc - 1] = color1
+        self.codes[kb, kr - 1, kc] = 0
+        self._move_pieces(kb, kr, kc, kr, kc - 1)
+        self._move_pieces(kb, kr - 1, kc, kr, kc)
+        if not clockwise:
+            self.color[kb, kr, kc - 1] = color1
+            self.color[kb, kr, kc] = color0
+        self._make_horizontal(kb, kr, kc - 1)
+        self.faller_col[kb] -= 1
+
+    def rotate_clockwise(self, boards=None) -> None:
+        """
+        Rotates the faller clockwise on each selected board.
+
+        Args:
+            boards: None for every board, a boolean mask or a sequence of indices.
+        """
+        self._rotate(boards, True)
+
+    def rotate_counterclockwise(self, boards=None) -> None:
+        """
+        Rotates the faller counterclockwise on each selected board.
+
+        Args:
+            boards: None for every board, a boolean mask or a sequence of indices.
+        """
+        self._rotate(boards, False)
+
+    def find_matching(self, boards=None) -> np.ndarray:
+        """
+        Finds all matched positions on the selected boards and stores them in self.matched.
+
+        Args:
+            boards: None for every board, a boolean mask or a sequence of indices.
+
+        Returns:
+            np.ndarray: Boolean mask of matched cells of the selected boards.
+        """
+        b, _ = self._boards(boards)
+        matched = self._match_mask(self.codes[b], self.state[b])
+        self.matched[b] = matched
+        return matched
+
+    def _match_mask(self, codes: np.ndarray, state: np.ndarray) -> np.ndarray:
+        """
+        Args:
+            codes (np.ndarray): Field codes of some boards.
+            state (np.ndarray): Piece states of the same boards.
+
+        Returns:
+            np.ndarray: Boolean mask of the cells matched under self.config,
+            leaving out the halves that are still falling or landed.
+        """
+        return match_mask(codes, (state != FALLING) & (state != LANDED), length=self.config.match_length)
+
+    def matched_set(self, board: int) -> set[tuple[int, int]]:
+        """
+        Returns:
+            set[tuple[int, int]]: The matched positions of one board, like GameState.matched_set.
+        """
+        rows, cols = np.nonzero(self.matched[board])
+        return set(zip(rows.tolist(), cols.tolist()))
+
+    def _gather(self, b: np.ndarray) -> tuple[tuple[np.ndarray, ...], bool]:
+        """
+        Collects the field and piece arrays of the given boards.
+
+        Returns:
+            tuple: The arrays (codes first, then the piece arrays) and True if
+            they are the batch's own arrays rather than copies.
+        """
+        arrays = (self.codes, *self._piece_arrays)
+        if len(b) == self.count and (b == np.arange(self.count)).all():
+            return arrays, True
+        return tuple(array[b] for array in arrays), False
+
+    def _scatter(self, b: np.ndarray, arrays: tuple[np.ndarray, ...]) -> None:
+        """
+        Writes arrays returned by _gather back into the batch.
+        """
+        for array, values in zip((self.codes, *self._piece_arrays), arrays):
+            array[b] = values
+
+    @staticmethod
+    def _clear_matching(arrays: tuple[np.ndarray, ...], matched: np.ndarray) -> None:
+        """
+        Removes all matched items. A capsule that loses one half leaves the
+        other half falling on its own after a delay.
+        """
+        codes, state, link, order, delay, color, orientation = arrays
+        partner_matched = np.zeros(matched.shape, dtype=bool)
+        partner_matched[:, :, :-1] |= (link[:, :, :-1] == LINK_RIGHT) & matched[:, :, 1:]
+        partner_matched[:, :, 1:] |= (link[:, :, 1:] == LINK_LEFT) & matched[:, :, :-1]
+        partner_matched[:, 1:, :] |= (link[:, 1:, :] == LINK_UP) & matched[:, :-1, :]
+        partner_matched[:, :-1, :] |= (link[:, :-1, :] == LINK_DOWN) & matched[:, 1:, :]
+        split = partner_matched & ~matched
+
+        state[split] = FALLING
+        delay[split] = True
+        link[split] = NO_LINK
+        order[split] = 0
+        for array in arrays:
+            array[matched] = 0
+
+    @staticmethod
+    def _move_down(arrays: tuple[np.ndarray, ...], r: int, cells: np.ndarray) -> None:
+        """
+        Moves the pieces in the given cells of row r one row down, writing
+        their colors into the field.
+        """
+        if not cells.any():
+            return
+        codes, color = arrays[0], arrays[5]
+        codes[:, r + 1] = np.where(cells, color[:, r], codes[:, r + 1])
+        codes[:, r] = np.where(cells, 0, codes[:, r])
+        for array in arrays[1:]:
+            array[:, r + 1] = np.where(cells, array[:, r], array[:, r + 1])
+            array[:, r] = np.where(cells, 0, array[:, r])
+
+    def _apply_gravity(self, arrays: tuple[np.ndarray, ...], matched: np.ndarray,
+                       faller_row: np.ndarray, faller_col: np.ndarray) -> np.ndarray:
+        """
+        Moves all falling capsules or half capsules down if possible. Rows are
+        processed from the bottom up across all boards at once, which is the
+        order GameState.apply_gravity sorts its pieces in.
+
+        Returns:
+            np.ndarray: One bool per board, True if the faller moved down.
+        """
+        codes, state, link, order, delay, color, orientation = arrays
+        count = len(codes)
+        last = self.rows - 1
+        nowhere = np.zeros((count, self.columns), dtype=bool)
+
+        for r in range(last, -1, -1):  # apply gravity on half capsules
+            row_state = state[:, r]
+            half = (row_state != NO_PIECE) & (link[:, r] == NO_LINK)
+            if not half.any():
+                continue
+            below_free = codes[:, r + 1] == 0 if r < last else nowhere
+            row_state[half & (row_state == FROZEN) & below_free] = FALLING
+            falling = half & (row_state == FALLING)
+            delayed = falling & delay[:, r]
+            delay[:, r] &= ~delayed
+            falling &= ~delayed
+            if r < last:
+                falling &= ~matched[:, r + 1]
+            moving = falling & below_free
+            row_state[falling & ~moving] = FROZEN  # nothing is free below a half that did not move
+            self._move_down(arrays, r, moving)
+            if r < last:
+                supported = codes[:, r + 2] != 0 if r + 1 < last else True
+                state[:, r + 1][moving & supported] = FROZEN
+
+        faller_moved = np.zeros(count, dtype=bool)
+        active = np.ones(count, dtype=bool)  # boards where apply_gravity has not returned
+        for r in range(last, -1, -1):  # apply gravity on capsules
+            row_state = state[:, r]
+            horizontal = active[:, None] & (link[:, r] == LINK_RIGHT)
+            vertical = active[:, None] & (link[:, r] == LINK_UP)
+            if not (horizontal.any() or vertical.any()):
+                continue
+            other_state = np.zeros(row_state.shape, dtype=np.int8)
+            other_state[:, :-1] = np.where(horizontal[:, :-1], row_state[:, 1:], 0)
+            if r > 0:
+                other_state = np.where(vertical, state[:, r - 1], other_state)
+            both_falling = (row_state == FALLING) & (other_state == FALLING)
+            both_frozen = (row_state == FROZEN) & (other_state == FROZEN)
+
+            below_free = codes[:, r + 1] == 0 if r < last else nowhere
+            below_matched = matched[:, r + 1] if r < last else nowhere
+            right_free = np.zeros(row_state.shape, dtype=bool)
+            right_free[:, :-1] = below_free[:, 1:]
+            right_matched = np.zeros(row_state.shape, dtype=bool)
+            right_matched[:, :-1] = below_matched[:, 1:]
+            free = np.where(horizontal, below_free & right_free, below_free)
+
+            # a frozen capsule above a just-cleared cell stops gravity for the board
+            blocked = both_frozen & (below_matched | np.where(horizontal, right_matched, matched[:, r]))
+            blocked &= horizontal | vertical
+            stopped = blocked.any(axis=1)
+            if stopped.any():
+                first = np.where(blocked, order[:, r], np.iinfo(np.int64).max).min(axis=1)
+                horizontal &= order[:, r] < first[:, None]
+                vertical &= order[:, r] < first[:, None]
+                active &= ~stopped
+
+            moving = (horizontal | vertical) & (both_falling | both_frozen) & free
+            moving_h = moving & horizontal
+            moving_v = moving & vertical
+
+            faller_moved |= (faller_row == r) & moving[np.arange(count), faller_col]
+
+            row_cells = moving.copy()
+            row_cells[:, 1:] |= moving_h[:, :-1]
+            self._move_down(arrays, r, row_cells)
+            if r > 0:
+                self._move_down(arrays, r - 1, moving_v)
+
+        return faller_moved
+
+    def time_passed(self, boards=None) -> None:
+        """
+        Updates each selected board for one time step.
+
+        Args:
+            boards: None for every board, a boolean mask or a sequence of indices.
+        """
+        b, _ = self._boards(boards)
+        arrays, shared = self._gather(b)
+        codes, state = arrays[0], arrays[1]
+        matched = self._match_mask(codes, state)
+        self._clear_matching(arrays, matched)
+
+        faller_row = np.where(self.has_faller[b], self.faller_row[b], -1)
+        faller_moved = self._apply_gravity(arrays, matched, faller_row, self.faller_col[b])
+        self.faller_row[b[faller_moved]] += 1
+        if not shared:
+            self._scatter(b, arrays)
+
+        f = b[self.has_faller[b]]
+        r, c = self.faller_row[f], self.faller_col[f]
+        horizontal = self.faller_orientation[f] == HORIZONTAL
+        r1 = np.where(horizontal, r, r - 1)
+        c1 = np.where(horizontal, c + 1, c)
+        landed = (self.state[f, r, c] == LANDED) & (self.state[f, r1, c1] == LANDED)
+        self.state[f[landed], r[landed], c[landed]] = FROZEN
+        self.state[f[landed], r1[landed], c1[landed]] = FROZEN
+        self.has_faller[f[landed]] = False
+
+        self.find_matching(b)
+
+    def detect_viruses(self) -> np.ndarray:
+        """
+        Check which boards still have viruses on the field.
+
+        Returns:
+            np.ndarray: One bool per board, True if any viruses are still on it.
+        """
+        viruses = np.zeros(256, dtype=bool)
+        for character in self.config.colors:
+            viruses[encode_character(character)] = True
+        return viruses[self.codes].any(axis=(1, 2))
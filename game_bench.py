@@ -0,0 +1,478 @@
+import argparse
+import copy
+import io
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, NamedTuple
+
+import a2
+import game_level
+import game_logic
+import game_print
+
+
+PHASES = ('time_passed', 'find_matching', 'clear_matching', 'apply_gravity', 'print_field', 'cascade')
+
+
+def make_board(rows: int, columns: int, fill: float, seed: int = 0, capsules: int = 0,
+               cascade: int = 0, state_class: type = game_logic.GameState,
+               config: game_logic.GameConfig = game_logic.DEFAULT_CONFIG) -> game_logic.GameState:
+    """
+    Builds a seeded random board through the CONTENTS setting: viruses and
+    frozen half capsules below the two top rows, plus one faller.
+
+    Args:
+        rows (int): Number of rows.
+        columns (int): Number of columns.
+        fill (float): Share of the cells below the top two rows that are occupied.
+        seed (int, optional): Seed of the random generator.
+        capsules (int, optional): Number of frozen two-cell capsules to add in empty cells.
+        cascade (int, optional): Depth of the chain reaction built in every other
+            column at the bottom of the board, 0 for none.
+        state_class (type, optional): The GameState class used as the engine.
+        config (GameConfig, optional): The match length and virus colors to play with.
+
+    Returns:
+        GameState: The board.
+
+    Raises:
+        ValueError: If the cascade does not fit below the top two rows.
+    """
+    bottom = rows - 4 * cascade  # first row of the cascade towers
+    if cascade and bottom < 2:
+        raise ValueError(f"A cascade of depth {cascade} needs at least {4 * cascade + 2} rows.")
+    tower = cascade_tower(cascade)
+    rnd = random.Random(seed)
+    contents = []
+    for r in range(rows):
+        line = []
+        for c in range(columns):
+            if r >= bottom:
+                line.append(tower[rows - 1 - r] if c % 2 == 0 else ' ')
+            elif r >= 2 and rnd.random() < fill:
+                line.append(rnd.choice('rbyRBY'))
+            else:
+                line.append(' ')
+        contents.append(''.join(line))
+    game_state = state_class(config=config)
+    game_state.initialize_field(rows, columns, 'CONTENTS', contents)
+    add_capsules(game_state, capsules, bottom, rnd)
+    game_state.create_faller('R', 'B')
+    return game_state
+
+
+def cascade_tower(depth: int) -> str:
+    """
+    Builds one column, from the bottom up, that clears depth times in a row:
+    stacks of three viruses, a match of four on top of them, and one half
+    capsule per stack above it. Every cleared match drops the half capsules
+    onto the next stack down.
+
+    Args:
+        depth (int): Number of matches cleared one after another.
+
+    Returns:
+        str: 4 * depth field characters, the bottom cell first.
+    """
+    if depth == 0:
+        return ''
+    colors = [game_logic.VIRUSES[i % len(game_logic.VIRUSES)] for i in range(depth)]
+    stacks = ''.join(color * 3 for color in colors[:-1])
+    halves = ''.join(color.upper() for color in reversed(colors[:-1]))
+    return stacks + colors[-1] * 4 + halves
+
+
+def add_capsules(game_state: game_logic.GameState, count: int, bottom: int, rnd: random.Random) -> int:
+    """
+    Adds frozen capsules at random empty cells between the top two rows and
+    the given bottom row.
+
+    Args:
+        game_state (GameState): The board.
+        count (int): Number of capsules wanted.
+        bottom (int): Capsules are placed above this row.
+        rnd (random.Random): The random generator.
+
+    Returns:
+        int: Number of capsules added, less than count if the board is too full.
+    """
+    added = 0
+    for _ in range(10 * count):
+        if added == count or bottom <= 2:
+            break
+        r = rnd.randrange(2, bottom)
+        c = rnd.randrange(game_state.columns)
+        if rnd.random() < 0.5:  # capsule[0] is the left cell
+            orientation, cells = 'horizontal', [(r, c), (r, c + 1)]
+        else:  # capsule[0] is the bottom cell
+            orientation, cells = 'vertical', [(r, c), (r - 1, c)]
+        if all(2 <= row < bottom and col < game_state.columns and game_state.field[row][col] == ' '
+               for row, col in cells):
+            capsule = tuple(game_logic.HalfCapsule(rnd.choice('RBY'), row, col, 'frozen', orientation)
+                            for row, col in cells)
+            game_state.place_capsules([capsule])
+            added += 1
+    game_state.find_matching()
+    return added
+
+
+def time_call(function: Callable[[], object], min_time: float = 0.2) -> float:
+    """
+    Calls a function repeatedly for at least min_time seconds.
+
+    Args:
+        function (Callable[[], object]): The function to time.
+        min_time (float, optional): The minimum total time in seconds.
+
+    Returns:
+        float: Seconds per call.
+    """
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        function()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / calls
+
+
+def bench_clone(sizes: list[int], fill: float = 0.5) -> None:
+    """
+    Prints the cost of clone, snapshot/restore and copy.deepcopy on square boards.
+
+    Args:
+        sizes (list[int]): Board sizes to try.
+        fill (float, optional): Share of occupied cells.
+    """
+    print(f"{'size':>6} {'pieces':>8} {'clone':>10} {'snapshot':>10} {'restore':>10} {'deepcopy':>10} {'speedup':>8}")
+    for size in sizes:
+        game_state = make_board(size, size, fill)
+        snapshot = game_state.snapshot()
+        target = game_logic.GameState()
+        clone_time = time_call(game_state.clone)
+        snapshot_time = time_call(game_state.snapshot)
+        restore_time = time_call(lambda: target.restore(snapshot))
+        deepcopy_time = time_call(lambda: copy.deepcopy(game_state))
+        pieces = len(game_state.half_capsules) + 2 * len(game_state.capsules)
+        print(f"{size:>6} {pieces:>8} {clone_time * 1e3:>8.2f}ms {snapshot_time * 1e3:>8.2f}ms "
+              f"{restore_time * 1e3:>8.2f}ms {deepcopy_time * 1e3:>8.2f}ms {deepcopy_time / clone_time:>7.1f}x")
+
+
+def bench_levels(sizes: list[tuple[int, int]], level: int = 20, batch: int = 1000) -> None:
+    """
+    Prints how many levels per second game_level generates, as virus lists,
+    as GameState objects and, if numpy is installed, as a GameBatch.
+
+    Args:
+        sizes (list[tuple[int, int]]): Board sizes to try, as (rows, columns).
+        level (int, optional): The level.
+        batch (int, optional): Number of boards per GameBatch.random_levels call.
+    """
+    try:
+        import game_batch  # needs numpy
+    except ImportError:
+        game_batch = None
+    print(f"{'size':>10} {'viruses':>8} {'lists/s':>10} {'states/s':>10} {'batch/s':>10}")
+    for rows, columns in sizes:
+        seeds = iter(range(1 << 62))
+        lists = 1 / time_call(lambda: game_level.generate_level(rows, columns, level, seed=next(seeds)))
+        states = 1 / time_call(lambda: game_level.new_level(rows, columns, level, seed=next(seeds)))
+        if game_batch is not None:
+            batches = batch / time_call(lambda: game_batch.GameBatch.random_levels(batch, rows, columns, level,
+                                                                                  seed=next(seeds)))
+        else:
+            batches = float('nan')
+        print(f"{f'{rows}x{columns}':>10} {game_level.virus_count(level, rows, columns):>8} {lists:>10.0f} "
+              f"{states:>10.0f} {batches:>10.0f}")
+
+
+class BenchCase(NamedTuple):
+    """
+    One seeded board of the benchmark suite, see make_board.
+    """
+    rows: int
+    columns: int
+    fill: float = 0.5
+    capsules: int = 0
+    cascade: int = 0
+    seed: int = 0
+
+    @property
+    def name(self) -> str:
+        return (f"{self.rows}x{self.columns} fill={self.fill} capsules={self.capsules} "
+                f"cascade={self.cascade} seed={self.seed}")
+
+
+DEFAULT_CASES = (
+    BenchCase(16, 8, 0.25),
+    BenchCase(16, 8, 0.5),
+    BenchCase(16, 8, 0.25, capsules=12),
+    BenchCase(16, 8, 0.0, cascade=3),
+    BenchCase(64, 64, 0.5),
+    BenchCase(64, 64, 0.25, capsules=512),
+    BenchCase(64, 64, 0.25, cascade=12),
+    BenchCase(256, 256, 0.5),
+    BenchCase(256, 256, 0.25, cascade=48),
+    BenchCase(1000, 1000, 0.5),
+)
+
+
+def settle(game_state: game_logic.GameState) -> int:
+    """
+    Lets time pass, the way a2.py does for empty lines, until the faller has
+    frozen and nothing moves or matches.
+
+    Args:
+        game_state (GameState): The board.
+
+    Returns:
+        int: Number of ticks.
+    """
+    total = 0
+    while True:
+        game_state.test_faller_state()
+        ticks = game_state.fast_forward()
+        if not ticks:
+            return total
+        total += ticks
+
+
+def phase_setup(board: game_logic.GameState, phase: str) -> Callable[[], object]:
+    """
+    Prepares a fresh copy of a board for one phase; the copy is not timed.
+
+    Args:
+        board (GameState): The generated board, left unchanged.
+        phase (str): One of PHASES.
+
+    Returns:
+        Callable[[], object]: The call to time.
+    """
+    if phase == 'print_field':
+        return lambda: game_print.print_field(board, io.StringIO())
+    game_state = board.clone()
+    if phase == 'time_passed':
+        return game_state.time_passed
+    elif phase == 'find_matching':
+        game_state.invalidate_matching()  # a full scan, not an incremental one
+        return game_state.find_matching
+    elif phase == 'clear_matching':
+        return game_state.clear_matching
+    elif phase == 'apply_gravity':
+        game_state.clear_matching()
+        return game_state.apply_gravity
+    elif phase == 'cascade':
+        return lambda: settle(game_state)
+    raise ValueError(f"Unknown phase {phase!r}, expected one of {', '.join(PHASES)}.")
+
+
+def time_phase(setup: Callable[[], Callable[[], object]], repeat: int = 3,
+               min_time: float = 0.2) -> tuple[float, int, int]:
+    """
+    Times a call that needs a fresh setup every time, e.g. because it changes
+    the board. Each call is timed on its own, then once more under tracemalloc.
+
+    Args:
+        setup (Callable[[], Callable[[], object]]): Returns the call to time.
+        repeat (int, optional): The minimum number of timed calls.
+        min_time (float, optional): The minimum total time of the timed calls in seconds.
+
+    Returns:
+        tuple[float, int, int]: Median seconds per call, number of calls and peak bytes allocated by a call.
+    """
+    samples = []
+    while len(samples) < repeat or sum(samples) < min_time:
+        function = setup()
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+
+    function = setup()
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return statistics.median(samples), len(samples), peak
+
+
+def run_suite(cases: list[BenchCase], phases: list[str] = PHASES, repeat: int = 3,
+              min_time: float = 0.2, out=None, state_class: type = game_logic.GameState,
+              config: game_logic.GameConfig = game_logic.DEFAULT_CONFIG) -> dict:
+    """
+    Times every phase on every case and prints one line per result.
+
+    Args:
+        cases (list[BenchCase]): Boards to build.
+        phases (list[str], optional): Phases to time, the cascade phase only runs on cases with a cascade.
+        repeat (int, optional): The minimum number of timed calls per phase.
+        min_time (float, optional): The minimum total time per phase in seconds.
+        out (optional): Where to print, defaults to sys.stdout.
+        state_class (type, optional): The GameState class used as the engine.
+        config (GameConfig, optional): The match length and virus colors to play with.
+
+    Returns:
+        dict: The results, ready to be saved as JSON.
+    """
+    results = []
+    print(f"{'case':<46} {'phase':<14} {'runs':>5} {'time':>11} {'ops/sec':>11} {'peak':>10}", file=out)
+    for case in cases:
+        board = make_board(**case._asdict(), state_class=state_class, config=config)
+        pieces = len(board.half_capsules) + 2 * len(board.capsules)
+        for phase in phases:
+            if phase == 'cascade' and not case.cascade:
+                continue
+            seconds, runs, peak = time_phase(lambda: phase_setup(board, phase), repeat, min_time)
+            ops_per_sec = 1 / seconds if seconds else float('inf')
+            results.append({'case': case.name, **case._asdict(), 'pieces': pieces, 'phase': phase, 'runs': runs,
+                            'seconds': seconds, 'ops_per_sec': ops_per_sec, 'peak_bytes': peak})
+            print(f"{case.name:<46} {phase:<14} {runs:>5} {seconds * 1e3:>9.3f}ms {ops_per_sec:>11.1f} "
+                  f"{peak / 1024:>8.1f}KB", file=out)
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'engine': state_class.__name__,
+            'config': config._asdict(), 'results': results}
+
+
+def compare_results(baseline: dict, current: dict, threshold: float = 0.1, out=None) -> list[str]:
+    """
+    Compares two suite runs case by case and prints the change of every phase
+    that is in both.
+
+    Args:
+        baseline (dict): The results of the earlier run.
+        current (dict): The results of the new run.
+        threshold (float, optional): Allowed relative slowdown or memory growth, 0.1 for 10%.
+        out (optional): Where to print, defaults to sys.stdout.
+
+    Returns:
+        list[str]: A description of every regression beyond the threshold.
+    """
+    before = {(result['case'], result['phase']): result for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        key = (result['case'], result['phase'])
+        if key not in before:
+            continue
+        old = before[key]
+        time_ratio = result['seconds'] / old['seconds'] if old['seconds'] else 1.0
+        memory_ratio = result['peak_bytes'] / old['peak_bytes'] if old['peak_bytes'] else 1.0
+        flags = []
+        if time_ratio > 1 + threshold:
+            flags.append(f"{time_ratio:.2f}x slower")
+        if memory_ratio > 1 + threshold:
+            flags.append(f"{memory_ratio:.2f}x more memory")
+        print(f"{result['case']:<46} {result['phase']:<14} time {time_ratio:>6.2f}x memory {memory_ratio:>6.2f}x"
+              f"{'  REGRESSION' if flags else ''}", file=out)
+        regressions.extend(f"{result['case']} {result['phase']}: {flag}" for flag in flags)
+    return regressions
+
+
+def check_regressions(baseline_path: str, current: dict, threshold: float) -> None:
+    """
+    Compares a run with saved results and exits with status 1 if it regressed.
+
+    Args:
+        baseline_path (str): The JSON file of the earlier run.
+        current (dict): The results of the new run.
+        threshold (float): Allowed relative slowdown or memory growth.
+    """
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+    regressions = compare_results(baseline, current, threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {threshold:.0%}:", file=sys.stderr)
+        for regression in regressions:
+            print(f"  {regression}", file=sys.stderr)
+        sys.exit(1)
+
+
+def parse_size(value: str) -> tuple[int, int]:
+    """
+    Parses a board size such as 16x8.
+
+    Args:
+        value (str): ROWSxCOLUMNS.
+
+    Returns:
+        tuple[int, int]: Rows and columns.
+    """
+    try:
+        rows, columns = (int(part) for part in value.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected ROWSxCOLUMNS, got {value!r}")
+    return rows, columns
+
+
+def suite_cases(args: argparse.Namespace) -> list[BenchCase]:
+    """
+    Args:
+        args (argparse.Namespace): The options of the suite command.
+
+    Returns:
+        list[BenchCase]: DEFAULT_CASES, or every combination of the options given on the command line.
+    """
+    if not (args.sizes or args.fills or args.capsules or args.cascades):
+        return [case._replace(seed=args.seed) for case in DEFAULT_CASES]
+    return [BenchCase(rows, columns, fill, capsules, cascade, args.seed)
+            for rows, columns in args.sizes or [(16, 8)]
+            for fill in args.fills or [0.5]
+            for capsules in args.capsules or [0]
+            for cascade in args.cascades or [0]]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks for the game logic.')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+    clone_parser = subparsers.add_parser('clone', help='GameState.clone and snapshot against copy.deepcopy')
+    clone_parser.add_argument('--sizes', type=int, nargs='+', default=[16, 64, 256])
+    clone_parser.add_argument('--fill', type=float, default=0.5)
+    level_parser = subparsers.add_parser('level', help='levels per second of the game_level generator')
+    level_parser.add_argument('--sizes', type=parse_size, nargs='+', default=[(16, 8), (64, 64), (256, 256)])
+    level_parser.add_argument('--level', type=int, default=20)
+    level_parser.add_argument('--batch', type=int, default=1000, help='boards per GameBatch')
+    suite_parser = subparsers.add_parser('suite', help='time the hot paths of the game logic on seeded boards')
+    suite_parser.add_argument('--sizes', type=parse_size, nargs='+', help='board sizes such as 16x8 1000x1000')
+    suite_parser.add_argument('--fills', type=float, nargs='+')
+    suite_parser.add_argument('--capsules', type=int, nargs='+')
+    suite_parser.add_argument('--cascades', type=int, nargs='+', help='depths of the chain reactions')
+    suite_parser.add_argument('--seed', type=int, default=0)
+    suite_parser.add_argument('--engine', choices=a2.ENGINES, default='list')
+    a2.add_config_arguments(suite_parser)
+    suite_parser.add_argument('--phases', nargs='+', choices=PHASES, default=list(PHASES))
+    suite_parser.add_argument('--repeat', type=int, default=3, help='minimum number of timed calls per phase')
+    suite_parser.add_argument('--min-time', type=float, default=0.2, help='minimum seconds per phase')
+    suite_parser.add_argument('-o', '--output', help='where to save the results as JSON')
+    suite_parser.add_argument('--baseline', help='results of an earlier run to compare with')
+    suite_parser.add_argument('--threshold', type=float, default=0.1,
+                              help='relative slowdown or memory growth that fails the run')
+    compare_parser = subparsers.add_parser('compare', help='compare two saved suite runs')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help='relative slowdown or memory growth that fails the run')
+    args = parser.parse_args()
+
+    if args.benchmark == 'clone':
+        bench_clone(args.sizes, args.fill)
+
+    elif args.benchmark == 'level':
+        bench_levels(args.sizes, args.level, args.batch)
+
+    elif args.benchmark == 'suite':
+        results = run_suite(suite_cases(args), args.phases, args.repeat, args.min_time,
+                            state_class=a2.engine_class(args.engine), config=a2.config_from_args(suite_parser, args))
+        if args.output:
+            with open(args.output, 'w') as file:
+                json.dump(results, file, indent=1)
+        if args.baseline:
+            check_regressions(args.baseline, results, args.threshold)
+
+    elif args.benchmark == 'compare':
+        with open(args.current) as file:
+            check_regressions(args.baseline, json.load(file), args.threshold)
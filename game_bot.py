@@ -0,0 +1,546 @@
+import argparse
+import itertools
+import random
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+import game_logic
+
+
+MOVES = {
+    '<': 'move_left',
+    '>': 'move_right',
+    'A': 'rotate_clockwise',
+    'B': 'rotate_counterclockwise',
+    'D': 'hard_drop',
+    '': 'time_passed',
+}  # a2.py command -> the GameState method it runs
+
+DEFAULT_WEIGHTS = {
+    'viruses': -100.0,  # viruses left on the field
+    'height': -2.0,  # height of the highest column
+    'holes': -5.0,  # empty cells below an occupied cell of the same column
+    'pairs': 3.0,  # vertically or horizontally adjacent cells of the same color
+    'blocked': -1000.0,  # the next faller cannot be created
+}
+
+COLORS = 'RYB'
+
+
+class Placement(NamedTuple):
+    """
+    A final position of the faller and the commands that lead to it.
+    """
+    commands: tuple[str, ...]  # a2.py commands, the last one freezes the faller
+    game_state: game_logic.GameState  # the state right after the faller froze
+
+
+def run_command(game_state: game_logic.GameState, command: str) -> None:
+    """
+    Applies one move the way a2.py does: the faller state is checked first.
+
+    Args:
+        game_state (GameState): The state to change.
+        command (str): One of the keys of MOVES.
+    """
+    game_state.test_faller_state()
+    getattr(game_state, MOVES[command])()
+
+
+def _faller_steps(free: list[list[bool]], rows: int, columns: int, node: tuple) -> Iterator[tuple[str, tuple]]:
+    """
+    The moves of the faller on a settled field, following the checks of the
+    GameState control methods.
+
+    Args:
+        free (list[list[bool]]): Cells the faller may enter.
+        rows (int): Number of rows.
+        columns (int): Number of columns.
+        node (tuple): (row, col, vertical, swapped) of the bottom left half;
+            swapped tells whether the colors were swapped by rotating.
+
+    Yields:
+        tuple[str, tuple]: A command and the node it leads to, or None if the
+        command freezes the faller.
+    """
+    r, c, vertical, swapped = node
+    if vertical:
+        if c > 0 and free[r][c - 1] and free[r - 1][c - 1]:
+            yield '<', (r, c - 1, True, swapped)
+        if c < columns - 1 and free[r][c + 1] and free[r - 1][c + 1]:
+            yield '>', (r, c + 1, True, swapped)
+        if 0 < r < rows and c < columns - 1 and free[r][c + 1]:
+            yield 'A', (r, c, False, swapped)
+            yield 'B', (r, c, False, not swapped)
+        elif 0 < r < rows and c > 0 and free[r][c - 1]:  # wall kick
+            yield 'A', (r, c - 1, False, swapped)
+            yield 'B', (r, c - 1, False, not swapped)
+    else:
+        if c > 0 and free[r][c - 1]:
+            yield '<', (r, c - 1, False, swapped)
+        if c + 1 < columns - 1 and free[r][c + 2]:
+            yield '>', (r, c + 1, False, swapped)
+        if 0 < r < rows and free[r - 1][c]:
+            yield 'A', (r, c, True, not swapped)
+            yield 'B', (r, c, True, swapped)
+
+    cols = (c,) if vertical else (c, c + 1)
+    fall = 0
+    while r + fall + 1 < rows and all(free[r + fall + 1][col] for col in cols):
+        fall += 1
+    if fall:
+        yield 'D', (r + fall, c, vertical, swapped)
+    yield '', (r + 1, c, vertical, swapped) if fall else None
+
+
+def _search_faller(game_state: game_logic.GameState) -> tuple[tuple, dict, list]:
+    """
+    Breadth-first search over the faller positions on a grid of free cells.
+    All orientations share one search and no GameState is touched.
+
+    Args:
+        game_state (GameState): A state with a faller.
+
+    Returns:
+        tuple[tuple, dict, list]: The start node, node -> (parent node, command)
+        for the shortest paths, and the nodes a tick freezes the faller in.
+    """
+    free = [[cell == ' ' for cell in row] for row in game_state.field]
+    for half_capsule in game_state.faller:
+        free[half_capsule.row][half_capsule.col] = True
+    first = game_state.faller[0]
+    start = (first.row, first.col, first.orientation == 'vertical', False)
+
+    parents = {start: None}
+    finals = []
+    queue = deque([start])
+    while queue:
+        node = queue.popleft()
+        for command, child in _faller_steps(free, game_state.rows, game_state.columns, node):
+            if child is None:
+                finals.append(node)
+            elif child not in parents:
+                parents[child] = (node, command)
+                queue.append(child)
+    return start, parents, finals
+
+
+def _replay_placements(game_state: game_logic.GameState, deadline: float = None) -> list[Placement] | None:
+    """
+    Runs the shortest paths found by _search_faller on clones of the state.
+    The paths form a tree, so shared prefixes are simulated once and a state
+    is only cloned where paths split.
+
+    Args:
+        game_state (GameState): A state with a faller; it is not changed.
+        deadline (float, optional): time.perf_counter() value at which to stop early.
+
+    Returns:
+        list[Placement] | None: The placements, or None if the field was not
+        settled and the faller did not move as the search expected.
+    """
+    start, parents, finals = _search_faller(game_state)
+    children = {}
+    for node in finals:
+        while parents[node] is not None:
+            parent, command = parents[node]
+            siblings = children.setdefault(parent, {})
+            if node in siblings:
+                break
+            siblings[node] = command
+            node = parent
+    finals = set(finals)
+
+    placements = {}  # zobrist -> Placement
+    stack = [(start, (), game_state.clone())]
+    while stack:
+        if deadline is not None and time.perf_counter() > deadline and placements:
+            break
+        node, commands, state = stack.pop()
+        faller = state.faller
+        if not faller or (faller[0].row, faller[0].col, faller[0].orientation == 'vertical') != node[:3]:
+            return None
+
+        steps = [(child, command) for child, command in children.get(node, {}).items()]
+        if node in finals:
+            steps.append((None, ''))
+        for i, (child, command) in enumerate(steps):
+            child_state = state if i == len(steps) - 1 else state.clone()
+            run_command(child_state, command)
+            if child is not None:
+                stack.append((child, commands + (command,), child_state))
+            elif child_state.faller:
+                return None
+            else:
+                # both color orders of a one-color capsule end in the same state
+                placement = placements.get(child_state.zobrist)
+                if placement is None or len(placement.commands) > len(commands) + 1:
+                    placements[child_state.zobrist] = Placement(commands + (command,), child_state)
+    return list(placements.values())
+
+
+def _simulate_placements(game_state: game_logic.GameState, deadline: float = None) -> list[Placement]:
+    """
+    Finds the placements by running every command on clones of the state,
+    merging states by their Zobrist hash. Slower than _replay_placements but
+    exact even while other pieces are still falling.
+
+    Args:
+        game_state (GameState): A state with a faller; it is not changed.
+        deadline (float, optional): time.perf_counter() value at which to stop early.
+
+    Returns:
+        list[Placement]: The placements, in the order they were found.
+    """
+    placements = []
+    seen = {game_state.zobrist}
+    frontier = deque([((), game_state)])
+    while frontier:
+        if deadline is not None and time.perf_counter() > deadline and placements:
+            break
+        commands, node = frontier.popleft()
+        for command in MOVES:
+            child = node.clone()
+            run_command(child, command)
+            if child.zobrist in seen:
+                continue
+            seen.add(child.zobrist)
+            if child.faller:
+                frontier.append((commands + (command,), child))
+            else:
+                placements.append(Placement(commands + (command,), child))
+    return placements
+
+
+def find_placements(game_state: game_logic.GameState, deadline: float = None) -> list[Placement]:
+    """
+    Finds every position the faller can freeze in, each with the shortest
+    command sequence that leads there. The faller positions are searched on a
+    grid of free cells first, sharing the work between all orientations, and
+    only the paths to the placements are then run on the game state. If the
+    field is not settled, so that the faller does not move as expected, every
+    command is simulated instead.
+
+    Args:
+        game_state (GameState): A state with a faller; it is not changed.
+        deadline (float, optional): time.perf_counter() value at which the search stops early.
+
+    Returns:
+        list[Placement]: The placements.
+    """
+    if not game_state.faller or game_state.game_over:
+        return []
+    placements = _replay_placements(game_state, deadline)
+    if placements is None:
+        placements = _simulate_placements(game_state, deadline)
+    return placements
+
+
+def settle(game_state: game_logic.GameState, max_ticks: int = None) -> int:
+    """
+    Lets time pass until nothing moves and nothing is matched anymore. The
+    last tick is the one that changed nothing.
+
+    Args:
+        game_state (GameState): A state without a faller.
+        max_ticks (int, optional): Upper bound on the ticks, defaults to the number of cells.
+
+    Returns:
+        int: The number of ticks that passed.
+    """
+    if max_ticks is None:
+        max_ticks = max(1, game_state.rows * game_state.columns)
+    for ticks in range(1, max_ticks + 1):
+        before = game_state.zobrist
+        run_command(game_state, '')
+        if game_state.zobrist == before and not game_state.matched_set:
+            break
+    return ticks
+
+
+def features(game_state: game_logic.GameState) -> dict[str, float]:
+    """
+    Measures the field for the heuristic.
+
+    Args:
+        game_state (GameState): The state to measure.
+
+    Returns:
+        dict[str, float]: 'viruses', 'height', 'holes', 'pairs' and 'blocked', see DEFAULT_WEIGHTS.
+    """
+    field = game_state.field
+    viruses = 0
+    height = 0
+    holes = 0
+    pairs = 0
+    for c in range(game_state.columns):
+        top = None
+        for r in range(game_state.rows):
+            cell = field[r][c]
+            if cell == ' ':
+                if top is not None:
+                    holes += 1
+                continue
+            if top is None:
+                top = r
+            if cell in game_state.virus_counts:
+                viruses += 1
+            color = cell.upper()
+            if r + 1 < game_state.rows and field[r + 1][c].upper() == color:
+                pairs += 1
+            if c + 1 < game_state.columns and field[r][c + 1].upper() == color:
+                pairs += 1
+        if top is not None:
+            height = max(height, game_state.rows - top)
+
+    col = game_state.columns // 2 if game_state.columns % 2 != 0 else game_state.columns // 2 - 1
+    blocked = game_state.rows > 1 and (game_state.field[1][col] != ' ' or game_state.field[1][col + 1] != ' ')
+    return {'viruses': viruses, 'height': height, 'holes': holes, 'pairs': pairs, 'blocked': float(blocked)}
+
+
+def evaluate(game_state: game_logic.GameState, weights: dict[str, float] = None) -> float:
+    """
+    The default heuristic: a weighted sum of the features.
+
+    Args:
+        game_state (GameState): A settled state.
+        weights (dict[str, float], optional): Feature weights, defaults to DEFAULT_WEIGHTS.
+
+    Returns:
+        float: The score, higher is better.
+    """
+    weights = DEFAULT_WEIGHTS if weights is None else weights
+    measured = features(game_state)
+    return sum(weight * measured[name] for name, weight in weights.items())
+
+
+def score_snapshot(snapshot: game_logic.GameSnapshot, heuristic: Callable[[game_logic.GameState], float]) -> float:
+    """
+    Settles and scores a placement sent to a worker process.
+
+    Args:
+        snapshot (GameSnapshot): The state right after the faller froze.
+        heuristic (Callable[[GameState], float]): The scoring function.
+
+    Returns:
+        float: The score of the settled state.
+    """
+    game_state = game_logic.GameState(snapshot.config)
+    game_state.restore(snapshot)
+    game_state.resolve()
+    return heuristic(game_state)
+
+
+class Bot:
+    """
+    Plays Dr. Mario through the GameState control API: for every faller it
+    enumerates the reachable placements, settles each one and takes the best
+    by the heuristic.
+
+    Args:
+        heuristic (Callable[[GameState], float], optional): Scores a settled state,
+            higher is better. Defaults to evaluate with DEFAULT_WEIGHTS. With
+            workers > 1 it must be picklable, e.g. a module-level function.
+        time_budget (float, optional): Seconds per move for the search and the scoring.
+        workers (int, optional): Processes used to score placements; 1 scores them in this process.
+        table_size (int, optional): Entries of the transposition table caching scores.
+    """
+    def __init__(self, heuristic: Callable[[game_logic.GameState], float] = evaluate,
+                 time_budget: float = 1.0, workers: int = 1, table_size: int = 1 << 16) -> None:
+        self.heuristic = heuristic
+        self.time_budget = time_budget
+        self.workers = workers
+        self.table = game_logic.TranspositionTable(table_size)
+        self._executor = None
+
+    def close(self) -> None:
+        """
+        Shuts down the worker processes, if any were started.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self) -> 'Bot':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _score_locally(self, placements: list[Placement], deadline: float) -> dict[int, float]:
+        """
+        Settles and scores placements in this process until the deadline, but at least one.
+
+        Args:
+            placements (list[Placement]): The placements to score.
+            deadline (float): time.perf_counter() value at which to stop.
+
+        Returns:
+            dict[int, float]: Index in placements -> score.
+        """
+        scores = {}
+        for i, placement in enumerate(placements):
+            if scores and time.perf_counter() > deadline:
+                break
+            settled = placement.game_state.clone()
+            settled.resolve()
+            scores[i] = self.heuristic(settled)
+        return scores
+
+    def _score_in_pool(self, placements: list[Placement], deadline: float) -> dict[int, float]:
+        """
+        Settles and scores placements on the worker processes, with at most
+        two per worker in flight and none sent after the deadline. Scores that
+        are not ready at the deadline are dropped, unless none is ready at
+        all; the placements still queued are cancelled, and the ones already
+        started finish in the background.
+
+        Args:
+            placements (list[Placement]): The placements to score.
+            deadline (float): time.perf_counter() value at which to stop waiting.
+
+        Returns:
+            dict[int, float]: Index in placements -> score.
+        """
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.workers)
+        queue = iter(enumerate(placements))
+        futures = {}  # future -> index in placements
+
+        def submit(count: int) -> set:
+            submitted = set()
+            for i, placement in itertools.islice(queue, count):
+                future = self._executor.submit(score_snapshot, placement.game_state.snapshot(), self.heuristic)
+                futures[future] = i
+                submitted.add(future)
+            return submitted
+
+        pending = submit(2 * self.workers)
+        scores = {}
+        while pending:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0 and scores:
+                break
+            done, pending = wait(pending, timeout=timeout if timeout > 0 else None, return_when=FIRST_COMPLETED)
+            for future in done:
+                scores[futures[future]] = future.result()
+            if time.perf_counter() < deadline:
+                pending |= submit(len(done))
+        for future in pending:
+            future.cancel()
+        return scores
+
+    def choose(self, game_state: game_logic.GameState) -> Placement | None:
+        """
+        Picks the best placement for the current faller.
+
+        Args:
+            game_state (GameState): A state with a faller; it is not changed.
+
+        Returns:
+            Placement | None: The best placement, or None if there is no faller.
+        """
+        deadline = time.perf_counter() + self.time_budget
+        placements = find_placements(game_state, deadline)
+        if not placements:
+            return None
+
+        scores = {}
+        unscored = []
+        for i, placement in enumerate(placements):
+            score = self.table.get(placement.game_state.zobrist)
+            if score is None:
+                unscored.append(i)
+            else:
+                scores[i] = score
+        if unscored:
+            batch = [placements[i] for i in unscored]
+            if self.workers > 1 and len(batch) > 1:
+                new_scores = self._score_in_pool(batch, deadline)
+            else:
+                new_scores = self._score_locally(batch, deadline)
+            for j, score in new_scores.items():
+                self.table.put(batch[j].game_state.zobrist, score)
+                scores[unscored[j]] = score
+
+        best = max(scores, key=lambda i: (scores[i], -len(placements[i].commands), -i))
+        return placements[best]
+
+    def play(self, game_state: game_logic.GameState, capsules: Iterable[tuple[str, str]]) -> Iterator[str]:
+        """
+        Plays the given capsules on game_state and yields the a2.py commands it
+        ran, so that feeding them to a2.py after the field setup replays the game.
+        Stops at game over or when no viruses are left.
+
+        Args:
+            game_state (GameState): The state to play on; it is changed.
+            capsules (Iterable[tuple[str, str]]): Left and right colors of each faller.
+
+        Yields:
+            str: The commands, e.g. 'F R B', '<', 'A' or '' for a tick.
+        """
+        for color1, color2 in capsules:
+            if game_state.game_over or not game_state.detect_viruses():
+                return
+            while game_state.faller:  # a faller handed over by the caller is dropped first
+                run_command(game_state, '')
+                yield ''
+            game_state.test_faller_state()
+            game_state.create_faller(color1, color2)
+            yield f'F {color1} {color2}'
+            if game_state.game_over:
+                return
+
+            placement = self.choose(game_state)
+            for command in placement.commands:
+                run_command(game_state, command)
+                yield command
+            for _ in range(settle(game_state)):
+                yield ''
+
+
+def random_capsules(seed: int = None) -> Iterator[tuple[str, str]]:
+    """
+    Yields an endless seeded sequence of random capsule colors.
+
+    Args:
+        seed (int, optional): Seed of the random generator.
+
+    Yields:
+        tuple[str, str]: The left and right colors.
+    """
+    rnd = random.Random(seed)
+    while True:
+        yield rnd.choice(COLORS), rnd.choice(COLORS)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Lets the bot play a random level and prints the a2.py input '
+                                                 'script of the game, e.g. as load for soak tests.')
+    parser.add_argument('rows', type=int)
+    parser.add_argument('columns', type=int)
+    parser.add_argument('--viruses', type=int, default=8)
+    parser.add_argument('--capsules', type=int, default=100, help='maximum number of fallers')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--budget', type=float, default=1.0, help='seconds per move')
+    parser.add_argument('-j', '--workers', type=int, default=1, help='processes used to score placements')
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    game_state = game_logic.GameState()
+    game_state.initialize_field(args.rows, args.columns, 'EMPTY')
+    lines = [str(args.rows), str(args.columns), 'EMPTY']
+    for _ in range(args.viruses):
+        row = rnd.randrange(args.rows // 3, args.rows)
+        col = rnd.randrange(args.columns)
+        color = rnd.choice(COLORS)
+        game_state.create_virus(row, col, color)
+        lines.append(f'V {row} {col} {color}')
+
+    capsules = itertools.islice(random_capsules(rnd.randrange(1 << 32)), args.capsules)
+    with Bot(time_budget=args.budget, workers=args.workers) as bot:
+        lines.extend(bot.play(game_state, capsules))
+    lines.append('Q')
+    print('\n'.join(lines))
@@ -0,0 +1,379 @@
+from collections import deque
+from typing import Callable, NamedTuple
+
+import a2
+import game_logic
+from game_logic import HalfCapsule
+
+
+class HistoryEntry(NamedTuple):
+    """
+    What one command changed. Only the cells and pieces it touched are kept,
+    each with its value before and after the command.
+    """
+    command: str
+    cells: tuple[tuple[int, int, str, str], ...]  # row, column, old and new character
+    halves: tuple[tuple[HalfCapsule, tuple, tuple], ...]  # half capsule, placement before and after
+    capsules: tuple[tuple[tuple[HalfCapsule, HalfCapsule], int | None, int | None], ...]  # capsule, serial before and after
+    state: tuple  # the faller, game over flag, hashes and match caches after the command, see GameHistory._state
+
+
+class GameHistory:
+    """
+    Undo and redo for a game state. Every command run through the history is
+    recorded as the cells and pieces it changed, so memory grows with how
+    much the commands changed and undoing or redoing a command takes time in
+    the size of its change, not of the board.
+
+    The game state reports its changes through its journal while a command
+    runs, so every change has to go through run() or apply(). initialize_field,
+    restore and place_viruses write the field directly; call clear() after them.
+
+    Pieces keep their order in half_capsules and capsules, which decides
+    which capsule falls first: each one gets a serial number when it is
+    added, and a piece put back by undo is reinserted before the pieces with
+    higher serials.
+
+    Args:
+        game_state (GameState): The game state to record.
+        limit (int, optional): The most commands that can be undone; older ones are forgotten.
+    """
+    def __init__(self, game_state: game_logic.GameState, limit: int = None) -> None:
+        self.game_state = game_state
+        self.limit = limit
+        self._done = deque()  # HistoryEntry, oldest first
+        self._undone = []  # HistoryEntry, the next one to redo last
+        self._serials = {}  # piece in half_capsules or capsules -> serial, in the order they were added
+        self._next_serial = 0
+        self._base = None  # GameHistory._state before the oldest entry in _done
+        self._cells = {}  # while a command runs: (row, col) -> character before the command
+        self._halves = {}  # while a command runs: HalfCapsule -> placement before the command
+        self._capsules = {}  # while a command runs: capsule -> serial before the command
+        self.clear()
+
+    @property
+    def undo_count(self) -> int:
+        """
+        Returns:
+            int: How many commands can be undone.
+        """
+        return len(self._done)
+
+    @property
+    def redo_count(self) -> int:
+        """
+        Returns:
+            int: How many undone commands can be redone.
+        """
+        return len(self._undone)
+
+    def clear(self) -> None:
+        """
+        Forgets every recorded command and starts over from the current state.
+        """
+        self._done.clear()
+        self._undone.clear()
+        self._serials.clear()
+        self._next_serial = 0
+        for pieces in (self.game_state.half_capsules, self.game_state.capsules):
+            for piece in pieces:
+                self._serials[piece] = self._next_serial
+                self._next_serial += 1
+        self._base = self._state()
+
+    def run(self, command: str) -> None:
+        """
+        Runs one line of a2.py input and records it, checking the faller
+        state first as the a2.py game loop does before every command.
+
+        Args:
+            command (str): The command line.
+        """
+        def step(game_state: game_logic.GameState) -> None:
+            game_state.test_faller_state()
+            a2.run_command(game_state, command)
+
+        self.apply(step, command)
+
+    def apply(self, action: Callable[[game_logic.GameState], object], command: str = '') -> object:
+        """
+        Calls a function on the game state and records what it changed as
+        one command, e.g. history.apply(GameState.move_left, '<'). Undone
+        commands can no longer be redone afterwards.
+
+        Args:
+            action (Callable[[GameState], object]): Changes the game state through its methods.
+            command (str, optional): A label for the command.
+
+        Returns:
+            object: What action returned.
+
+        Raises:
+            RuntimeError: If the game state is already recording a command.
+        """
+        game_state = self.game_state
+        if game_state.journal is not None:
+            raise RuntimeError("The game state is already recording a command.")
+        game_state.journal = self
+        try:
+            result = action(game_state)
+        finally:
+            game_state.journal = None
+            entry = self._commit(command)
+        self._undone.clear()
+        self._done.append(entry)
+        if self.limit is not None and len(self._done) > self.limit:
+            self._base = self._done.popleft().state
+        return result
+
+    def undo(self, steps: int = 1) -> int:
+        """
+        Takes back the last recorded commands.
+
+        Args:
+            steps (int, optional): How many commands to take back.
+
+        Returns:
+            int: How many were taken back, fewer if the history ran out.
+        """
+        undone = 0
+        while undone < steps and self._done:
+            entry = self._done.pop()
+            self._apply(entry, after=False)
+            self._set_state(self._done[-1].state if self._done else self._base)
+            self._undone.append(entry)
+            undone += 1
+        return undone
+
+    def redo(self, steps: int = 1) -> int:
+        """
+        Runs undone commands again, by putting back what they changed.
+
+        Args:
+            steps (int, optional): How many commands to redo.
+
+        Returns:
+            int: How many were redone, fewer if there was nothing left to redo.
+        """
+        redone = 0
+        while redone < steps and self._undone:
+            entry = self._undone.pop()
+            self._apply(entry, after=True)
+            self._set_state(entry.state)
+            self._done.append(entry)
+            redone += 1
+        return redone
+
+    def cell(self, row: int, col: int, old_value: str) -> None:
+        """
+        Called by the game state before it writes a cell.
+
+        Args:
+            row (int): Row position.
+            col (int): Column position.
+            old_value (str): The character in the cell.
+        """
+        self._cells.setdefault((row, col), old_value)
+
+    def half(self, half_capsule: HalfCapsule) -> None:
+        """
+        Called by the game state before it changes a half capsule, its place
+        in the cell index or whether it is on the field.
+
+        Args:
+            half_capsule (HalfCapsule): The half capsule.
+        """
+        if half_capsule not in self._halves:
+            self._halves[half_capsule] = self._placement(half_capsule, self._serials.get(half_capsule))
+            capsule = self.game_state._capsule_of.get(half_capsule)
+            if capsule is not None:
+                self.capsule(capsule)
+
+    def capsule(self, capsule: tuple[HalfCapsule, HalfCapsule]) -> None:
+        """
+        Called by the game state before it adds or removes a capsule.
+
+        Args:
+            capsule: A tuple of two HalfCapsule objects
+        """
+        if capsule not in self._capsules:
+            self._capsules[capsule] = self._serials.get(capsule)
+            for half_capsule in capsule:
+                self.half(half_capsule)
+
+    def _placement(self, half_capsule: HalfCapsule, serial: int | None) -> tuple:
+        """
+        Args:
+            half_capsule (HalfCapsule): The half capsule.
+            serial (int | None): Its serial if it is in half_capsules, else None.
+
+        Returns:
+            tuple: Its attributes (see HalfCapsule.to_tuple), whether the cell
+            index points to it, the serial and the capsule it belongs to.
+        """
+        game_state = self.game_state
+        indexed = game_state._cells.get((half_capsule.row, half_capsule.col)) is half_capsule
+        return half_capsule.to_tuple(), indexed, serial, game_state._capsule_of.get(half_capsule)
+
+    def _state(self) -> tuple:
+        """
+        Returns:
+            tuple: The parts of the game state that are not kept per cell or
+            piece: faller, game_over, zobrist, the faller's part of it and
+            the match caches. The window sets are frozen, as find_matching
+            changes them in place; matched_set is replaced on every scan.
+        """
+        game_state = self.game_state
+        return (game_state.faller, game_state.game_over, game_state.zobrist, game_state._faller_key,
+                game_state.matched_set,
+                tuple((r, frozenset(windows)) for r, windows in game_state._row_windows.items()),
+                tuple((c, frozenset(windows)) for c, windows in game_state._col_windows.items()),
+                frozenset(game_state._dirty_cells), game_state._rescan_all)
+
+    def _set_state(self, state: tuple) -> None:
+        """
+        Puts back a state from _state.
+
+        Args:
+            state (tuple): The output of _state.
+        """
+        game_state = self.game_state
+        (game_state.faller, game_state.game_over, game_state.zobrist, game_state._faller_key,
+         game_state.matched_set, row_windows, col_windows, dirty_cells, game_state._rescan_all) = state
+        game_state._row_windows = {r: set(windows) for r, windows in row_windows}
+        game_state._col_windows = {c: set(windows) for c, windows in col_windows}
+        game_state._dirty_cells = set(dirty_cells)
+        game_state._settled = None  # the pieces were put back without the checks of _is_quiet
+
+    def _commit(self, command: str) -> HistoryEntry:
+        """
+        Turns what the journal saw during a command into a history entry and
+        gives serials to the pieces the command added.
+
+        Args:
+            command (str): A label for the command.
+
+        Returns:
+            HistoryEntry: The entry.
+        """
+        game_state = self.game_state
+        field = game_state.field
+        cells = tuple((r, c, old_value, field[r][c]) for (r, c), old_value in self._cells.items()
+                      if field[r][c] != old_value)
+
+        serials = self._serials
+        added = {}  # pieces that are new in half_capsules or capsules -> serial
+        for pieces, touched in ((game_state.half_capsules, self._halves), (game_state.capsules, self._capsules)):
+            new = [piece for piece in touched if piece in pieces and piece not in serials]
+            if new:  # pieces are only added at the end, so the last len(new) ones are the new ones
+                last = [piece for piece, _ in zip(reversed(pieces), new)]
+                for piece in reversed(last):
+                    added[piece] = self._next_serial
+                    self._next_serial += 1
+
+        halves = []
+        for half_capsule, before in self._halves.items():
+            if half_capsule in game_state.half_capsules:
+                serial = added.get(half_capsule, serials.get(half_capsule))
+            else:
+                serial = None
+                serials.pop(half_capsule, None)
+            after = self._placement(half_capsule, serial)
+            if after != before:
+                halves.append((half_capsule, before, after))
+        capsules = []
+        for capsule, before in self._capsules.items():
+            if capsule in game_state.capsules:
+                serial = added.get(capsule, serials.get(capsule))
+            else:
+                serial = None
+                serials.pop(capsule, None)
+            if serial != before:
+                capsules.append((capsule, before, serial))
+        serials.update(added)
+
+        self._cells = {}
+        self._halves = {}
+        self._capsules = {}
+        return HistoryEntry(command, cells, tuple(halves), tuple(capsules), self._state())
+
+    def _apply(self, entry: HistoryEntry, after: bool) -> None:
+        """
+        Puts the cells and pieces an entry changed back to how they were
+        before or after its command. The cell index and the matchable cells
+        follow; the hashes and match caches are set afterwards by _set_state.
+
+        Args:
+            entry (HistoryEntry): The entry.
+            after (bool): True to redo the command, False to undo it.
+        """
+        game_state = self.game_state
+        for row, col, old_value, new_value in entry.cells:
+            game_state._set_cell(row, col, new_value if after else old_value)
+
+        index = game_state._cells
+        positions = set()
+        for half_capsule, _, _ in entry.halves:  # unindex all first, as the pieces may swap cells
+            position = (half_capsule.row, half_capsule.col)
+            if index.get(position) is half_capsule:
+                del index[position]
+                positions.add(position)
+
+        half_capsules = game_state.half_capsules
+        readded = []
+        for half_capsule, before, now in entry.halves:
+            data, indexed, serial, capsule = now if after else before
+            (half_capsule.color, half_capsule.row, half_capsule.col,
+             half_capsule.state, half_capsule.orientation, half_capsule.delay) = data
+            if indexed:
+                position = (half_capsule.row, half_capsule.col)
+                index[position] = half_capsule
+                positions.add(position)
+            if serial is None:
+                if half_capsule in half_capsules:
+                    del half_capsules[half_capsule]
+                    del self._serials[half_capsule]
+            elif half_capsule not in half_capsules:
+                readded.append((serial, half_capsule))
+            if capsule is None:
+                game_state._capsule_of.pop(half_capsule, None)
+            else:
+                game_state._capsule_of[half_capsule] = capsule
+        self._reinsert(half_capsules, readded)
+
+        readded = []
+        for capsule, before, now in entry.capsules:
+            serial = now if after else before
+            if serial is None:
+                del game_state.capsules[capsule]
+                del self._serials[capsule]
+            else:
+                readded.append((serial, capsule))
+        self._reinsert(game_state.capsules, readded)
+
+        for position in positions:
+            game_state._refresh_cell(position)
+
+    def _reinsert(self, pieces: dict, readded: list[tuple[int, object]]) -> None:
+        """
+        Puts pieces back into half_capsules or capsules at the place their
+        serials give them. Only the pieces with higher serials are moved.
+
+        Args:
+            pieces (dict): half_capsules or capsules.
+            readded (list[tuple[int, object]]): Serial and piece of each piece to put back.
+        """
+        if not readded:
+            return
+        serials = self._serials
+        first = min(serial for serial, _ in readded)
+        later = []
+        for piece in reversed(pieces):
+            if serials[piece] < first:
+                break
+            later.append((serials[piece], piece))
+        for _, piece in later:
+            del pieces[piece]
+        for serial, piece in sorted(readded + later, key=lambda item: item[0]):
+            pieces[piece] = None
+            serials[piece] = serial
@@ -0,0 +1,279 @@
+import argparse
+import itertools
+import os
+import random
+from typing import Iterator
+
+import a2
+import game_logic
+
+
+VIRUS_COLORS = 'ryb'  # field characters of the viruses a level is made of
+CAPSULE_COLORS = 'RYB'
+MAX_LEVEL = 20  # levels above this one have the same number of viruses
+CAPSULE_CHUNK = 128  # capsules drawn from the random generator at a time
+
+
+def virus_count(level: int, rows: int, columns: int) -> int:
+    """
+    Returns the number of viruses of a level: 4 per level from 4 at level 0 on
+    a 16x8 board, scaled by the area of the board, and at most what fits
+    below virus_top.
+
+    Args:
+        level (int): The level, 0 or more.
+        rows (int): Number of rows.
+        columns (int): Number of columns.
+
+    Returns:
+        int: The number of viruses.
+    """
+    count = round(4 * (min(level, MAX_LEVEL) + 1) * rows * columns / 128)
+    return min(count, (rows - virus_top(level, rows)) * columns)
+
+
+def virus_top(level: int, rows: int) -> int:
+    """
+    Returns the highest row viruses may be put in: the bottom 10 of 16 rows up
+    to level 14, one more row at levels 15, 17 and 19, scaled by the height of
+    the board. The top two rows, where fallers are created, stay empty.
+
+    Args:
+        level (int): The level, 0 or more.
+        rows (int): Number of rows.
+
+    Returns:
+        int: The row.
+    """
+    height = 10 + sum(level >= threshold for threshold in (15, 17, 19))
+    return max(rows - rows * height // 16, min(2, rows))
+
+
+def virus_colors(config: game_logic.GameConfig) -> str:
+    """
+    Args:
+        config (GameConfig): The rules of the game.
+
+    Returns:
+        str: The virus colors levels under config are drawn from. The default
+        colors keep the order of VIRUS_COLORS, which the default levels have
+        always been drawn in.
+    """
+    if config.colors == game_logic.DEFAULT_CONFIG.colors:
+        return VIRUS_COLORS
+    return ''.join(config.colors)
+
+
+def generate_viruses(rows: int, columns: int, count: int, top: int = 2, seed: int = None,
+                     colors: str = VIRUS_COLORS, match_length: int = 4) -> list[tuple[int, int, str]]:
+    """
+    Places viruses at random cells from row top down, with about as many of
+    each color, so that no match_length in a row or column have the same
+    color. The cells are filled row by row, and a virus that would end such
+    a run gets another color, so no board has to be thrown away. That takes
+    three colors, as a virus can end a run to its left and one above it.
+
+    This is plain Python: at level 20 about 9000 16x8 or 230 64x64 boards
+    per second, and new_level, which also builds the GameState, about 6000
+    and 180. Only game_batch.GameBatch.random_levels makes thousands of
+    64x64 boards per second. `python game_bench.py level` prints the rates.
+
+    Args:
+        rows (int): Number of rows.
+        columns (int): Number of columns.
+        count (int): Number of viruses.
+        top (int, optional): The highest row a virus may be put in.
+        seed (int, optional): Seed of the random generator.
+        colors (str, optional): The field characters of the viruses.
+        match_length (int, optional): The run length that must not occur, see GameConfig.
+
+    Returns:
+        list[tuple[int, int, str]]: Row, column and color of each virus, row by row.
+
+    Raises:
+        ValueError: If the viruses do not fit below row top, or there are
+            viruses and fewer than three colors.
+    """
+    if count and len(set(colors)) < 3:
+        raise ValueError(f"Levels need three virus colors to avoid runs, not {len(set(colors))}.")
+    region = max(rows - top, 0) * columns
+    if not 0 <= count <= region:
+        raise ValueError(f"{count} viruses do not fit in the {region} cells from row {top} down.")
+    rnd = random.Random(seed)
+    cells = rnd.sample(range(region), count)
+    cells.sort()
+    palette = list(itertools.islice(itertools.cycle(colors), count))
+    rnd.shuffle(palette)
+
+    grid = [None] * region  # color of each cell from row top down, None if empty
+    span = match_length - 1  # cells before a virus that would make a run with it
+    above = span * columns
+    viruses = []
+    for cell, color in zip(cells, palette):
+        col = cell % columns
+        # the colors that would end a run of match_length to the left or above
+        left = grid[cell - 1] if col >= span \
+            and all(grid[cell - i] == grid[cell - 1] for i in range(2, span + 1)) else None
+        up = grid[cell - columns] if cell >= above \
+            and all(grid[cell - i * columns] == grid[cell - columns] for i in range(2, span + 1)) else None
+        if color == left or color == up:
+            color = rnd.choice([other for other in colors if other != left and other != up])
+        grid[cell] = color
+        viruses.append((top + cell // columns, col, color))
+    return viruses
+
+
+def generate_level(rows: int, columns: int, level: int = 0, density: float = None, seed: int = None,
+                   colors: str = VIRUS_COLORS, match_length: int = 4) -> list[tuple[int, int, str]]:
+    """
+    Generates the viruses of a level, see generate_viruses.
+
+    Args:
+        rows (int): Number of rows.
+        columns (int): Number of columns.
+        level (int, optional): The level, which sets the number of viruses and how high they go.
+        density (float, optional): Share of the cells from virus_top down that hold
+            a virus, instead of the number of viruses of the level.
+        seed (int, optional): Seed of the random generator.
+        colors (str, optional): The field characters of the viruses.
+        match_length (int, optional): The run length that must not occur, see GameConfig.
+
+    Returns:
+        list[tuple[int, int, str]]: Row, column and color of each virus.
+    """
+    top = virus_top(level, rows)
+    if density is None:
+        count = virus_count(level, rows, columns)
+    else:
+        count = round(density * (rows - top) * columns)
+    return generate_viruses(rows, columns, count, top, seed, colors, match_length)
+
+
+def new_level(rows: int, columns: int, level: int = 0, density: float = None, seed: int = None,
+              state_class: type = game_logic.GameState,
+              config: game_logic.GameConfig = game_logic.DEFAULT_CONFIG) -> game_logic.GameState:
+    """
+    Builds a game state holding a generated level, see generate_level. The
+    viruses have the colors of config and no run of its match length.
+
+    Args:
+        rows (int): Number of rows.
+        columns (int): Number of columns.
+        level (int, optional): The level.
+        density (float, optional): Share of the cells that hold a virus, instead of the level's count.
+        seed (int, optional): Seed of the random generator.
+        state_class (type, optional): The GameState class used as the engine.
+        config (GameConfig, optional): The match length and virus colors to play with.
+
+    Returns:
+        GameState: The new game, without a faller.
+
+    Raises:
+        ValueError: See generate_viruses.
+    """
+    game_state = state_class(config=config)
+    game_state.initialize_field(rows, columns, 'EMPTY')
+    game_state.place_viruses(generate_level(rows, columns, level, density, seed, virus_colors(config),
+                                            config.match_length))
+    return game_state
+
+
+def capsule_stream(seed: int = None, colors: str = CAPSULE_COLORS) -> Iterator[tuple[str, str]]:
+    """
+    Yields an endless, deterministic sequence of capsule colors. The colors
+    are drawn CAPSULE_CHUNK capsules at a time, so a seed always gives the
+    same sequence however much of it is read.
+
+    Args:
+        seed (int, optional): Seed of the random generator.
+        colors (str, optional): The colors to draw from.
+
+    Yields:
+        tuple[str, str]: The left and right colors.
+    """
+    rnd = random.Random(seed)
+    while True:
+        chunk = rnd.choices(colors, k=2 * CAPSULE_CHUNK)
+        yield from zip(chunk[::2], chunk[1::2])
+
+
+def capsule_sequence(count: int, seed: int = None, colors: str = CAPSULE_COLORS) -> list[tuple[str, str]]:
+    """
+    Args:
+        count (int): Number of capsules.
+        seed (int, optional): Seed of the random generator.
+        colors (str, optional): The colors to draw from.
+
+    Returns:
+        list[tuple[str, str]]: The first count capsules of capsule_stream(seed).
+    """
+    return list(itertools.islice(capsule_stream(seed, colors), count))
+
+
+def level_script(rows: int, columns: int, viruses: list[tuple[int, int, str]],
+                 capsules: list[tuple[str, str]], seed: int = None) -> list[str]:
+    """
+    Writes an a2.py input script for a generated level: the field as CONTENTS,
+    then every capsule created, moved a random number of columns, maybe
+    rotated, and dropped with as many ticks as the board has rows.
+
+    Args:
+        rows (int): Number of rows.
+        columns (int): Number of columns.
+        viruses (list[tuple[int, int, str]]): Row, column and color of each virus.
+        capsules (list[tuple[str, str]]): The colors of the fallers.
+        seed (int, optional): Seed of the random moves.
+
+    Returns:
+        list[str]: The lines of the script, ending with Q.
+    """
+    contents = [[' '] * columns for _ in range(rows)]
+    for row, col, color in viruses:
+        contents[row][col] = color
+    lines = [str(rows), str(columns), 'CONTENTS', *(''.join(row) for row in contents)]
+    rnd = random.Random(seed)
+    for color1, color2 in capsules:
+        lines.append(f'F {color1} {color2}')
+        if rnd.random() < 0.5:
+            lines.append(rnd.choice('AB'))
+        lines.extend([rnd.choice('<>')] * rnd.randrange(columns // 2 + 1))
+        lines.extend([''] * rows)
+    lines.append('Q')
+    return lines
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generates seeded levels as a2.py input scripts, e.g. as load '
+                                                 'for game_runner.py or game_server.py.')
+    parser.add_argument('rows', type=int)
+    parser.add_argument('columns', type=int)
+    parser.add_argument('--level', type=int, default=0)
+    parser.add_argument('--density', type=float, default=None,
+                        help='share of the cells below the virus line that hold a virus, instead of the level')
+    parser.add_argument('--capsules', type=int, default=20, help='fallers per script')
+    parser.add_argument('--boards', type=int, default=1, help='number of scripts')
+    parser.add_argument('--seed', type=int, default=0)
+    a2.add_config_arguments(parser)
+    parser.add_argument('-o', '--output', help='directory to write the scripts to, by default one is printed')
+    args = parser.parse_args()
+
+    if args.output is None and args.boards != 1:
+        parser.error('--boards needs --output')
+    config = a2.config_from_args(parser, args)
+    colors = virus_colors(config)
+    if len(set(colors)) < 3:
+        parser.error('--colors needs at least three colors')
+    if args.output is not None:
+        os.makedirs(args.output, exist_ok=True)
+    for board in range(args.boards):
+        seed = args.seed + board
+        rnd = random.Random(seed)  # separate seeds for the viruses, the capsules and the moves
+        viruses = generate_level(args.rows, args.columns, args.level, args.density, rnd.randrange(1 << 32),
+                                 colors, config.match_length)
+        capsules = capsule_sequence(args.capsules, rnd.randrange(1 << 32), colors.upper())
+        script = '\n'.join(level_script(args.rows, args.columns, viruses, capsules, rnd.randrange(1 << 32))) + '\n'
+        if args.output is None:
+            print(script, end='')
+        else:
+            with open(os.path.join(args.output, f'level{args.level}-{seed}.txt'), 'w') as file:
+                file.write(script)
@@ -1,3 +1,117 @@
+import hashlib
+import heapq
+import itertools
+import sys
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Iterable, Iterator, NamedTuple
+
+
+VIRUSES = ('r', 'b', 'y')  # the field characters counted as viruses by default, see GameConfig
+DEBUG_CHECKS = False  # if True, detect_viruses also runs GameState.check_consistency
+
+_ZOBRIST_KEYS = {}  # key parts -> random 64-bit key
+_ZOBRIST_MASK = (1 << 64) - 1
+
+
+def zobrist_key(*parts: Hashable) -> int:
+    """
+    Returns the 64-bit Zobrist key of one feature of a board, e.g. a field
+    character; zobrist_at places it in a cell. Keys are derived from a hash of
+    the parts, so they are the same in every process and run.
+
+    Args:
+        *parts (Hashable): Numbers and strings describing the feature.
+
+    Returns:
+        int: The key.
+    """
+    key = _ZOBRIST_KEYS.get(parts)
+    if key is None:
+        digest = hashlib.blake2b(repr(parts).encode(), digest_size=8).digest()
+        key = _ZOBRIST_KEYS[parts] = int.from_bytes(digest, 'little')
+    return key
+
+
+def zobrist_at(key: int, row: int, col: int) -> int:
+    """
+    Returns the Zobrist key of a feature in one cell. The key is mixed with the
+    position (integer tuple hashing does not depend on the hash seed) instead
+    of being stored for every cell, so large boards cost no extra memory.
+
+    Args:
+        key (int): A key from zobrist_key.
+        row (int): Row position.
+        col (int): Column position.
+
+    Returns:
+        int: The key of the feature in that cell.
+    """
+    return hash((key, row, col)) & _ZOBRIST_MASK
+
+
+class TranspositionTable:
+    """
+    A bounded mapping from board hashes (GameState.zobrist) to cached values,
+    e.g. evaluations of a search. When it is full the least recently used
+    entry is evicted.
+
+    Args:
+        max_size (int, optional): The maximum number of entries.
+    """
+    def __init__(self, max_size: int = 1 << 16) -> None:
+        if max_size < 1:
+            raise ValueError("The transposition table must hold at least one entry.")
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key: Hashable, default=None):
+        """
+        Looks up a key and marks it as recently used.
+
+        Args:
+            key (Hashable): Usually a zobrist hash.
+            default (optional): Returned when the key is not stored.
+
+        Returns:
+            The stored value, or default.
+        """
+        try:
+            self._entries.move_to_end(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return self._entries[key]
+
+    def put(self, key: Hashable, value) -> None:
+        """
+        Stores a value, evicting the least recently used entry if the table is full.
+
+        Args:
+            key (Hashable): Usually a zobrist hash.
+            value: The value to store.
+        """
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Removes every entry and resets the hit counters.
+        """
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
 
 
 class HalfCapsule:
@@ -12,28 +126,242 @@ class HalfCapsule:
         orientation (str, optional): if this half capsule form a capsule with another half capsule,
         they will have a orientation indicating whether they are horizontal or vertical.
     """
+    __slots__ = ('color', 'row', 'col', 'state', 'orientation', 'delay')
+
     def __init__(self, color: str, row: int, col: int, state: str, orientation: str = None) -> None:
-        self.color = color.upper()
+        self.color = sys.intern(color.upper())  # shared by all half capsules of the color
         self.row = row  # The index of the cell
         self.col = col
         self.state = state  # falling, landed, frozen
         self.orientation = orientation
         self.delay = False  # this is used when half capsule detach from another half capsule
 
+    def copy(self) -> 'HalfCapsule':
+        """
+        Returns:
+            HalfCapsule: A new half capsule with the same attributes.
+        """
+        half_capsule = HalfCapsule.__new__(HalfCapsule)
+        half_capsule.color = self.color
+        half_capsule.row = self.row
+        half_capsule.col = self.col
+        half_capsule.state = self.state
+        half_capsule.orientation = self.orientation
+        half_capsule.delay = self.delay
+        return half_capsule
+
+    def to_tuple(self) -> tuple:
+        """
+        Returns:
+            tuple: (color, row, col, state, orientation, delay)
+        """
+        return self.color, self.row, self.col, self.state, self.orientation, self.delay
+
+    @classmethod
+    def from_tuple(cls, data: tuple) -> 'HalfCapsule':
+        """
+        Builds a half capsule from the output of to_tuple.
+
+        Args:
+            data (tuple): (color, row, col, state, orientation, delay)
+
+        Returns:
+            HalfCapsule: The new half capsule.
+        """
+        color, row, col, state, orientation, delay = data
+        half_capsule = cls(color, row, col, state, orientation)
+        half_capsule.delay = delay
+        return half_capsule
+
+
+class GameConfig(NamedTuple):
+    """
+    Rule variants a GameState is played with. The defaults are the rules of a2.py.
+    """
+    match_length: int = 4  # fewest same-colored cells in a row or column that are cleared
+    colors: tuple[str, ...] = VIRUSES  # field characters of the viruses; capsules use the upper-case ones
+
+
+DEFAULT_CONFIG = GameConfig()
+
+
+class GameSnapshot(NamedTuple):
+    """
+    An immutable copy of a GameState, made by GameState.snapshot(). Half
+    capsules are stored in the HalfCapsule.to_tuple format.
+    """
+    rows: int
+    columns: int
+    field: tuple[tuple[str, ...], ...]
+    half_capsules: tuple[tuple, ...]
+    capsules: tuple[tuple[tuple, tuple], ...]
+    faller: int | None  # index of the faller in capsules
+    game_over: bool
+    matched_set: frozenset
+    row_windows: tuple[tuple[int, frozenset], ...]  # row -> (start, stop) of its matched runs
+    col_windows: tuple[tuple[int, frozenset], ...]  # column -> (start, stop) of its matched runs
+    dirty_cells: frozenset
+    rescan_all: bool
+    zobrist: int
+    config: GameConfig = DEFAULT_CONFIG  # the rules the state is played with
+
+
+class ChainResult(NamedTuple):
+    """
+    What GameState.resolve cleared on the way to a stable board.
+    """
+    chains: int  # matches cleared one after another
+    cleared: tuple[frozenset[tuple[int, int]], ...]  # cells cleared in each step of the chain, in order
+    ticks: int  # time steps time_passed would take to get to the same board
+
+
+TICK_PHASES = ('clear_matching', 'sort', 'apply_gravity', 'find_matching')  # timed steps of a tick, in order
+
+
+def _no_clock() -> float:
+    """
+    Stands in for time.perf_counter in time steps without a profiler.
+
+    Returns:
+        float: Always 0.0.
+    """
+    return 0.0
+
+
+class TickRecord(NamedTuple):
+    """
+    What happened in one time step of a profiled GameState, see TickProfiler.
+    """
+    tick: int  # number of the tick since the profiler was attached or reset
+    times: dict[str, float]  # seconds spent in each of TICK_PHASES
+    total: float  # seconds spent in the whole tick
+    matched: int  # cells cleared
+    moved: int  # half capsules that fell at least one row
+    split: int  # capsules split into two half capsules
+    cascade: int  # matches cleared since the board was last quiet, this one included
+
+
+class TickProfiler:
+    """
+    Collects timings and counters of the time steps of a GameState. Attach it
+    with game_state.profiler = TickProfiler(); without a profiler a time step
+    only pays for a few calls of a clock that does nothing.
+
+    Args:
+        sink (Callable[[TickRecord], None], optional): Called with the record of every tick,
+            e.g. to export them.
+    """
+    def __init__(self, sink: Callable[[TickRecord], None] = None) -> None:
+        self.sink = sink
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Clears all totals.
+        """
+        self.ticks = 0
+        self.skipped_ticks = 0  # ticks passed without running a step, see GameState.fast_forward
+        self.times = dict.fromkeys(TICK_PHASES, 0.0)
+        self.total = 0.0
+        self.counts = {'matched': 0, 'moved': 0, 'split': 0}
+        self.cascade = 0  # depth of the current chain of matches
+        self.max_cascade = 0
+
+    def tick(self, times: dict[str, float], total: float, matched: int, moved: int, split: int,
+             quiet: bool) -> TickRecord:
+        """
+        Adds one profiled tick to the totals and passes its record to the sink.
+
+        Args:
+            times (dict[str, float]): Seconds spent in each of TICK_PHASES.
+            total (float): Seconds spent in the whole tick.
+            matched (int): Cells cleared.
+            moved (int): Half capsules that fell.
+            split (int): Capsules split into half capsules.
+            quiet (bool): Whether nothing is left to match or fall after the tick;
+                only looked at while a cascade is going on.
+
+        Returns:
+            TickRecord: The record of the tick.
+        """
+        self.ticks += 1
+        for phase, seconds in times.items():
+            self.times[phase] += seconds
+        self.total += total
+        self.counts['matched'] += matched
+        self.counts['moved'] += moved
+        self.counts['split'] += split
+        if matched:
+            self.cascade += 1
+            self.max_cascade = max(self.max_cascade, self.cascade)
+        record = TickRecord(self.ticks, times, total, matched, moved, split, self.cascade)
+        if quiet and not matched:
+            self.cascade = 0
+        if self.sink is not None:
+            self.sink(record)
+        return record
+
+    def skip(self, ticks: int) -> None:
+        """
+        Counts ticks that passed without a step being run.
+
+        Args:
+            ticks (int): Number of ticks.
+        """
+        self.skipped_ticks += ticks
+
+    def report(self) -> str:
+        """
+        Returns:
+            str: A summary of the totals, one line per phase and counter.
+        """
+        lines = [f"ticks {self.ticks} (+{self.skipped_ticks} skipped), {self.total * 1e3:.3f}ms"]
+        for phase, seconds in self.times.items():
+            share = seconds / self.total if self.total else 0.0
+            lines.append(f"  {phase:<15} {seconds * 1e3:>10.3f}ms {share:>6.1%}")
+        for name, count in self.counts.items():
+            lines.append(f"  {name:<15} {count:>10}")
+        lines.append(f"  {'max cascade':<15} {self.max_cascade:>10}")
+        return '\n'.join(lines) + '\n'
+
 
 class GameState:
     """
     Keeps track of the game field, current capsules, and matching state.
+
+    Args:
+        config (GameConfig, optional): The match length and virus colors to play with.
+
+    Raises:
+        ValueError: If the match length is less than 2.
     """
-    def __init__(self):
+    def __init__(self, config: GameConfig = DEFAULT_CONFIG) -> None:
+        if config.match_length < 2:
+            raise ValueError("The match length must be at least 2.")
+        self.config = config
         self.rows = 0
         self.columns = 0
         self.field = []
         self.faller = None  # The currently falling capsule
-        self.half_capsules = []
-        self.capsules = []
+        self.half_capsules = {}  # used as an ordered set of HalfCapsule
+        self.capsules = {}  # used as an ordered set of (HalfCapsule, HalfCapsule)
         self.game_over = False
         self.matched_set = set()
+        self._cells = {}  # (row, col) -> the HalfCapsule in that cell
+        self._capsule_of = {}  # HalfCapsule -> the capsule it belongs to
+        self._unmatchable = set()  # cells of half capsules that are not frozen
+        self._dirty_cells = set()  # cells changed since the last find_matching
+        self._rescan_all = True
+        self._row_windows = {}  # row -> (start, stop) columns of its matched runs
+        self._col_windows = {}  # column -> (start, stop) rows of its matched runs
+        self.zobrist = 0  # hash of the cells, the pieces and the faller, see compute_zobrist
+        self.column_tops = []  # top occupied row of each column, rows if the column is empty
+        self._column_bits = []  # bit r of column c is set if field[r][c] is not empty
+        self.virus_counts = dict.fromkeys(config.colors, 0)  # viruses left on the field, by field character
+        self._faller_key = 0  # the part of zobrist that comes from the faller
+        self._settled = None  # True while every piece but the faller is known to rest, see _is_quiet
+        self.profiler = None  # a TickProfiler that time steps report to, if any
+        self.journal = None  # a game_history.GameHistory recording the running command, if any
 
     def initialize_field(self, rows: int, columns: int, setting: str, contents: list[str] = None) -> None:
         """
@@ -47,7 +375,11 @@ class GameState:
         """
         self.rows = rows
         self.columns = columns
-        self.field = [[" " for _ in range(columns)] for _ in range(rows)]
+        self.field = self._empty_field(rows, columns)
+        self._settled = None
+        self.invalidate_matching()
+        self._reset_field_counts()
+        self._reset_zobrist()
 
         if setting == 'EMPTY':
             return
@@ -57,35 +389,532 @@ class GameState:
                 if len(line) != columns:
                     raise ValueError(f"Line {i + 1} must have exactly {self.columns} characters.")
                 for j, character in enumerate(line):
-                    self.field[i][j] = ' ' if character == ' ' else character
+                    if character != ' ':
+                        self._write_cell(i, j, character)
 
-            for i in range(self.rows):
-                for j in range(self.columns):
-                    character = self.field[i][j]
+            for i, line in enumerate(contents):
+                for j, character in enumerate(line):
                     if character.isupper():
                         if i == self.rows - 1 or self.field[i + 1][j] != ' ':
                             half_capsule = HalfCapsule(character, i, j, 'frozen')
                         else:
                             half_capsule = HalfCapsule(character, i, j, 'falling')
-                        self.half_capsules.append(half_capsule)
+                        self.half_capsules[half_capsule] = None
+                        self._add_half(half_capsule)
+
+            self._reset_field_counts()
+            self._reset_zobrist()
+            self.invalidate_matching()
+            self.find_matching()
+
+    def _empty_field(self, rows: int, columns: int) -> list[list[str]]:
+        """
+        Args:
+            rows (int): Number of rows.
+            columns (int): Number of columns.
+
+        Returns:
+            list[list[str]]: An empty field of the given size.
+        """
+        return [[" " for _ in range(columns)] for _ in range(rows)]
+
+    def _write_cell(self, row: int, col: int, value: str) -> None:
+        """
+        Stores a character in the field, without any of the bookkeeping of _set_cell.
 
+        Args:
+            row (int): Row position.
+            col (int): Column position.
+            value (str): The new content of the cell.
+        """
+        self.field[row][col] = value
+
+    def _copy_field(self) -> list[list[str]]:
+        """
+        Returns:
+            list[list[str]]: A copy of the field that can be assigned to another state.
+        """
+        return [row[:] for row in self.field]
+
+    def clone(self) -> 'GameState':
+        """
+        Makes an independent copy of this game state. The copy has its own half
+        capsules, and its faller is the matching capsule in its own capsules.
+        The profiler and the journal are not copied.
+
+        Returns:
+            GameState: The copy.
+        """
+        clone = self.__class__.__new__(self.__class__)
+        clone.__dict__.update(self.__dict__)
+        clone.field = self._copy_field()
+
+        copies = {}
+        clone.half_capsules = {}
+        for half_capsule in self.half_capsules:
+            copies[half_capsule] = half_capsule.copy()
+            clone.half_capsules[copies[half_capsule]] = None
+        clone.capsules = {}
+        clone._capsule_of = {}
+        for capsule in self.capsules:
+            copy = (capsule[0].copy(), capsule[1].copy())
+            copies[capsule[0]], copies[capsule[1]] = copy
+            clone.capsules[copy] = None
+            clone._capsule_of[copy[0]] = clone._capsule_of[copy[1]] = copy
+            if capsule is self.faller:
+                clone.faller = copy
+        clone._cells = {position: copies[half_capsule] for position, half_capsule in self._cells.items()}
+
+        clone._unmatchable = set(self._unmatchable)
+        clone._dirty_cells = set(self._dirty_cells)
+        clone.matched_set = set(self.matched_set)
+        clone._row_windows = {r: set(windows) for r, windows in self._row_windows.items()}
+        clone._col_windows = {c: set(windows) for c, windows in self._col_windows.items()}
+        clone.column_tops = self.column_tops[:]
+        clone._column_bits = self._column_bits[:]
+        clone.virus_counts = dict(self.virus_counts)
+        clone.profiler = None
+        clone.journal = None
+        return clone
+
+    def snapshot(self) -> GameSnapshot:
+        """
+        Encodes the whole game state in immutable tuples, e.g. to store it or
+        to go back to it later with restore().
+
+        Returns:
+            GameSnapshot: The encoded state.
+        """
+        faller = None
+        capsules = []
+        for i, capsule in enumerate(self.capsules):
+            if capsule is self.faller:
+                faller = i
+            capsules.append((capsule[0].to_tuple(), capsule[1].to_tuple()))
+        return GameSnapshot(
+            self.rows, self.columns,
+            tuple(tuple(row) for row in self.field),
+            tuple(half_capsule.to_tuple() for half_capsule in self.half_capsules),
+            tuple(capsules), faller, self.game_over,
+            frozenset(self.matched_set),
+            tuple((r, frozenset(windows)) for r, windows in self._row_windows.items()),
+            tuple((c, frozenset(windows)) for c, windows in self._col_windows.items()),
+            frozenset(self._dirty_cells), self._rescan_all, self.zobrist, self.config)
+
+    def restore(self, snapshot: GameSnapshot) -> None:
+        """
+        Puts this game state back to a snapshot, including the rules it was
+        played with.
+
+        Args:
+            snapshot (GameSnapshot): A snapshot from any game state.
+        """
+        self.config = snapshot.config
+        self.rows = snapshot.rows
+        self.columns = snapshot.columns
+        self.field = [list(row) for row in snapshot.field]
+        self._settled = None
+        self._reset_field_counts()
+        self.half_capsules = {}
+        self.capsules = {}
+        self._cells = {}
+        self._capsule_of = {}
+        self._unmatchable = set()
+        for data in snapshot.half_capsules:
+            half_capsule = HalfCapsule.from_tuple(data)
+            self.half_capsules[half_capsule] = None
+            self._add_half(half_capsule)
+        self.faller = None
+        for i, (data0, data1) in enumerate(snapshot.capsules):
+            capsule = (HalfCapsule.from_tuple(data0), HalfCapsule.from_tuple(data1))
+            self._add_capsule(capsule)
+            if i == snapshot.faller:
+                self.faller = capsule
+
+        self.game_over = snapshot.game_over
+        self.matched_set = set(snapshot.matched_set)
+        self._row_windows = {r: set(windows) for r, windows in snapshot.row_windows}
+        self._col_windows = {c: set(windows) for c, windows in snapshot.col_windows}
+        self._dirty_cells = set(snapshot.dirty_cells)
+        self._rescan_all = snapshot.rescan_all
+        self._faller_key = self._faller_zobrist()
+        self.zobrist = snapshot.zobrist
+
+    def time_passed(self, ticks: int = 1) -> int:
+        """
+        Updates the field for one or more time steps. Between two steps the
+        faller state is checked, as a2.py does before every command, so after
+        test_faller_state() time_passed(n) does the same as n empty input lines.
+        Steps in which only the faller falls are skipped over at once, see
+        fast_forward.
+
+        Args:
+            ticks (int, optional): Number of time steps.
+
+        Returns:
+            int: The number of time steps that were run or jumped over. It is
+            less than ticks if the board became quiet first, as the remaining
+            steps would not change anything.
+        """
+        if ticks == 1:
+            self._tick()
+            return 1
+
+        passed = 0
+        while passed < ticks:
+            if passed:
+                self.test_faller_state()
+            step = self.fast_forward(ticks - passed)
+            if not step:  # nothing moves anymore, the remaining steps change nothing
+                if self.profiler is not None:
+                    self.profiler.skip(ticks - passed)
+                break
+            passed += step
+        return passed
+
+    def fast_forward(self, max_ticks: int = None) -> int:
+        """
+        Lets time pass until the board changes in some other way than the faller
+        falling one more row: the steps in which the faller only falls are done
+        in one jump, then one normal step is run, in which the faller lands or
+        freezes, or matches are cleared and pieces fall. The faller state is
+        checked between steps as in time_passed. Only the faller falling onto
+        an otherwise settled board is jumped over; while a match is pending or
+        other pieces fall, e.g. after a clear, every call runs a single step.
+
+        Args:
+            max_ticks (int, optional): The most time steps to let pass.
+
+        Returns:
+            int: The number of time steps that passed; 0 if nothing would change
+            anymore (no faller, nothing matched and nothing left to fall).
+        """
+        if max_ticks is not None and max_ticks < 1:
+            return 0
+        if not self.faller and self._is_quiet():
+            return 0
+
+        passed = self._faller_fall_distance()
+        if max_ticks is not None:
+            passed = min(passed, max_ticks)
+        if passed:
+            self._drop_faller(passed)
             self.find_matching()
+            if self.profiler is not None:
+                self.profiler.skip(passed)
+        if max_ticks is None or passed < max_ticks:
+            if passed:
+                self.test_faller_state()
+            self._tick()
+            passed += 1
+        return passed
+
+    def _is_quiet(self) -> bool:
+        """
+        Checks that a time step would not change anything but the faller:
+        nothing is matched, and every other piece is frozen and rests on
+        something that is not the faller. Once the pieces were found to rest,
+        that is remembered until a piece other than the faller is added,
+        removed, moved or changes state, or a virus is cleared, so a board
+        that stays settled is only walked once and not on every jump.
 
-    def time_passed(self) -> None:
+        Returns:
+            bool: True if only the faller can move.
         """
-        Updates the field for one time step.
+        if self.find_matching():
+            return False
+        if not self._settled:
+            if not self._pieces_rest():
+                return False
+            self._settled = True
+        return True
+
+    def _pieces_rest(self) -> bool:
         """
+        Walks every piece, see _is_quiet.
+
+        Returns:
+            bool: True if every piece but the faller is frozen and rests on
+            something that is not the faller.
+        """
+        faller_cells = {(half_capsule.row, half_capsule.col) for half_capsule in self.faller or ()}
+
+        def supported(half_capsule: HalfCapsule) -> bool:
+            below = (half_capsule.row + 1, half_capsule.col)
+            return half_capsule.row == self.rows - 1 \
+                or (self.field[below[0]][below[1]] != ' ' and below not in faller_cells)
+
+        for half_capsule in self.half_capsules:
+            if half_capsule.state != 'frozen' or not supported(half_capsule):
+                return False
+        for capsule in self.capsules:
+            if capsule is self.faller:
+                continue
+            if capsule[0].state != 'frozen' or capsule[1].state != 'frozen':
+                return False
+            if capsule[0].orientation == 'horizontal':
+                if not supported(capsule[0]) and not supported(capsule[1]):
+                    return False
+            elif not supported(capsule[0]):
+                return False
+        return True
+
+    def _faller_fall_distance(self) -> int:
+        """
+        Counts the coming time steps in which the only change is the faller
+        falling one row.
+
+        Returns:
+            int: The number of rows the faller falls before it lands, or 0 if
+            the faller is not falling or other pieces would move too.
+        """
+        if not self.faller or self.game_over or self.faller[0].state != 'falling' \
+                or self.faller[1].state != 'falling' or not self._is_quiet():
+            return 0
+
+        return self._landing_distance()
+
+    def _landing_distance(self) -> int:
+        """
+        Returns:
+            int: The number of empty rows below the faller.
+        """
+        bottom = self.faller[0]
+        landing = self.next_occupied_row(bottom.row, bottom.col)
+        if bottom.orientation == 'horizontal':
+            landing = min(landing, self.next_occupied_row(bottom.row, self.faller[1].col))
+        return landing - bottom.row - 1
+
+    def _drop_faller(self, distance: int) -> None:
+        """
+        Moves the faller down in one go, the same as the time steps in which it falls.
+
+        Args:
+            distance (int): Number of rows to move down; those cells must be empty.
+        """
+        for half_capsule in self.faller:
+            self._set_cell(half_capsule.row, half_capsule.col, ' ')
+        for half_capsule in self.faller:
+            self._set_cell(half_capsule.row + distance, half_capsule.col, half_capsule.color)
+        for half_capsule in self.faller:  # faller[0] is the bottom half, so it never lands on faller[1]
+            self._move_half(half_capsule, distance, 0)
+        self._rehash_faller()
+
+    def resolve(self) -> ChainResult:
+        """
+        Lets time pass until nothing is matched and nothing falls anymore,
+        and reports the chain of matches cleared on the way. The board goes
+        through the same time steps as with time_passed, but only one scan
+        looks at every piece: after it, a time step only visits the pieces
+        that can fall, the pieces next to the cleared cells and the pieces
+        that lose their support, instead of sorting every piece on the board.
+
+        Returns:
+            ChainResult: The number of matches cleared one after another, the
+            cells of each, and the number of time steps that passed.
+
+        Raises:
+            ValueError: If there is a faller; let it freeze with time_passed first.
+        """
+        if self.faller:
+            raise ValueError("Cannot resolve the board while there is a faller.")
+        cleared = []
+        ticks = 0
+        pieces = None  # the pieces that can fall, None if they have to be looked up
+        while True:
+            matched_set = self.find_matching()
+            if matched_set:
+                cleared.append(frozenset(matched_set))
+                if self.profiler is not None:  # every step that clears a match is timed
+                    self._tick()
+                    pieces = None
+                else:
+                    pieces = self._clear_step(pieces)
+            else:
+                if pieces is None:
+                    pieces = [piece for piece in (*self.half_capsules, *self.capsules) if self._can_fall(piece)]
+                if not pieces:
+                    break
+                pieces = self._gravity_step(pieces)
+                if self.profiler is not None:
+                    self.profiler.skip(1)
+            ticks += 1
+        return ChainResult(len(cleared), tuple(cleared), ticks)
+
+    def _can_fall(self, piece: HalfCapsule | tuple[HalfCapsule, HalfCapsule]) -> bool:
+        """
+        Args:
+            piece (HalfCapsule | tuple[HalfCapsule, HalfCapsule]): A half capsule or a capsule.
+
+        Returns:
+            bool: True if apply_gravity would change the piece while nothing is matched.
+        """
+        if isinstance(piece, HalfCapsule):
+            return piece.state == 'falling' or (piece.state == 'frozen' and piece.row < self.rows - 1
+                                                and self.field[piece.row + 1][piece.col] == ' ')
+        first, second = piece
+        if first.state != second.state or first.state not in ('falling', 'frozen') or first.row == self.rows - 1:
+            return False
+        if first.orientation == 'horizontal':
+            return self.field[first.row + 1][first.col] == ' ' and self.field[second.row + 1][second.col] == ' '
+        return self.field[first.row + 1][first.col] == ' '
+
+    def _clear_step(self, pieces: list[HalfCapsule | tuple[HalfCapsule, HalfCapsule]] | None) \
+            -> list[HalfCapsule | tuple[HalfCapsule, HalfCapsule]]:
+        """
+        Runs a time step that clears the matched cells, like _tick without a
+        faller, for the pieces that can fall and the pieces next to the
+        cleared cells only, see _gravity_step.
+
+        Args:
+            pieces (list[HalfCapsule | tuple[HalfCapsule, HalfCapsule]] | None): Every piece
+                that can fall, or None to look them up.
+
+        Returns:
+            list[HalfCapsule | tuple[HalfCapsule, HalfCapsule]]: Every piece that can fall in the next step.
+        """
+        if pieces is None:
+            pieces = [piece for piece in (*self.half_capsules, *self.capsules) if self._can_fall(piece)]
+        matched_set = self.matched_set
+        split = set()  # the halves of split capsules that are not cleared
+        for position in matched_set:
+            capsule = self._capsule_of.get(self._cells.get(position))
+            if capsule is not None:
+                split.update(half_capsule for half_capsule in capsule
+                             if (half_capsule.row, half_capsule.col) not in matched_set)
         self.clear_matching()
 
-        self.apply_gravity()
+        visit = {piece for piece in pieces if piece in self.half_capsules or piece in self.capsules}
+        visit.update(split)
+        for row, col in matched_set:  # the pieces on cleared cells wait or stop apply_gravity
+            above = self._cells.get((row - 1, col))
+            if above is not None:
+                visit.add(self._capsule_of.get(above, above))
+        return self._gravity_step(list(visit))
+
+    def _gravity_step(self, pieces: list[HalfCapsule | tuple[HalfCapsule, HalfCapsule]]) \
+            -> list[HalfCapsule | tuple[HalfCapsule, HalfCapsule]]:
+        """
+        Runs apply_gravity and find_matching for the given pieces only. They
+        are visited in the order of apply_gravity, half capsules before
+        capsules and lower pieces first, capsules in the same row in the order
+        of capsules; a piece that loses what it rests on joins the step if
+        apply_gravity would only get to it later.
+
+        Args:
+            pieces (list[HalfCapsule | tuple[HalfCapsule, HalfCapsule]]): Every piece that
+                apply_gravity would change.
+
+        Returns:
+            list[HalfCapsule | tuple[HalfCapsule, HalfCapsule]]: Every piece that can fall in the next step.
+        """
+        def order(piece: HalfCapsule | tuple[HalfCapsule, HalfCapsule]) -> tuple[int, int]:
+            if isinstance(piece, HalfCapsule):
+                return 0, -piece.row
+            return 1, -max(piece[0].row, piece[1].row)
+
+        queue = [(order(piece), i, piece) for i, piece in enumerate(pieces)]
+        heapq.heapify(queue)
+        seen = set(pieces)
+        visited = []
+        later = []  # pieces that lost their support after apply_gravity got to them
+        cells = self._cells
+        capsule_of = self._capsule_of
+        capsule_index = None
+
+        def uncovered(row: int, col: int, key: tuple[int, int]) -> None:
+            # the cell (row, col) was left empty: the piece on it may fall now
+            above = cells.get((row - 1, col))
+            if above is None:
+                return
+            above = capsule_of.get(above, above)
+            if above in seen:
+                return
+            seen.add(above)
+            above_key = order(above)
+            if above_key > key:
+                heapq.heappush(queue, (above_key, len(seen), above))
+            else:
+                later.append(above)
+
+        while queue:
+            key, _, piece = heapq.heappop(queue)
+            if isinstance(piece, HalfCapsule):
+                row = piece.row
+                self._fall_half(piece)
+                visited.append(piece)
+                if piece.row != row:
+                    uncovered(row, piece.col, key)
+                continue
+
+            group = [piece]
+            while queue and queue[0][0] == key:
+                group.append(heapq.heappop(queue)[2])
+            if len(group) > 1 and self.matched_set:  # the first capsule on a cleared cell stops the rest
+                if capsule_index is None:
+                    capsule_index = {capsule: i for i, capsule in enumerate(self.capsules)}
+                group.sort(key=capsule_index.__getitem__)
+            for i, capsule in enumerate(group):
+                first, second = capsule
+                row = first.row
+                if not self._fall_capsule(capsule):
+                    later.extend(group[i:])
+                    later.extend(item[2] for item in queue)
+                    queue = []
+                    break
+                visited.append(capsule)
+                if first.row != row:
+                    if first.orientation == 'horizontal':
+                        uncovered(row, first.col, key)
+                        uncovered(row, second.col, key)
+                    else:  # only the cell of the top half is left
+                        uncovered(second.row - 1, second.col, key)
+
+        self.find_matching()
+        return [piece for piece in visited + later if self._can_fall(piece)]
+
+    def _tick(self) -> None:
+        """
+        Updates the field for one time step. With a profiler attached, each
+        phase is timed and what the step did is counted for it; without one,
+        clock does nothing and nothing is counted.
+        """
+        profiler = self.profiler
+        if profiler is not None:
+            pieces = list(self.half_capsules)
+            for capsule in self.capsules:
+                pieces.extend(capsule)
+            rows = [half_capsule.row for half_capsule in pieces]
+            capsule_count = len(self.capsules)
+            clock = time.perf_counter
+        else:
+            clock = _no_clock
+
+        start = clock()
+        self.clear_matching()
+        matched = len(self.matched_set)
+        after_clear = clock()
+        order = self._gravity_order()
+        after_sort = clock()
+        self._apply_gravity(*order)
 
         if self.faller and self.faller[0].state == 'landed' and self.faller[1].state == 'landed':
-            self.faller[0].state = 'frozen'
-            self.faller[1].state = 'frozen'
+            self._set_state(self.faller[0], 'frozen')
+            self._set_state(self.faller[1], 'frozen')
             self.faller = None
+        self._rehash_faller()
+        after_gravity = clock()
 
         self.find_matching()
+        end = clock()
 
+        if profiler is not None:
+            times = {'clear_matching': after_clear - start, 'sort': after_sort - after_clear,
+                     'apply_gravity': after_gravity - after_sort, 'find_matching': end - after_gravity}
+            moved = sum(half_capsule.row != row for half_capsule, row in zip(pieces, rows))
+            # the board is only checked for being quiet while a cascade is going on
+            quiet = not matched and profiler.cascade > 0 and self._is_quiet()
+            profiler.tick(times, end - start, matched, moved, capsule_count - len(self.capsules), quiet)
 
     def create_faller(self, color1: str, color2: str) -> None:
         """
@@ -111,10 +940,11 @@ class GameState:
         half_capsule1.orientation = 'horizontal'
         half_capsule2.orientation = 'horizontal'
 
-        self.field[1][col] = color1
-        self.field[1][col + 1] = color2
+        self._set_cell(1, col, color1)
+        self._set_cell(1, col + 1, color2)
         self.faller = (half_capsule1, half_capsule2)
-        self.capsules.append(self.faller)
+        self._add_capsule(self.faller)
+        self._rehash_faller()
 
     def test_faller_state(self) -> None:
         """
@@ -125,13 +955,13 @@ class GameState:
                 if self.faller[0].row == self.rows - 1 \
                     or self.field[self.faller[0].row + 1][self.faller[0].col] != ' ' \
                     or self.field[self.faller[1].row + 1][self.faller[1].col] != ' ':
-                    self.faller[0].state = 'landed'
-                    self.faller[1].state = 'landed'
+                    self._set_state(self.faller[0], 'landed')
+                    self._set_state(self.faller[1], 'landed')
             else:
                 if self.faller[0].row == self.rows - 1 \
                     or self.field[self.faller[0].row + 1][self.faller[0].col] != ' ':
-                    self.faller[0].state = 'landed'
-                    self.faller[1].state = 'landed'
+                    self._set_state(self.faller[0], 'landed')
+                    self._set_state(self.faller[1], 'landed')
             return
 
         if self.faller and self.faller[0].state == 'landed' and self.faller[1].state == 'landed':
@@ -139,13 +969,13 @@ class GameState:
                 if 0 <= self.faller[0].row < self.rows - 1 \
                     and self.field[self.faller[0].row + 1][self.faller[0].col] == ' ' \
                     and self.field[self.faller[1].row + 1][self.faller[1].col] == ' ':
-                    self.faller[0].state = 'falling'
-                    self.faller[1].state = 'falling'
+                    self._set_state(self.faller[0], 'falling')
+                    self._set_state(self.faller[1], 'falling')
             else:
                 if  0 <= self.faller[0].row < self.rows - 1 \
                     and self.field[self.faller[0].row + 1][self.faller[0].col] == ' ':
-                    self.faller[0].state = 'falling'
-                    self.faller[1].state = 'falling'
+                    self._set_state(self.faller[0], 'falling')
+                    self._set_state(self.faller[1], 'falling')
             return
 
     def create_virus(self, row: int, col: int, color: str) -> None:
@@ -158,8 +988,68 @@ class GameState:
             color (str): Color of the virus.
         """
         if 0 <= row < self.rows and 0 <= col < self.columns and self.field[row][col] == ' ':
-            self.field[row][col] = color.lower()
-    
+            self._set_cell(row, col, color.lower())
+
+    def place_viruses(self, viruses: Iterable[tuple[int, int, str]]) -> None:
+        """
+        Puts many viruses on the field at once, e.g. a generated level. The
+        field is written directly, and the column tops and the next match
+        scan are updated once at the end instead of for every virus.
+
+        Args:
+            viruses (Iterable[tuple[int, int, str]]): Row, column and color of each virus.
+
+        Raises:
+            ValueError: If a virus is outside the field or on an occupied cell;
+                the viruses before it are kept.
+        """
+        field = self.field
+        write_cell = self._write_cell
+        bits = self._column_bits
+        counts = self.virus_counts
+        keys = {}  # field character -> its zobrist_key
+        zobrist = self.zobrist
+        try:
+            for row, col, color in viruses:
+                if not (0 <= row < self.rows and 0 <= col < self.columns) or field[row][col] != ' ':
+                    raise ValueError(f"Cannot put a virus at row {row}, column {col}.")
+                color = color.lower()
+                write_cell(row, col, color)
+                bits[col] |= 1 << row
+                if color in counts:
+                    counts[color] += 1
+                key = keys.get(color)
+                if key is None:
+                    key = keys[color] = zobrist_key('cell', color)
+                zobrist ^= zobrist_at(key, row, col)
+        finally:
+            self.zobrist = zobrist
+            self.column_tops = [(column & -column).bit_length() - 1 if column else self.rows for column in bits]
+            self.invalidate_matching()
+
+    def place_capsules(self, capsules: Iterable[tuple[HalfCapsule, HalfCapsule]]) -> None:
+        """
+        Puts capsules that are already in place on the field, e.g. the frozen
+        capsules of a generated board. Every half capsule is written to its
+        cell and indexed like a faller that froze there.
+
+        Args:
+            capsules (Iterable[tuple[HalfCapsule, HalfCapsule]]): The capsules,
+                the left or bottom half first, with their state and orientation set.
+
+        Raises:
+            ValueError: If a half capsule is outside the field or on an occupied
+                cell; the capsules before it are kept.
+        """
+        for capsule in capsules:
+            for half_capsule in capsule:
+                row, col = half_capsule.row, half_capsule.col
+                if not (0 <= row < self.rows and 0 <= col < self.columns) or self.field[row][col] != ' ':
+                    raise ValueError(f"Cannot put a capsule at row {row}, column {col}.")
+            for half_capsule in capsule:
+                self._set_cell(half_capsule.row, half_capsule.col, half_capsule.color)
+            self._add_capsule(capsule)
+
     def _get_hc_row(self, half_capsule: HalfCapsule) -> int:
         """
         Get the row of the half capsule
@@ -190,77 +1080,122 @@ class GameState:
         """
         Moves all falling capsules or half capsules down if possible.
         """
+        self._apply_gravity(*self._gravity_order())
+
+    def _gravity_order(self) -> tuple[list[HalfCapsule], list[tuple[HalfCapsule, HalfCapsule]]]:
+        """
+        Returns:
+            tuple: The half capsules and the capsules, lowest first, the order
+            apply_gravity moves them in.
+        """
         half_capsules_sorted = sorted(self.half_capsules, key=self._get_hc_row, reverse=True)
         capsules_sorted = sorted(self.capsules, key=self._get_capsule_row, reverse=True)
+        return half_capsules_sorted, capsules_sorted
+
+    def _apply_gravity(self, half_capsules_sorted: list[HalfCapsule],
+                       capsules_sorted: list[tuple[HalfCapsule, HalfCapsule]]) -> None:
+        """
+        Moves the pieces down in the given order, see apply_gravity.
+
+        Args:
+            half_capsules_sorted (list[HalfCapsule]): Half capsules, lowest first.
+            capsules_sorted (list[tuple[HalfCapsule, HalfCapsule]]): Capsules, lowest first.
+        """
         for half_capsule in half_capsules_sorted:  # apply gravity on half capsule
-            if half_capsule.state == 'frozen':
-                if half_capsule.row < self.rows - 1 and self.field[half_capsule.row + 1][half_capsule.col] == ' ':
-                    half_capsule.state = 'falling'
+            self._fall_half(half_capsule)
 
-            if half_capsule.state == 'falling':
-                if half_capsule.delay:
-                    half_capsule.delay = False
-                    continue
+        for capsule in capsules_sorted:  # apply gravity on capsule
+            if not self._fall_capsule(capsule):
+                return
 
-                elif (half_capsule.row + 1, half_capsule.col) in self.matched_set:
-                    continue
-                
-                if half_capsule.row < self.rows - 1 and self.field[half_capsule.row + 1][half_capsule.col] == ' ':
-                    self.field[half_capsule.row + 1][half_capsule.col] = half_capsule.color
-                    self.field[half_capsule.row][half_capsule.col] = ' '
-                    half_capsule.row += 1
+    def _fall_half(self, half_capsule: HalfCapsule) -> None:
+        """
+        Applies gravity to one half capsule, see apply_gravity.
 
-                if half_capsule.row == self.rows - 1 or self.field[half_capsule.row + 1][half_capsule.col] != ' ':
-                    half_capsule.state = 'frozen'
+        Args:
+            half_capsule (HalfCapsule): The half capsule.
+        """
+        if half_capsule.state == 'frozen':
+            if half_capsule.row < self.rows - 1 and self.field[half_capsule.row + 1][half_capsule.col] == ' ':
+                self._set_state(half_capsule, 'falling')
+
+        if half_capsule.state == 'falling':
+            if half_capsule.delay:
+                if self.journal is not None:
+                    self.journal.half(half_capsule)
+                half_capsule.delay = False
+                return
 
-        for capsule in capsules_sorted:  # apply gravity on capsule
-            if capsule[0].state == 'falling' and capsule[1].state == 'falling':
-                if capsule[0].orientation == 'horizontal':
-                    if capsule[0].row < self.rows - 1 \
-                        and self.field[capsule[0].row + 1][capsule[0].col] == ' ' \
-                        and self.field[capsule[1].row + 1][capsule[1].col] == ' ':
-                        self.field[capsule[0].row + 1][capsule[0].col] = capsule[0].color
-                        self.field[capsule[0].row][capsule[0].col] = ' '
-                        capsule[0].row += 1
-                        self.field[capsule[1].row + 1][capsule[1].col] = capsule[1].color
-                        self.field[capsule[1].row][capsule[1].col] = ' '
-                        capsule[1].row += 1
-                else:
-                    if capsule[0].row < self.rows - 1 \
-                        and self.field[capsule[0].row + 1][capsule[0].col] == ' ':
-                        # capsule[0] will always be the bottom left cell
-                        self.field[capsule[0].row + 1][capsule[0].col] = capsule[0].color
-                        self.field[capsule[1].row + 1][capsule[1].col] = capsule[1].color
-                        self.field[capsule[1].row][capsule[1].col] = ' '
-                        capsule[0].row += 1
-                        capsule[1].row += 1
-
-            elif capsule[0].state == 'frozen' and capsule[1].state == 'frozen':
-                if capsule[0].orientation == 'horizontal':
-                    if (capsule[0].row + 1, capsule[0].col) in self.matched_set or (capsule[1].row + 1, capsule[1].col) in self.matched_set:  # Avoid a capsule immediately fall into the space left by a just-cleared match.
-                        return
-                    
-                    if capsule[0].row < self.rows - 1 \
-                        and self.field[capsule[0].row + 1][capsule[0].col] == ' ' \
-                        and self.field[capsule[1].row + 1][capsule[1].col] == ' ':
-                        self.field[capsule[0].row + 1][capsule[0].col] = capsule[0].color
-                        self.field[capsule[0].row][capsule[0].col] = ' '
-                        capsule[0].row += 1
-                        self.field[capsule[1].row + 1][capsule[1].col] = capsule[1].color
-                        self.field[capsule[1].row][capsule[1].col] = ' '
-                        capsule[1].row += 1
-                else:
-                    if (capsule[0].row + 1, capsule[0].col) in self.matched_set or (capsule[1].row + 1, capsule[1].col) in self.matched_set:
-                        return
-                    
-                    if capsule[0].row < self.rows - 1 \
-                        and self.field[capsule[0].row + 1][capsule[0].col] == ' ':
-                        # capsule[0] will always be the bottom left cell
-                        self.field[capsule[0].row + 1][capsule[0].col] = capsule[0].color
-                        self.field[capsule[1].row + 1][capsule[1].col] = capsule[1].color
-                        self.field[capsule[1].row][capsule[1].col] = ' '
-                        capsule[0].row += 1
-                        capsule[1].row += 1
+            elif (half_capsule.row + 1, half_capsule.col) in self.matched_set:
+                return
+
+            if half_capsule.row < self.rows - 1 and self.field[half_capsule.row + 1][half_capsule.col] == ' ':
+                self._set_cell(half_capsule.row + 1, half_capsule.col, half_capsule.color)
+                self._set_cell(half_capsule.row, half_capsule.col, ' ')
+                self._move_half(half_capsule, 1, 0)
+
+            if half_capsule.row == self.rows - 1 or self.field[half_capsule.row + 1][half_capsule.col] != ' ':
+                self._set_state(half_capsule, 'frozen')
+
+    def _fall_capsule(self, capsule: tuple[HalfCapsule, HalfCapsule]) -> bool:
+        """
+        Applies gravity to one capsule, see apply_gravity.
+
+        Args:
+            capsule: A tuple of two HalfCapsule objects
+
+        Returns:
+            bool: False if the capsule rests on a cell that was just cleared,
+            which ends apply_gravity for the capsules after it.
+        """
+        if capsule[0].state == 'falling' and capsule[1].state == 'falling':
+            if capsule[0].orientation == 'horizontal':
+                if capsule[0].row < self.rows - 1 \
+                    and self.field[capsule[0].row + 1][capsule[0].col] == ' ' \
+                    and self.field[capsule[1].row + 1][capsule[1].col] == ' ':
+                    self._set_cell(capsule[0].row + 1, capsule[0].col, capsule[0].color)
+                    self._set_cell(capsule[0].row, capsule[0].col, ' ')
+                    self._move_half(capsule[0], 1, 0)
+                    self._set_cell(capsule[1].row + 1, capsule[1].col, capsule[1].color)
+                    self._set_cell(capsule[1].row, capsule[1].col, ' ')
+                    self._move_half(capsule[1], 1, 0)
+            else:
+                if capsule[0].row < self.rows - 1 \
+                    and self.field[capsule[0].row + 1][capsule[0].col] == ' ':
+                    # capsule[0] will always be the bottom left cell
+                    self._set_cell(capsule[0].row + 1, capsule[0].col, capsule[0].color)
+                    self._set_cell(capsule[1].row + 1, capsule[1].col, capsule[1].color)
+                    self._set_cell(capsule[1].row, capsule[1].col, ' ')
+                    self._move_half(capsule[0], 1, 0)
+                    self._move_half(capsule[1], 1, 0)
+
+        elif capsule[0].state == 'frozen' and capsule[1].state == 'frozen':
+            if capsule[0].orientation == 'horizontal':
+                if (capsule[0].row + 1, capsule[0].col) in self.matched_set or (capsule[1].row + 1, capsule[1].col) in self.matched_set:  # Avoid a capsule immediately fall into the space left by a just-cleared match.
+                    return False
+
+                if capsule[0].row < self.rows - 1 \
+                    and self.field[capsule[0].row + 1][capsule[0].col] == ' ' \
+                    and self.field[capsule[1].row + 1][capsule[1].col] == ' ':
+                    self._set_cell(capsule[0].row + 1, capsule[0].col, capsule[0].color)
+                    self._set_cell(capsule[0].row, capsule[0].col, ' ')
+                    self._move_half(capsule[0], 1, 0)
+                    self._set_cell(capsule[1].row + 1, capsule[1].col, capsule[1].color)
+                    self._set_cell(capsule[1].row, capsule[1].col, ' ')
+                    self._move_half(capsule[1], 1, 0)
+            else:
+                if (capsule[0].row + 1, capsule[0].col) in self.matched_set or (capsule[1].row + 1, capsule[1].col) in self.matched_set:
+                    return False
+
+                if capsule[0].row < self.rows - 1 \
+                    and self.field[capsule[0].row + 1][capsule[0].col] == ' ':
+                    # capsule[0] will always be the bottom left cell
+                    self._set_cell(capsule[0].row + 1, capsule[0].col, capsule[0].color)
+                    self._set_cell(capsule[1].row + 1, capsule[1].col, capsule[1].color)
+                    self._set_cell(capsule[1].row, capsule[1].col, ' ')
+                    self._move_half(capsule[0], 1, 0)
+                    self._move_half(capsule[1], 1, 0)
+        return True
 
     def _can_match(self, half_capsule: HalfCapsule) -> bool:
         """
@@ -274,40 +1209,446 @@ class GameState:
         """
         return half_capsule.state == 'frozen'
 
+    def _set_cell(self, row: int, col: int, value: str) -> None:
+        """
+        Writes a cell of the field and remembers it for the next match scan.
+
+        Args:
+            row (int): Row position.
+            col (int): Column position.
+            value (str): The new content of the cell.
+        """
+        old_value = self.field[row][col]
+        if self.journal is not None:
+            self.journal.cell(row, col, old_value)
+        if old_value != ' ':
+            self.zobrist ^= zobrist_at(zobrist_key('cell', old_value), row, col)
+            if old_value in self.virus_counts:
+                self.virus_counts[old_value] -= 1
+        if value != ' ':
+            if value in self.virus_counts:
+                self.virus_counts[value] += 1
+            self.zobrist ^= zobrist_at(zobrist_key('cell', value), row, col)
+            bits = self._column_bits[col] | 1 << row
+        else:
+            bits = self._column_bits[col] & ~(1 << row)
+        self._column_bits[col] = bits
+        self.column_tops[col] = (bits & -bits).bit_length() - 1 if bits else self.rows
+        self._write_cell(row, col, value)
+        self._dirty_cells.add((row, col))
+        if self._settled and value == ' ' and old_value.islower():  # a cleared virus may have held up a piece
+            self._settled = None
+
+    def _refresh_cell(self, position: tuple[int, int]) -> None:
+        """
+        Updates whether a cell can be matched after a half capsule entered,
+        left or changed state in it.
+
+        Args:
+            position (tuple[int, int]): The cell to update.
+        """
+        half_capsule = self._cells.get(position)
+        if half_capsule is not None and not self._can_match(half_capsule):
+            self._unmatchable.add(position)
+        else:
+            self._unmatchable.discard(position)
+        self._dirty_cells.add(position)
+
+    def _add_half(self, half_capsule: HalfCapsule) -> None:
+        """
+        Puts a half capsule into the cell index at its position.
+
+        Args:
+            half_capsule (HalfCapsule): The half capsule to index.
+        """
+        position = (half_capsule.row, half_capsule.col)
+        previous = self._cells.get(position)
+        if self._settled:
+            self._unsettle(half_capsule)
+        if self.journal is not None:
+            self.journal.half(half_capsule)
+            if previous is not None:
+                self.journal.half(previous)
+        if previous is not None:  # the hash covers indexed half capsules only
+            self.zobrist ^= self._piece_key(previous)
+        self._cells[position] = half_capsule
+        self.zobrist ^= self._piece_key(half_capsule)
+        self._refresh_cell(position)
+
+    def _drop_half(self, half_capsule: HalfCapsule) -> None:
+        """
+        Takes a half capsule out of the cell index.
+
+        Args:
+            half_capsule (HalfCapsule): The half capsule to remove.
+        """
+        if self._settled:
+            self._unsettle(half_capsule)
+        if self.journal is not None:
+            self.journal.half(half_capsule)
+        position = (half_capsule.row, half_capsule.col)
+        if self._cells.get(position) is half_capsule:
+            del self._cells[position]
+            self.zobrist ^= self._piece_key(half_capsule)
+            self._refresh_cell(position)
+
+    def _move_half(self, half_capsule: HalfCapsule, d_row: int, d_col: int) -> None:
+        """
+        Moves a half capsule by the given offset and keeps the cell index up to date.
+
+        Args:
+            half_capsule (HalfCapsule): The half capsule to move.
+            d_row (int): Rows to move down (negative moves up).
+            d_col (int): Columns to move right (negative moves left).
+        """
+        self._drop_half(half_capsule)
+        half_capsule.row += d_row
+        half_capsule.col += d_col
+        self._add_half(half_capsule)
+
+    def _set_state(self, half_capsule: HalfCapsule, state: str) -> None:
+        """
+        Changes the state of a half capsule.
+
+        Args:
+            half_capsule (HalfCapsule): The half capsule to update.
+            state (str): 'falling', 'landed', or 'frozen'.
+        """
+        if self._settled:
+            self._unsettle(half_capsule)
+        if self.journal is not None:
+            self.journal.half(half_capsule)
+        position = (half_capsule.row, half_capsule.col)
+        if self._cells.get(position) is not half_capsule:
+            half_capsule.state = state
+            return
+        self.zobrist ^= self._piece_key(half_capsule)
+        half_capsule.state = state
+        self.zobrist ^= self._piece_key(half_capsule)
+        self._refresh_cell(position)
+
+    def _unsettle(self, half_capsule: HalfCapsule) -> None:
+        """
+        Forgets that the pieces rest, see _is_quiet, unless the half capsule
+        that changes belongs to the faller.
+
+        Args:
+            half_capsule (HalfCapsule): The half capsule that is about to change.
+        """
+        if self.faller is None or half_capsule not in self.faller:
+            self._settled = None
+
+    def _add_capsule(self, capsule: tuple[HalfCapsule, HalfCapsule]) -> None:
+        """
+        Adds a capsule to the field and indexes both halves.
+
+        Args:
+            capsule: A tuple of two HalfCapsule objects
+        """
+        if self.journal is not None:
+            self.journal.capsule(capsule)
+        self.capsules[capsule] = None
+        for half_capsule in capsule:
+            self._capsule_of[half_capsule] = capsule
+            self._add_half(half_capsule)
+
+    def _piece_key(self, half_capsule: HalfCapsule) -> int:
+        """
+        Args:
+            half_capsule (HalfCapsule): An indexed half capsule.
+
+        Returns:
+            int: The Zobrist key of the half capsule in its current cell and state.
+        """
+        key = zobrist_key('piece', half_capsule.color, half_capsule.state, half_capsule.orientation,
+                          half_capsule in self._capsule_of)
+        return zobrist_at(key, half_capsule.row, half_capsule.col)
+
+    def _faller_zobrist(self) -> int:
+        """
+        Returns:
+            int: The Zobrist key of the faller position, or 0 without a faller.
+        """
+        if not self.faller:
+            return 0
+        return zobrist_at(zobrist_key('faller', self.faller[0].orientation), self.faller[0].row, self.faller[0].col)
+
+    def _rehash_faller(self) -> None:
+        """
+        Updates the hash after the faller was created, moved or removed.
+        """
+        faller_key = self._faller_zobrist()
+        self.zobrist ^= self._faller_key ^ faller_key
+        self._faller_key = faller_key
+
+    def compute_zobrist(self) -> int:
+        """
+        Computes the Zobrist hash from scratch. The hash covers the cell contents,
+        the state and orientation of every half capsule, whether it is still
+        part of a capsule, and the faller position; the delay flags and
+        game_over are not part of it. The zobrist attribute is kept equal to
+        this value by every method that changes the field.
+
+        Returns:
+            int: The 64-bit hash.
+        """
+        zobrist = self._faller_zobrist()
+        for r, c, character in self._occupied_cells():
+            zobrist ^= zobrist_at(zobrist_key('cell', character), r, c)
+        for half_capsule in self._cells.values():
+            zobrist ^= self._piece_key(half_capsule)
+        return zobrist
+
+    def _reset_zobrist(self) -> None:
+        """
+        Recomputes the hash after the field or the pieces were set up directly.
+        """
+        self._faller_key = self._faller_zobrist()
+        self.zobrist = self.compute_zobrist()
+
+    def _reset_field_counts(self) -> None:
+        """
+        Rebuilds the column occupancy and the virus counts after the field was set up directly.
+        """
+        self._column_bits = [0] * self.columns
+        for r, c, _ in self._occupied_cells():
+            self._column_bits[c] |= 1 << r
+        self.column_tops = [(bits & -bits).bit_length() - 1 if bits else self.rows for bits in self._column_bits]
+        self.virus_counts = self.count_viruses()
+
+    def count_viruses(self) -> dict[str, int]:
+        """
+        Counts the viruses by scanning the whole field. virus_counts holds the
+        same numbers without the scan.
+
+        Returns:
+            dict[str, int]: Field character of each virus color -> number of viruses.
+        """
+        counts = dict.fromkeys(self.config.colors, 0)
+        for _, _, character in self._occupied_cells():
+            if character in counts:
+                counts[character] += 1
+        return counts
+
+    def _occupied_cells(self) -> Iterator[tuple[int, int, str]]:
+        """
+        Yields:
+            tuple[int, int, str]: Row, column and character of every non-empty cell.
+        """
+        for r, row in enumerate(self.field):
+            if row.count(' ') == len(row):
+                continue
+            for c, character in enumerate(row):
+                if character != ' ':
+                    yield r, c, character
+
+    def check_consistency(self) -> None:
+        """
+        Debug check: compares the incrementally kept virus counts, column tops
+        and Zobrist hash with a full scan of the field.
+
+        Raises:
+            AssertionError: If any of them is out of date.
+        """
+        counts = self.count_viruses()
+        if self.virus_counts != counts:
+            raise AssertionError(f"virus_counts is {self.virus_counts}, the field has {counts}")
+        tops = [self.rows] * self.columns
+        for r, c, _ in self._occupied_cells():
+            tops[c] = min(tops[c], r)
+        if self.column_tops != tops:
+            raise AssertionError(f"column_tops is {self.column_tops}, the field has {tops}")
+        zobrist = self.compute_zobrist()
+        if self.zobrist != zobrist:
+            raise AssertionError(f"zobrist is {self.zobrist:#018x}, the field hashes to {zobrist:#018x}")
+
+    def next_occupied_row(self, row: int, col: int) -> int:
+        """
+        Finds the first occupied cell below a cell.
+
+        Args:
+            row (int): Row position.
+            col (int): Column position.
+
+        Returns:
+            int: The row of the first non-empty cell below (row, col), or rows if there is none.
+        """
+        bits = self._column_bits[col] >> (row + 1)
+        return row + (bits & -bits).bit_length() if bits else self.rows
+
+    def half_capsule_at(self, row: int, col: int) -> HalfCapsule | None:
+        """
+        Looks up the half capsule in a cell.
+
+        Args:
+            row (int): Row position.
+            col (int): Column position.
+
+        Returns:
+            HalfCapsule | None: The half capsule there, or None for an empty cell or a virus.
+        """
+        return self._cells.get((row, col))
+
+    def invalidate_matching(self) -> None:
+        """
+        Makes the next find_matching rescan the whole field. Call this after
+        writing to the field directly instead of through the game methods.
+        """
+        self._rescan_all = True
+        self._dirty_cells.clear()
+
+    def _unmatchable_cells(self) -> set[tuple[int, int]]:
+        """
+        Returns:
+            set[tuple[int, int]]: Positions of falling or landed half capsules.
+        """
+        return self._unmatchable
+
+    def _match_key(self, r: int, c: int) -> str | None:
+        """
+        Args:
+            r (int): Row position.
+            c (int): Column position.
+
+        Returns:
+            str | None: The upper-case color of the cell, None if it is empty or may not be matched.
+        """
+        character = self.field[r][c]
+        if character == ' ' or (r, c) in self._unmatchable:
+            return None
+        return character.upper()
+
+    def _runs(self, keys: Iterable[str | None]) -> set[tuple[int, int]]:
+        """
+        Args:
+            keys (Iterable[str | None]): The match key of every cell of a row or column, see _match_key.
+
+        Returns:
+            set[tuple[int, int]]: Start and stop index of every run of at least
+            match_length equal keys.
+        """
+        length = self.config.match_length
+        runs = set()
+        start = 0
+        for key, cells in itertools.groupby(keys):
+            stop = start + sum(1 for _ in cells)
+            if key is not None and stop - start >= length:
+                runs.add((start, stop))
+            start = stop
+        return runs
+
+    def _update_runs(self, lines: dict[int, set[tuple[int, int]]], line: int, changed: list[int], size: int,
+                     key: Callable[[int], str | None]) -> None:
+        """
+        Rescans the runs of one row or column through its changed cells.
+        Only the runs through a changed cell and its two neighbors are read,
+        so every cell is looked at once or twice, however long the line is.
+
+        Args:
+            lines (dict[int, set[tuple[int, int]]]): _row_windows or _col_windows, updated in place.
+            line (int): The row or column.
+            changed (list[int]): Indices of the changed cells in the line, in increasing order.
+            size (int): Length of the line.
+            key (Callable[[int], str | None]): The match key of the cell at an index of the line.
+        """
+        length = self.config.match_length
+        found = []
+        scanned = []  # (start, stop) of the scanned parts, which begin and end at run boundaries
+        end = 0
+        for i in changed:
+            if i + 1 < end:
+                continue  # the runs through i - 1, i and i + 1 were scanned already
+            start = i
+            if i > end:
+                color = key(i - 1)
+                if color is not None:  # go back to where the run left of the cell starts
+                    start = i - 1
+                    while start > end and key(start - 1) == color:
+                        start -= 1
+            start = max(start, end)
+            j = start
+            while j < size and j <= i + 1:
+                color = key(j)
+                run_start = j
+                j += 1
+                if color is not None:
+                    while j < size and key(j) == color:
+                        j += 1
+                    if j - run_start >= length:
+                        found.append((run_start, j))
+            scanned.append((start, j))
+            end = j
+
+        runs = lines.get(line, set())
+        for run in [run for run in runs if any(run[0] < stop and start < run[1] for start, stop in scanned)]:
+            runs.discard(run)
+        runs.update(found)
+        if runs:
+            lines[line] = runs
+        else:
+            lines.pop(line, None)
+
     def find_matching(self) -> set[tuple[int, int]]:
         """
-        Finds all matched positions on the field.
+        Finds all matched positions on the field: runs of at least
+        config.match_length matchable cells of the same color in a row or
+        column. The matched runs of every row and column are kept, and only
+        the runs through cells that changed since the last call are scanned
+        again.
 
         Returns:
             set[tuple[int, int]]: Positions that is matched and should be cleared.
         """
-        not_match_lst = []
+        dirty = self._dirty_cells
+        if self._rescan_all:
+            self._rescan_all = False
+            self._row_windows = {}
+            self._col_windows = {}
+            unmatchable = self._unmatchable
+            field = self.field
+            for r in range(self.rows):
+                row = field[r]
+                runs = self._runs(None if row[c] == ' ' or (r, c) in unmatchable else row[c].upper()
+                                  for c in range(self.columns))
+                if runs:
+                    self._row_windows[r] = runs
+            for c in range(self.columns):
+                runs = self._runs(None if field[r][c] == ' ' or (r, c) in unmatchable else field[r][c].upper()
+                                  for r in range(self.rows))
+                if runs:
+                    self._col_windows[c] = runs
+
+        elif not dirty:
+            return self.matched_set
+
+        else:
+            row_changes = {}
+            col_changes = {}
+            for r, c in dirty:
+                row_changes.setdefault(r, []).append(c)
+                col_changes.setdefault(c, []).append(r)
+            match_key = self._match_key
+            for r, changed in row_changes.items():  # horizontal matching
+                self._update_runs(self._row_windows, r, sorted(changed), self.columns, lambda c: match_key(r, c))
+            for c, changed in col_changes.items():  # vertical matching
+                self._update_runs(self._col_windows, c, sorted(changed), self.rows, lambda r: match_key(r, c))
+            dirty.clear()
+
+        self.matched_set = self._matched_cells()
+        return self.matched_set
+
+    def _matched_cells(self) -> set[tuple[int, int]]:
+        """
+        Returns:
+            set[tuple[int, int]]: The cells of the matched runs in _row_windows and _col_windows.
+        """
         matched_set = set()
-        for half_capsule in self.half_capsules:
-            if not self._can_match(half_capsule):
-                not_match_lst.append((half_capsule.row, half_capsule.col))
-        for capsule in self.capsules:
-            for half_capsule in capsule:
-                if not self._can_match(half_capsule):
-                    not_match_lst.append((half_capsule.row, half_capsule.col))
-
-        # horizontal matching
-        for r in reversed(range(self.rows)):
-            for c in range(self.columns - 3):
-                if all((r, c + i) not in not_match_lst for i in range(4)) and \
-                    self.field[r][c] != ' ' and \
-                    self.field[r][c].upper() == self.field[r][c + 1].upper() == self.field[r][c + 2].upper() == self.field[r][c + 3].upper():
-                    matched_set.update({(r, c), (r, c + 1), (r, c + 2), (r, c + 3)})
-
-        # vertical matching
-        for c in range(self.columns):
-            for r in reversed(range(self.rows - 3)):
-                if all((r + i, c) not in not_match_lst for i in range(4)) and \
-                    self.field[r][c] != ' ' and \
-                    self.field[r][c].upper() == self.field[r + 1][c].upper() == self.field[r + 2][c].upper() == self.field[r + 3][c].upper():
-                    matched_set.update({(r, c), (r + 1, c), (r + 2, c), (r + 3, c)})
-
-        self.matched_set = matched_set
+        for r, runs in self._row_windows.items():
+            for start, stop in runs:
+                matched_set.update((r, c) for c in range(start, stop))
+        for c, runs in self._col_windows.items():
+            for start, stop in runs:
+                matched_set.update((r, c) for r in range(start, stop))
         return matched_set
 
     def clear_matching(self) -> None:
@@ -315,34 +1656,35 @@ class GameState:
         Removes all matched items from the field.
         """
         matched_set = self.find_matching()
-        remove_lst1 = []
-        for half_capsule in self.half_capsules:
-            if (half_capsule.row, half_capsule.col) in matched_set:
-                remove_lst1.append(half_capsule)
-
-        for hc in remove_lst1:
-            self.half_capsules.remove(hc)
+        split_capsules = {}
+        for position in matched_set:
+            half_capsule = self._cells.get(position)
+            if half_capsule is None:
+                continue
+            if self.journal is not None:
+                self.journal.half(half_capsule)
+            capsule = self._capsule_of.get(half_capsule)
+            if capsule is None:
+                del self.half_capsules[half_capsule]
+            else:
+                split_capsules[capsule] = None
+            self._drop_half(half_capsule)
 
-        remove_lst2 = []
-        for capsule in self.capsules:
-            if (capsule[0].row, capsule[0].col) in matched_set and (capsule[1].row, capsule[1].col) in matched_set:
-                remove_lst2.append((capsule[0], capsule[1]))
-            elif (capsule[0].row, capsule[0].col) in matched_set:
-                remove_lst2.append((capsule[0], capsule[1]))
-                capsule[1].state = 'falling'
-                capsule[1].delay = True
-                self.half_capsules.append(capsule[1])
-            elif (capsule[1].row, capsule[1].col) in matched_set:
-                remove_lst2.append((capsule[0], capsule[1]))
-                capsule[0].state = 'falling'
-                capsule[0].delay = True
-                self.half_capsules.append(capsule[0])     
-
-        for capsule in remove_lst2:
-            self.capsules.remove(capsule)
+        for capsule in split_capsules:
+            del self.capsules[capsule]
+            for half_capsule in capsule:
+                if (half_capsule.row, half_capsule.col) not in matched_set:
+                    self._drop_half(half_capsule)  # re-indexed as a single half capsule
+                    del self._capsule_of[half_capsule]
+                    half_capsule.state = 'falling'
+                    half_capsule.delay = True
+                    self.half_capsules[half_capsule] = None
+                    self._add_half(half_capsule)
+                else:
+                    del self._capsule_of[half_capsule]
 
         for r, c in matched_set:
-            self.field[r][c] = ' '
+            self._set_cell(r, c, ' ')
 
     def move_left(self) -> None:
         """
@@ -358,22 +1700,24 @@ class GameState:
 
         if self.faller[0].orientation == 'horizontal':
             if c1 > 0 and self.field[r1][c1 - 1] == ' ':
-                self.field[r1][c1 - 1] = self.faller[0].color
-                self.field[r1][c1] = self.faller[1].color
-                self.field[r2][c2] = ' '
-                self.faller[0].col -= 1
-                self.faller[1].col -= 1
+                self._set_cell(r1, c1 - 1, self.faller[0].color)
+                self._set_cell(r1, c1, self.faller[1].color)
+                self._set_cell(r2, c2, ' ')
+                self._move_half(self.faller[0], 0, -1)
+                self._move_half(self.faller[1], 0, -1)
+                self._rehash_faller()
 
             else:
                 return
         else:
             if c1 > 0 and c2 > 0 and self.field[r1][c1 - 1] == ' ' and self.field[r2][c2 - 1] == ' ':
-                self.field[r1][c1 - 1] = self.faller[0].color
-                self.field[r2][c2 - 1] = self.faller[1].color
-                self.field[r1][c1] = ' '
-                self.field[r2][c2] = ' '
-                self.faller[0].col -= 1
-                self.faller[1].col -= 1
+                self._set_cell(r1, c1 - 1, self.faller[0].color)
+                self._set_cell(r2, c2 - 1, self.faller[1].color)
+                self._set_cell(r1, c1, ' ')
+                self._set_cell(r2, c2, ' ')
+                self._move_half(self.faller[0], 0, -1)
+                self._move_half(self.faller[1], 0, -1)
+                self._rehash_faller()
 
             else:
                 return
@@ -392,26 +1736,39 @@ class GameState:
 
         if self.faller[0].orientation == 'horizontal':
             if c2 < self.columns - 1 and self.field[r2][c2 + 1] == ' ':
-                self.field[r2][c2 + 1] = self.faller[1].color
-                self.field[r2][c2] = self.faller[0].color
-                self.field[r1][c1] = ' '
-                self.faller[0].col += 1
-                self.faller[1].col += 1
+                self._set_cell(r2, c2 + 1, self.faller[1].color)
+                self._set_cell(r2, c2, self.faller[0].color)
+                self._set_cell(r1, c1, ' ')
+                self._move_half(self.faller[0], 0, 1)
+                self._move_half(self.faller[1], 0, 1)
+                self._rehash_faller()
 
             else:
                 return
         else:
             if c1 < self.columns - 1 and c2 < self.columns - 1 and self.field[r1][c1 + 1] == ' ' and self.field[r2][c2 + 1] == ' ':
-                self.field[r1][c1 + 1] = self.faller[0].color
-                self.field[r2][c2 + 1] = self.faller[1].color
-                self.field[r1][c1] = ' '
-                self.field[r2][c2] = ' '
-                self.faller[0].col += 1
-                self.faller[1].col += 1
+                self._set_cell(r1, c1 + 1, self.faller[0].color)
+                self._set_cell(r2, c2 + 1, self.faller[1].color)
+                self._set_cell(r1, c1, ' ')
+                self._set_cell(r2, c2, ' ')
+                self._move_half(self.faller[0], 0, 1)
+                self._move_half(self.faller[1], 0, 1)
+                self._rehash_faller()
 
             else:
                 return
 
+    def hard_drop(self) -> None:
+        """
+        Moves the faller straight down to the row it lands on, without letting time pass.
+        """
+        if not self.faller:
+            return
+
+        distance = self._landing_distance()
+        if distance > 0:
+            self._drop_faller(distance)
+
     def rotate_clockwise(self) -> None:
         """
         Rotates the faller clockwise.
@@ -423,12 +1780,14 @@ class GameState:
         c1 = self.faller[0].col
         r2 = self.faller[1].row
         c2 = self.faller[1].col
+        self._drop_half(self.faller[0])  # re-indexed below with the new position, color and orientation
+        self._drop_half(self.faller[1])
 
         if self.faller[0].orientation == 'horizontal':
             if 0 < r1 < self.rows and 0 <= c1 < self.columns - 1 and self.field[r1 - 1][c1] == ' ':
-                self.field[r1 - 1][c1] = self.faller[0].color
-                self.field[r1][c1] = self.faller[1].color
-                self.field[r2][c2] = ' '
+                self._set_cell(r1 - 1, c1, self.faller[0].color)
+                self._set_cell(r1, c1, self.faller[1].color)
+                self._set_cell(r2, c2, ' ')
                 original_color1 = self.faller[0].color
                 self.faller[0].color = self.faller[1].color
                 self.faller[1].color = original_color1
@@ -437,27 +1796,27 @@ class GameState:
                 self.faller[1].col -= 1
                 self.faller[0].orientation = 'vertical'
                 self.faller[1].orientation = 'vertical'
-            else:
-                return
 
         else:
             if 0 < r1 < self.rows and 0 <= c1 < self.columns - 1 and self.field[r1][c1 + 1] == ' ':
-                self.field[r1][c1 + 1] = self.faller[1].color
-                self.field[r2][c2] = ' '
+                self._set_cell(r1, c1 + 1, self.faller[1].color)
+                self._set_cell(r2, c2, ' ')
                 self.faller[1].row += 1
                 self.faller[1].col += 1
                 self.faller[0].orientation = 'horizontal'
                 self.faller[1].orientation = 'horizontal'
             elif 0 < r1 < self.rows and 0 < c1 <= self.columns - 1 and self.field[r1][c1 - 1] == ' ':  # wall kick
-                self.field[r1][c1 - 1] = self.faller[0].color
-                self.field[r1][c1] = self.faller[1].color
-                self.field[r2][c2] = ' '
+                self._set_cell(r1, c1 - 1, self.faller[0].color)
+                self._set_cell(r1, c1, self.faller[1].color)
+                self._set_cell(r2, c2, ' ')
                 self.faller[0].col -= 1
                 self.faller[1].row += 1
                 self.faller[0].orientation = 'horizontal'
                 self.faller[1].orientation = 'horizontal'
-            else:
-                return
+
+        self._add_half(self.faller[0])
+        self._add_half(self.faller[1])
+        self._rehash_faller()
 
     def rotate_counterclockwise(self) -> None:
         """
@@ -470,23 +1829,23 @@ class GameState:
         c1 = self.faller[0].col
         r2 = self.faller[1].row
         c2 = self.faller[1].col
+        self._drop_half(self.faller[0])  # re-indexed below with the new position, color and orientation
+        self._drop_half(self.faller[1])
 
         if self.faller[0].orientation == 'horizontal':
             if 0 < r1 < self.rows and 0 <= c1 < self.columns - 1 and self.field[r1 - 1][c1] == ' ':
-                self.field[r1 - 1][c1] = self.faller[1].color
-                self.field[r2][c2] = ' '
+                self._set_cell(r1 - 1, c1, self.faller[1].color)
+                self._set_cell(r2, c2, ' ')
                 self.faller[1].row -= 1
                 self.faller[1].col -= 1
                 self.faller[0].orientation = 'vertical'
                 self.faller[1].orientation = 'vertical'
-            else:
-                return
-       
+
         else:
             if 0 < r1 < self.rows and 0 <= c1 < self.columns - 1 and self.field[r1][c1 + 1] == ' ':
-                self.field[r1][c1] = self.faller[1].color
-                self.field[r1][c1 + 1] = self.faller[0].color
-                self.field[r2][c2] = ' '
+                self._set_cell(r1, c1, self.faller[1].color)
+                self._set_cell(r1, c1 + 1, self.faller[0].color)
+                self._set_cell(r2, c2, ' ')
                 original_color1 = self.faller[0].color
                 self.faller[0].color = self.faller[1].color
                 self.faller[1].color = original_color1
@@ -495,8 +1854,8 @@ class GameState:
                 self.faller[0].orientation = 'horizontal'
                 self.faller[1].orientation = 'horizontal'
             elif 0 < r1 < self.rows and 0 < c1 <= self.columns - 1 and self.field[r1][c1 - 1] == ' ':  # wall kick
-                self.field[r1][c1 - 1] = self.faller[1].color
-                self.field[r2][c2] = ' '
+                self._set_cell(r1, c1 - 1, self.faller[1].color)
+                self._set_cell(r2, c2, ' ')
                 original_color1 = self.faller[0].color
                 self.faller[0].color = self.faller[1].color
                 self.faller[1].color = original_color1
@@ -504,8 +1863,10 @@ class GameState:
                 self.faller[1].row += 1
                 self.faller[0].orientation = 'horizontal'
                 self.faller[1].orientation = 'horizontal'
-            else:
-                return
+
+        self._add_half(self.faller[0])
+        self._add_half(self.faller[1])
+        self._rehash_faller()
 
     def detect_viruses(self) -> bool:
         """
@@ -514,12 +1875,6 @@ class GameState:
         Returns:
             bool: True if any viruses are still on the field.
         """
-        count = 0
-        for lst in self.field:
-            for cell in lst:
-                if cell in ('r', 'b', 'y'):
-                    count += 1
-        if count != 0:
-            return True     
-        else:
-            return False
+        if DEBUG_CHECKS:
+            self.check_consistency()
+        return any(self.virus_counts.values())
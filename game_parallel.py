@@ -0,0 +1,180 @@
+import os
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import game_array
+import game_logic
+
+
+PARALLEL_THRESHOLD = 1 << 20  # cells; smaller fields are scanned in the calling process
+MAX_ATTACHED = 8  # shared fields a worker process keeps mapped
+
+_executors = {}  # number of workers -> ProcessPoolExecutor
+_attached = {}  # in a worker process: shared memory name -> SharedMemory, oldest first
+
+
+def executor(workers: int) -> ProcessPoolExecutor:
+    """
+    Returns the process pool with the given number of workers, starting it
+    the first time. The pools are shared by all ParallelGameState objects.
+
+    Args:
+        workers (int): Number of worker processes.
+
+    Returns:
+        ProcessPoolExecutor: The pool.
+    """
+    pool = _executors.get(workers)
+    if pool is None:
+        pool = _executors[workers] = ProcessPoolExecutor(workers)
+    return pool
+
+
+def shutdown() -> None:
+    """
+    Stops the worker processes of every pool; they are started again when needed.
+    """
+    for pool in _executors.values():
+        pool.shutdown()
+    _executors.clear()
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """
+    Maps a shared field into this worker process, or returns the mapping made
+    for an earlier scan.
+
+    Args:
+        name (str): The name of the shared memory block.
+
+    Returns:
+        SharedMemory: The block.
+    """
+    memory = _attached.get(name)
+    if memory is None:
+        while len(_attached) >= MAX_ATTACHED:
+            _attached.pop(next(iter(_attached))).close()
+        memory = _attached[name] = shared_memory.SharedMemory(name)
+    return memory
+
+
+def scan_band(name: str, shape: tuple[int, int], start: int, stop: int, match_keys: np.ndarray,
+              unmatchable: np.ndarray, length: int = 4) -> np.ndarray:
+    """
+    Scans rows start to stop of a shared field for matches, see match_mask.
+    Horizontal runs lie within a row, vertical runs are followed length - 1
+    rows past stop, so every run that starts in the band is found. Runs in a
+    worker process.
+
+    Args:
+        name (str): The name of the shared memory block holding the field codes.
+        shape (tuple[int, int]): Rows and columns of the field.
+        start (int): First row of the band.
+        stop (int): Row after the last row of the band.
+        match_keys (np.ndarray): MATCH_KEYS of the process the field belongs to.
+        unmatchable (np.ndarray): Flat indices of the cells that may not be matched.
+        length (int, optional): The fewest cells in a run that match.
+
+    Returns:
+        np.ndarray: Flat indices of the matched cells.
+    """
+    columns = shape[1]
+    end = min(stop + length - 1, shape[0])
+    first, last = start * columns, end * columns
+    codes = np.ndarray(shape, dtype=np.uint8, buffer=_attach(name).buf)
+    matchable = np.ones((end - start, columns), dtype=bool)
+    matchable.reshape(-1)[unmatchable[(unmatchable >= first) & (unmatchable < last)] - first] = False
+    matched = game_array.match_mask(codes[start:end], matchable, match_keys, length)
+    return np.flatnonzero(matched) + first
+
+
+class SharedField(game_array.ArrayField):
+    """
+    An ArrayField whose code array lives in a shared memory block that worker
+    processes map by name. The block is removed when the field is freed.
+
+    Args:
+        codes (np.ndarray): The 2D code array, which is copied into the block.
+    """
+    def __init__(self, codes: np.ndarray) -> None:
+        memory = shared_memory.SharedMemory(create=True, size=max(codes.size, 1))
+        shared = np.ndarray(codes.shape, dtype=np.uint8, buffer=memory.buf)
+        shared[...] = codes
+        super().__init__(shared)
+        self.memory = memory  # set last, so the block is closed after the arrays on it are gone
+        weakref.finalize(self, memory.unlink)
+
+    @property
+    def name(self) -> str:
+        return self.memory.name
+
+
+class ParallelGameState(game_array.ArrayGameState):
+    """
+    An ArrayGameState that splits full match scans of large fields over
+    worker processes. The field codes live in shared memory and every worker
+    scans a band of rows; fields of fewer than threshold cells, or with fewer
+    than two workers, are scanned in this process as in ArrayGameState.
+
+    Args:
+        config (GameConfig, optional): The match length and virus colors to play with.
+        workers (int, optional): Number of worker processes, defaults to the number of CPUs.
+        threshold (int, optional): The fewest cells a field needs for a parallel scan.
+    """
+    def __init__(self, config: game_logic.GameConfig = game_logic.DEFAULT_CONFIG, *, workers: int = None,
+                 threshold: int = PARALLEL_THRESHOLD) -> None:
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.threshold = threshold
+        super().__init__(config)
+
+    @property
+    def field(self) -> game_array.ArrayField:
+        return self._field_view
+
+    @field.setter
+    def field(self, value) -> None:
+        game_array.ArrayGameState.field.fset(self, value)
+        if self.codes.size >= self.threshold and not isinstance(self._field_view, SharedField):
+            game_array.ArrayGameState.field.fset(self, SharedField(self.codes))
+
+    def _copy_field(self) -> game_array.ArrayField:
+        """
+        Returns:
+            ArrayField: A copy of the field, in its own shared memory block if it is large.
+        """
+        if isinstance(self._field_view, SharedField):
+            return SharedField(self.codes)
+        return super()._copy_field()
+
+    def find_matching(self) -> set[tuple[int, int]]:
+        """
+        Finds all matched positions on the field, with one band of rows per
+        worker process if the field is in shared memory and there are at
+        least two workers. If no cell changed since the last scan, its result
+        is returned as is.
+
+        Returns:
+            set[tuple[int, int]]: Positions that is matched and should be cleared.
+        """
+        if not self._rescan_all and not self._dirty_cells:
+            return self.matched_set
+        if self.workers < 2 or not isinstance(self._field_view, SharedField):
+            return super().find_matching()
+
+        rows, columns = self.codes.shape
+        unmatchable = np.array([r * columns + c for r, c in self._unmatchable_cells()], dtype=np.int64)
+        band = -(-rows // self.workers)
+        pool = executor(self.workers)
+        futures = [pool.submit(scan_band, self._field_view.name, (rows, columns), start, min(start + band, rows),
+                               game_array.MATCH_KEYS, unmatchable, self.config.match_length)
+                   for start in range(0, rows, band)]
+        matched = np.concatenate([future.result() for future in futures])
+
+        matched_set = set(zip(*(part.tolist() for part in np.divmod(matched, columns))))
+        self._dirty_cells.clear()  # every scan is a full one
+        self._rescan_all = False
+        self.matched_set = matched_set
+        return matched_set
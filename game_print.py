@@ -1,21 +1,25 @@
+import sys
+
 import game_logic
 
 
-def print_field(game_state: game_logic.GameState) -> None:
+RENDER_MODES = ('tty', 'diff', 'auto')
+
+
+def field_lines(game_state: game_logic.GameState) -> list[str]:
     """
-    Prints the current game field, showing all capsules, their states,
-    and highlighting matched positions.
+    Renders the current game field, showing all capsules, their states,
+    and highlighting matched positions. Matches come from find_matching,
+    which returns the engine's matched_set without scanning again if no cell
+    changed since it was computed.
 
     Args:
         game_state (GameState): The current state of the game.
+
+    Returns:
+        list[str]: The lines of format_field, without newlines.
     """
-    display_field = []
-    for r in range(game_state.rows):
-        row_display = []
-        for c in range(game_state.columns):
-            cell = game_state.field[r][c]
-            row_display.append(f" {cell} ")
-        display_field.append(row_display)
+    display_field = [[f" {cell} " for cell in row] for row in game_state.field]
 
     for capsule in game_state.capsules:
         if capsule[0].orientation == 'horizontal' and capsule[1].orientation == 'horizontal':
@@ -39,24 +43,178 @@ def print_field(game_state: game_logic.GameState) -> None:
     for r, c in game_state.find_matching():
         display_field[r][c] = f"*{game_state.field[r][c]}*"
 
-    for row in display_field:
-        print("|" + ''.join(row) + "|")
-    print(' ' + '---' * game_state.columns + ' ')
+    lines = ["|" + ''.join(row) + "|" for row in display_field]
+    lines.append(' ' + '---' * game_state.columns + ' ')
+    return lines
+
+
+def format_field(game_state: game_logic.GameState) -> str:
+    """
+    Renders the current game field, showing all capsules, their states,
+    and highlighting matched positions.
+
+    Args:
+        game_state (GameState): The current state of the game.
+
+    Returns:
+        str: The lines print_field prints, each ending with a newline.
+    """
+    return ''.join(line + '\n' for line in field_lines(game_state))
+
+
+def print_field(game_state: game_logic.GameState, file=None) -> None:
+    """
+    Prints the current game field, showing all capsules, their states,
+    and highlighting matched positions.
+
+    Args:
+        game_state (GameState): The current state of the game.
+        file (optional): Where to print, defaults to sys.stdout.
+    """
+    print(format_field(game_state), end='', file=file)
+
+
+def frame_lines(game_state: game_logic.GameState, game_over: bool = False) -> list[str]:
+    """
+    Args:
+        game_state (GameState): The current state of the game.
+        game_over (bool, optional): Whether the game just ended.
+
+    Returns:
+        list[str]: The lines a2.py prints for the current frame: the field, then
+        GAME OVER or LEVEL CLEARED if they apply.
+    """
+    lines = field_lines(game_state)
+    if game_over:
+        lines.append('GAME OVER')
+    elif not game_state.detect_viruses():
+        lines.append('LEVEL CLEARED')
+    return lines
+
+
+def format_frame(number: int, lines: list[str], previous: list[str] | None) -> str:
+    """
+    Encodes a frame as a diff from the previous one. A full frame is
+    'F <number> <count>' followed by count lines; a delta is
+    'D <number> <count> <length>' followed by count lines '<index> <text>' that
+    replace the lines of the previous frame, which is then cut or padded to
+    length lines. The shorter of the two is used.
+
+    Args:
+        number (int): The frame number.
+        lines (list[str]): The lines of the frame.
+        previous (list[str] | None): The lines of the previous frame, if any.
+
+    Returns:
+        str: The encoded frame.
+    """
+    full = '\n'.join([f"F {number} {len(lines)}", *lines]) + '\n'
+    if previous is None:
+        return full
+    changed = [f"{i} {line}" for i, line in enumerate(lines) if i >= len(previous) or previous[i] != line]
+    delta = '\n'.join([f"D {number} {len(changed)} {len(lines)}", *changed]) + '\n'
+    return delta if len(delta) < len(full) else full
+
 
+class FieldRenderer:
+    """
+    Draws frames by writing only what changed since the last one. On a
+    terminal ('tty') the changed cells are redrawn in place with cursor
+    addressing; otherwise ('diff') each frame is written with format_frame.
 
-def level_cleared(game_state: game_logic.GameState) -> None:
+    Args:
+        file (optional): Where to write, defaults to sys.stdout.
+        mode (str, optional): 'tty', 'diff' or 'auto', which picks 'tty' if file is a terminal.
+    """
+    def __init__(self, file=None, mode: str = 'auto') -> None:
+        if mode not in RENDER_MODES:
+            raise ValueError(f"Render mode must be one of {', '.join(RENDER_MODES)}, not {mode!r}.")
+        self.file = file
+        if mode == 'auto':
+            isatty = getattr(file if file is not None else sys.stdout, 'isatty', None)
+            mode = 'tty' if isatty is not None and isatty() else 'diff'
+        self.mode = mode
+        self.frame = 0
+        self._lines = None  # the last frame drawn
+
+    def reset(self) -> None:
+        """
+        Makes the next frame be drawn in full, e.g. after something else wrote to the terminal.
+        """
+        self._lines = None
+
+    def render(self, game_state: game_logic.GameState, game_over: bool = False) -> None:
+        """
+        Draws the current frame of a game, see frame_lines.
+
+        Args:
+            game_state (GameState): The current state of the game.
+            game_over (bool, optional): Whether the game just ended.
+        """
+        self.draw(frame_lines(game_state, game_over))
+
+    def draw(self, lines: list[str]) -> None:
+        """
+        Draws a frame given as lines.
+
+        Args:
+            lines (list[str]): The lines of the frame.
+        """
+        self.frame += 1
+        if self.mode == 'tty':
+            output = self._tty_update(lines)
+        else:
+            output = format_frame(self.frame, lines, self._lines)
+        self._lines = lines
+        file = self.file if self.file is not None else sys.stdout
+        file.write(output)
+        file.flush()
+
+    def _tty_update(self, lines: list[str]) -> str:
+        """
+        Returns:
+            str: The escape sequences that turn the last frame into lines on
+            the screen, leaving the cursor on the line below the frame.
+        """
+        previous = self._lines
+        if previous is None:
+            return '\x1b[H\x1b[2J' + '\n'.join(lines) + '\n\x1b[J'
+        output = []
+        for r, line in enumerate(lines):
+            old = previous[r] if r < len(previous) else ''
+            if line == old:
+                continue
+            start = 0
+            while start < len(line) and start < len(old) and line[start] == old[start]:
+                start += 1
+            end = len(line)
+            if len(line) == len(old):  # only the changed cells of the row
+                while end > start and line[end - 1] == old[end - 1]:
+                    end -= 1
+            output.append(f'\x1b[{r + 1};{start + 1}H{line[start:end]}')
+            if len(line) < len(old):
+                output.append('\x1b[K')
+        output.append(f'\x1b[{len(lines) + 1};1H\x1b[J')
+        return ''.join(output)
+
+
+def level_cleared(game_state: game_logic.GameState, file=None) -> None:
     """
     Checks if the level is cleared (no viruses left) and prints a message.
 
     Args:
         game_state (GameState): The current state of the game.
+        file (optional): Where to print, defaults to sys.stdout.
     """
     if not game_state.detect_viruses():
-        print("LEVEL CLEARED")
+        print("LEVEL CLEARED", file=file)
 
 
-def game_over() -> None:
+def game_over(file=None) -> None:
     """
     Prints the game over message.
+
+    Args:
+        file (optional): Where to print, defaults to sys.stdout.
     """
-    print("GAME OVER")
+    print("GAME OVER", file=file)
@@ -0,0 +1,714 @@
+import argparse
+import bisect
+import mmap
+import shlex
+import struct
+import sys
+import zlib
+from typing import BinaryIO, Callable, Iterable, Iterator
+
+import a2
+import game_logic
+import game_print
+
+
+MAGIC = b'DRMR'  # start of every replay file
+INDEX_MAGIC = b'DRMI'  # end of a replay file that was closed properly
+VERSION = 2  # 2 added the GameConfig to the header and the checkpoints
+
+OP_TICKS = 0  # count: empty input lines in a row
+OP_LEFT = 1
+OP_RIGHT = 2
+OP_ROTATE_CLOCKWISE = 3
+OP_ROTATE_COUNTERCLOCKWISE = 4
+OP_HARD_DROP = 5
+OP_FALLER = 6  # left color, right color
+OP_VIRUS = 7  # row, column, color
+OP_CHECKPOINT = 8  # tick, payload length, zlib compressed payload
+OP_END = 9
+
+COMMAND_OPS = {'<': OP_LEFT, '>': OP_RIGHT, 'A': OP_ROTATE_CLOCKWISE, 'B': OP_ROTATE_COUNTERCLOCKWISE,
+               'D': OP_HARD_DROP}
+OP_COMMANDS = {op: command for command, op in COMMAND_OPS.items()}
+OP_METHODS = {OP_LEFT: 'move_left', OP_RIGHT: 'move_right', OP_ROTATE_CLOCKWISE: 'rotate_clockwise',
+              OP_ROTATE_COUNTERCLOCKWISE: 'rotate_counterclockwise', OP_HARD_DROP: 'hard_drop'}
+
+STATES = ('falling', 'landed', 'frozen')
+ORIENTATIONS = (None, 'horizontal', 'vertical')
+INDEX_ENTRY = struct.Struct('<QQ')  # tick, offset of the checkpoint
+INDEX_TRAILER = struct.Struct('<QQ4s')  # total ticks, offset of the index, INDEX_MAGIC
+
+
+def write_varint(out: bytearray, value: int) -> None:
+    """
+    Appends a non-negative integer in LEB128, 7 bits per byte.
+
+    Args:
+        out (bytearray): Where to append.
+        value (int): The integer.
+    """
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, offset: int) -> tuple[int, int]:
+    """
+    Reads an integer written by write_varint.
+
+    Args:
+        data: The bytes.
+        offset (int): Where the integer starts.
+
+    Returns:
+        tuple[int, int]: The integer and the offset after it.
+    """
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def write_signed(out: bytearray, value: int) -> None:
+    """
+    Appends an integer that may be negative (zigzag encoded varint).
+
+    Args:
+        out (bytearray): Where to append.
+        value (int): The integer.
+    """
+    write_varint(out, value * 2 if value >= 0 else -value * 2 - 1)
+
+
+def read_signed(data, offset: int) -> tuple[int, int]:
+    """
+    Reads an integer written by write_signed.
+
+    Args:
+        data: The bytes.
+        offset (int): Where the integer starts.
+
+    Returns:
+        tuple[int, int]: The integer and the offset after it.
+    """
+    value, offset = read_varint(data, offset)
+    return (value >> 1) ^ -(value & 1), offset
+
+
+def write_text(out: bytearray, text: str) -> None:
+    """
+    Appends a length-prefixed UTF-8 string.
+
+    Args:
+        out (bytearray): Where to append.
+        text (str): The string.
+    """
+    encoded = text.encode()
+    write_varint(out, len(encoded))
+    out += encoded
+
+
+def read_text(data, offset: int) -> tuple[str, int]:
+    """
+    Reads a string written by write_text.
+
+    Args:
+        data: The bytes.
+        offset (int): Where the string starts.
+
+    Returns:
+        tuple[str, int]: The string and the offset after it.
+    """
+    length, offset = read_varint(data, offset)
+    return bytes(data[offset:offset + length]).decode(), offset + length
+
+
+def write_config(out: bytearray, config: game_logic.GameConfig) -> None:
+    """
+    Appends the match length and the virus colors of a GameConfig.
+
+    Args:
+        out (bytearray): Where to append.
+        config (GameConfig): The rules.
+    """
+    write_varint(out, config.match_length)
+    write_varint(out, len(config.colors))
+    for color in config.colors:
+        write_text(out, color)
+
+
+def read_config(data, offset: int) -> tuple[game_logic.GameConfig, int]:
+    """
+    Reads a GameConfig written by write_config.
+
+    Args:
+        data: The bytes.
+        offset (int): Where the config starts.
+
+    Returns:
+        tuple[GameConfig, int]: The config and the offset after it.
+    """
+    match_length, offset = read_varint(data, offset)
+    count, offset = read_varint(data, offset)
+    colors = []
+    for _ in range(count):
+        color, offset = read_text(data, offset)
+        colors.append(color)
+    return game_logic.GameConfig(match_length, tuple(colors)), offset
+
+
+def encode_checkpoint(game_state: game_logic.GameState) -> bytes:
+    """
+    Encodes the config, the field, the pieces, the faller and game over of
+    a game state. Matching caches and the Zobrist hash are left out;
+    decode_checkpoint rebuilds them.
+
+    Args:
+        game_state (GameState): The game state.
+
+    Returns:
+        bytes: The encoded state.
+
+    Raises:
+        ValueError: If the field and the pieces use more than 256 distinct strings.
+    """
+    strings = {}  # field character or color -> index in the string table
+    cells = bytearray()
+    for row in game_state.field:
+        for character in row:
+            cells.append(strings.setdefault(character, len(strings)) & 0xff)
+
+    pieces = bytearray()
+
+    def write_half(half_capsule: game_logic.HalfCapsule) -> None:
+        pieces.append(strings.setdefault(half_capsule.color, len(strings)) & 0xff)
+        write_signed(pieces, half_capsule.row)
+        write_signed(pieces, half_capsule.col)
+        pieces.append(STATES.index(half_capsule.state) | ORIENTATIONS.index(half_capsule.orientation) << 2
+                      | half_capsule.delay << 4)
+
+    write_varint(pieces, len(game_state.half_capsules))
+    for half_capsule in game_state.half_capsules:
+        write_half(half_capsule)
+    faller = 0
+    write_varint(pieces, len(game_state.capsules))
+    for i, capsule in enumerate(game_state.capsules):
+        if capsule is game_state.faller:
+            faller = i + 1
+        write_half(capsule[0])
+        write_half(capsule[1])
+    if len(strings) > 256:
+        raise ValueError("A checkpoint supports at most 256 distinct field characters and colors.")
+
+    out = bytearray()
+    write_config(out, game_state.config)
+    write_varint(out, game_state.rows)
+    write_varint(out, game_state.columns)
+    write_varint(out, len(strings))
+    for text in strings:
+        write_text(out, text)
+    out += cells
+    out += pieces
+    write_varint(out, faller)
+    out.append(game_state.game_over)
+    return bytes(out)
+
+
+def decode_checkpoint(data, offset: int, game_state: game_logic.GameState) -> int:
+    """
+    Puts a game state back to a state encoded by encode_checkpoint,
+    including the config it was played with.
+
+    Args:
+        data: The bytes.
+        offset (int): Where the encoded state starts.
+        game_state (GameState): The game state to overwrite.
+
+    Returns:
+        int: The offset after the encoded state.
+    """
+    config, offset = read_config(data, offset)
+    rows, offset = read_varint(data, offset)
+    columns, offset = read_varint(data, offset)
+    count, offset = read_varint(data, offset)
+    strings = []
+    for _ in range(count):
+        text, offset = read_text(data, offset)
+        strings.append(text)
+    field = tuple(tuple(strings[code] for code in data[offset + r * columns:offset + (r + 1) * columns])
+                  for r in range(rows))
+    offset += rows * columns
+
+    def read_half() -> tuple:
+        nonlocal offset
+        color = strings[data[offset]]
+        row, offset = read_signed(data, offset + 1)
+        col, offset = read_signed(data, offset)
+        flags = data[offset]
+        offset += 1
+        return color, row, col, STATES[flags & 3], ORIENTATIONS[flags >> 2 & 3], bool(flags >> 4 & 1)
+
+    count, offset = read_varint(data, offset)
+    half_capsules = tuple(read_half() for _ in range(count))
+    count, offset = read_varint(data, offset)
+    capsules = tuple((read_half(), read_half()) for _ in range(count))
+    faller, offset = read_varint(data, offset)
+    game_over = bool(data[offset])
+
+    game_state.restore(game_logic.GameSnapshot(
+        rows, columns, field, half_capsules, capsules, faller - 1 if faller else None, game_over,
+        frozenset(), (), (), frozenset(), True, 0, config))
+    game_state._reset_zobrist()
+    game_state.find_matching()
+    return offset + 1
+
+
+def read_header(read_line: Callable[[], str]) -> tuple[int, int, list[str] | None]:
+    """
+    Reads the field header of an a2.py input script.
+
+    Args:
+        read_line (Callable[[], str]): Returns the next input line.
+
+    Returns:
+        tuple[int, int, list[str] | None]: Rows, columns and the contents, None for EMPTY.
+
+    Raises:
+        ValueError: If the field setting is neither EMPTY nor CONTENTS.
+    """
+    rows = int(read_line())
+    columns = int(read_line())
+    field_setting = read_line().strip().upper()
+    if field_setting == 'EMPTY':
+        return rows, columns, None
+    elif field_setting == 'CONTENTS':
+        return rows, columns, [read_line() for _ in range(rows)]
+    raise ValueError("Field setting can only be 'EMPTY' or 'CONTENTS'")
+
+
+def new_game(rows: int, columns: int, contents: list[str] | None, state_class: type = game_logic.GameState,
+             config: game_logic.GameConfig = None) -> game_logic.GameState:
+    """
+    Args:
+        rows (int): Number of rows.
+        columns (int): Number of columns.
+        contents (list[str] | None): The field contents, None for an EMPTY field.
+        state_class (type, optional): The GameState class used as the engine.
+        config (GameConfig, optional): The match length and virus colors to play
+            with, by default the ones state_class gives.
+
+    Returns:
+        GameState: The game state a2.py starts from for this field header.
+    """
+    game_state = state_class() if config is None else state_class(config=config)
+    if contents is None:
+        game_state.initialize_field(rows, columns, 'EMPTY')
+    else:
+        game_state.initialize_field(rows, columns, 'CONTENTS', contents)
+    return game_state
+
+
+class ReplayRecorder:
+    """
+    Plays a game from a2.py commands and writes it as a binary replay: the
+    config and the field header, one opcode per command (runs of empty lines as one count)
+    and, every checkpoint_every ticks, the whole state, so that a reader can
+    start near any tick. close() writes an index of the checkpoints.
+
+    Args:
+        file (BinaryIO): Where the replay is written.
+        rows (int): Number of rows.
+        columns (int): Number of columns.
+        contents (list[str], optional): The field contents, None for an EMPTY field.
+        checkpoint_every (int, optional): Ticks between checkpoints, 0 for none.
+        state_class (type, optional): The GameState class used as the engine.
+        config (GameConfig, optional): The match length and virus colors to play
+            with, by default the ones state_class gives.
+    """
+    def __init__(self, file: BinaryIO, rows: int, columns: int, contents: list[str] = None,
+                 checkpoint_every: int = 0, state_class: type = game_logic.GameState,
+                 config: game_logic.GameConfig = None) -> None:
+        self.file = file
+        self.game_state = new_game(rows, columns, contents, state_class, config)
+        self.checkpoint_every = checkpoint_every
+        self.ticks = 0
+        self.finished = False  # Q was read or the game is over
+        self._pending_ticks = 0
+        self._offset = 0
+        self._index = []  # (tick, offset) of every checkpoint
+
+        header = bytearray(MAGIC)
+        header.append(VERSION)
+        write_config(header, self.game_state.config)
+        write_varint(header, rows)
+        write_varint(header, columns)
+        header.append(contents is not None)
+        for line in contents or ():
+            write_text(header, line)
+        self._write(header)
+
+    def _write(self, data: bytes) -> None:
+        self.file.write(data)
+        self._offset += len(data)
+
+    def _flush_ticks(self) -> None:
+        if self._pending_ticks:
+            out = bytearray([OP_TICKS])
+            write_varint(out, self._pending_ticks)
+            self._write(out)
+            self._pending_ticks = 0
+
+    def _checkpoint(self) -> None:
+        self._flush_ticks()
+        self._index.append((self.ticks, self._offset))
+        payload = zlib.compress(encode_checkpoint(self.game_state), 1)
+        out = bytearray([OP_CHECKPOINT])
+        write_varint(out, self.ticks)
+        write_varint(out, len(payload))
+        self._write(out + payload)
+
+    def command(self, command: str) -> bool:
+        """
+        Plays and records one input line, the way a2.py does.
+
+        Args:
+            command (str): The command line, an empty line lets time pass.
+
+        Returns:
+            bool: False once Q was read or the game is over, then nothing more is recorded.
+        """
+        if self.finished:
+            return False
+        game_state = self.game_state
+        game_state.test_faller_state()
+        if command.strip().upper() == 'Q':
+            self.finished = True
+            return False
+
+        if command.strip() == '':
+            game_state.time_passed()
+            self.ticks += 1
+            self._pending_ticks += 1
+            if self.checkpoint_every and self.ticks % self.checkpoint_every == 0:
+                self._checkpoint()
+            return True
+
+        a2.run_command(game_state, command)
+        command_lst = shlex.split(command)
+        out = bytearray()
+        if command_lst[0] in COMMAND_OPS:
+            out.append(COMMAND_OPS[command_lst[0]])
+        elif command_lst[0] == 'F':
+            out.append(OP_FALLER)
+            write_text(out, command_lst[1])
+            write_text(out, command_lst[2])
+        elif command_lst[0] == 'V':
+            out.append(OP_VIRUS)
+            write_signed(out, int(command_lst[1]))
+            write_signed(out, int(command_lst[2]))
+            write_text(out, command_lst[3])
+        if out:  # a2.py ignores other commands
+            self._flush_ticks()
+            self._write(out)
+        if game_state.game_over:
+            self.finished = True
+        return not self.finished
+
+    def close(self) -> None:
+        """
+        Writes the end of the replay and the index of the checkpoints.
+        """
+        self._flush_ticks()
+        out = bytearray([OP_END])
+        index_offset = self._offset + 1
+        for entry in self._index:
+            out += INDEX_ENTRY.pack(*entry)
+        out += INDEX_TRAILER.pack(self.ticks, index_offset, INDEX_MAGIC)
+        self._write(out)
+
+    def __enter__(self) -> 'ReplayRecorder':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def record_script(lines: Iterable[str], file: BinaryIO, checkpoint_every: int = 0,
+                  state_class: type = game_logic.GameState, config: game_logic.GameConfig = None) -> int:
+    """
+    Records an a2.py input script as a binary replay.
+
+    Args:
+        lines (Iterable[str]): The field header followed by the commands.
+        file (BinaryIO): Where the replay is written.
+        checkpoint_every (int, optional): Ticks between checkpoints, 0 for none.
+        state_class (type, optional): The GameState class used as the engine.
+        config (GameConfig, optional): The match length and virus colors to play
+            with, by default the ones state_class gives.
+
+    Returns:
+        int: The number of ticks recorded.
+    """
+    lines = iter(lines)
+    rows, columns, contents = read_header(lambda: next(lines))
+    with ReplayRecorder(file, rows, columns, contents, checkpoint_every, state_class, config) as recorder:
+        for command in lines:
+            if not recorder.command(command):
+                break
+    return recorder.ticks
+
+
+class ReplayReader:
+    """
+    Reads a binary replay through a memory map. state_at(tick) starts from the
+    last checkpoint before the tick, so only the commands after it are played.
+    Every state is played with the config the replay was recorded with.
+
+    Args:
+        path (str): The replay file.
+        state_class (type, optional): The GameState class used as the engine; its config is replaced.
+
+    Raises:
+        ValueError: If the file is not a replay.
+    """
+    def __init__(self, path: str, state_class: type = game_logic.GameState) -> None:
+        self.state_class = state_class
+        with open(path, 'rb') as file:
+            self._data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._start = self._read_header()  # the first opcode
+        except (IndexError, ValueError):
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} replay or its header is cut off.")
+        self._load_index()
+
+    def _read_header(self) -> int:
+        """
+        Reads the config and the field header.
+
+        Returns:
+            int: The offset after the header.
+
+        Raises:
+            ValueError: If the file does not start like a replay.
+            IndexError: If the file ends inside the header.
+        """
+        data = self._data
+        if data[:len(MAGIC)] != MAGIC or data[len(MAGIC)] != VERSION:
+            raise ValueError("not a replay")
+        offset = len(MAGIC) + 1
+        self.config, offset = read_config(data, offset)
+        self.rows, offset = read_varint(data, offset)
+        self.columns, offset = read_varint(data, offset)
+        has_contents = data[offset]
+        offset += 1
+        self.contents = None
+        if has_contents:
+            self.contents = []
+            for _ in range(self.rows):
+                line, offset = read_text(data, offset)
+                self.contents.append(line)
+        if offset > len(data):
+            raise IndexError("the header is cut off")
+        return offset
+
+    def _load_index(self) -> None:
+        data = self._data
+        end = len(data) - INDEX_TRAILER.size
+        if end >= self._start and data[-len(INDEX_MAGIC):] == INDEX_MAGIC:
+            self.ticks, index_offset, _ = INDEX_TRAILER.unpack_from(data, end)
+            self._index = [INDEX_ENTRY.unpack_from(data, offset)
+                           for offset in range(index_offset, end, INDEX_ENTRY.size)]
+        else:  # the recording was not closed, find the checkpoints by reading every opcode
+            self.ticks = 0
+            self._index = []
+            for op, args, offset in self._ops(self._start):
+                if op == OP_TICKS:
+                    self.ticks += args[0]
+                elif op == OP_CHECKPOINT:
+                    self._index.append((args[0], offset))
+        self._index_ticks = [tick for tick, _ in self._index]
+
+    def _ops(self, offset: int) -> Iterator[tuple[int, tuple, int]]:
+        """
+        Decodes opcodes until OP_END or the end of the file.
+
+        Args:
+            offset (int): Where the first opcode starts.
+
+        Returns:
+            Iterator[tuple[int, tuple, int]]: The opcode, its arguments and its offset.
+        """
+        data = self._data
+        size = len(data)
+        while offset < size:
+            start = offset
+            op = data[offset]
+            offset += 1
+            try:
+                args, offset = self._decode_args(op, offset)
+            except IndexError:  # the recording stopped in the middle of an opcode
+                return
+            if args is None or offset > size:
+                return
+            yield op, args, start
+
+    def _decode_args(self, op: int, offset: int) -> tuple[tuple | None, int]:
+        """
+        Decodes the arguments of one opcode.
+
+        Args:
+            op (int): The opcode.
+            offset (int): Where its arguments start.
+
+        Returns:
+            tuple[tuple | None, int]: The arguments, None for OP_END or an unknown
+            opcode, and the offset of the next opcode.
+        """
+        data = self._data
+        if op == OP_TICKS:
+            count, offset = read_varint(data, offset)
+            return (count,), offset
+        elif op in OP_METHODS:
+            return (), offset
+        elif op == OP_FALLER:
+            color1, offset = read_text(data, offset)
+            color2, offset = read_text(data, offset)
+            return (color1, color2), offset
+        elif op == OP_VIRUS:
+            row, offset = read_signed(data, offset)
+            col, offset = read_signed(data, offset)
+            color, offset = read_text(data, offset)
+            return (row, col, color), offset
+        elif op == OP_CHECKPOINT:
+            tick, offset = read_varint(data, offset)
+            length, offset = read_varint(data, offset)
+            return (tick, offset, length), offset + length
+        return None, offset
+
+    def state_at(self, tick: int) -> game_logic.GameState:
+        """
+        Plays the replay up to a tick. From self.ticks on, the commands after
+        the last time step are played as well, so the state is the one the
+        game ended in, e.g. game over after a last F.
+
+        Args:
+            tick (int): Number of time steps, the state of the game end if it is self.ticks or more.
+
+        Returns:
+            GameState: The game state after tick time steps, before the next
+            command, as a2.py prints it.
+        """
+        position = bisect.bisect_right(self._index_ticks, tick) - 1
+        if position >= 0:
+            ops = self._ops(self._index[position][1])
+            _, (current, start, length), _ = next(ops)  # the checkpoint
+            game_state = self.state_class(config=self.config)
+            decode_checkpoint(zlib.decompress(self._data[start:start + length]), 0, game_state)
+        else:
+            game_state = new_game(self.rows, self.columns, self.contents, self.state_class, self.config)
+            current = 0
+            ops = self._ops(self._start)
+
+        to_end = tick >= self.ticks
+        for op, args, _ in ops:
+            if current >= tick and not to_end:
+                break
+            game_state.test_faller_state()
+            if op == OP_TICKS:
+                steps = min(args[0], tick - current)
+                game_state.time_passed(steps)
+                current += steps
+            elif op in OP_METHODS:
+                getattr(game_state, OP_METHODS[op])()
+            elif op == OP_FALLER:
+                game_state.create_faller(*args)
+                if game_state.game_over:  # a2.py stops reading commands here
+                    break
+            elif op == OP_VIRUS:
+                game_state.create_virus(*args)
+        game_state.test_faller_state()
+        return game_state
+
+    def lines(self) -> Iterator[str]:
+        """
+        Converts the replay back to the a2.py input script it was recorded
+        from. The config is not part of a script; it is in self.config.
+
+        Returns:
+            Iterator[str]: The input lines.
+        """
+        yield str(self.rows)
+        yield str(self.columns)
+        if self.contents is None:
+            yield 'EMPTY'
+        else:
+            yield 'CONTENTS'
+            yield from self.contents
+        for op, args, _ in self._ops(self._start):
+            if op == OP_TICKS:
+                for _ in range(args[0]):
+                    yield ''
+            elif op in OP_COMMANDS:
+                yield OP_COMMANDS[op]
+            elif op == OP_FALLER:
+                yield f"F {shlex.quote(args[0])} {shlex.quote(args[1])}"
+            elif op == OP_VIRUS:
+                yield f"V {args[0]} {args[1]} {shlex.quote(args[2])}"
+
+    def close(self) -> None:
+        """
+        Closes the memory map.
+        """
+        self._data.close()
+
+    def __enter__(self) -> 'ReplayReader':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Binary replays of a2.py games.')
+    parser.add_argument('--engine', choices=a2.ENGINES, default='list')
+    subparsers = parser.add_subparsers(dest='action', required=True)
+    record_parser = subparsers.add_parser('record', help='record an a2.py input script')
+    record_parser.add_argument('script')
+    record_parser.add_argument('replay')
+    record_parser.add_argument('--checkpoint-every', type=int, default=1000, help='ticks between checkpoints')
+    a2.add_config_arguments(record_parser)
+    show_parser = subparsers.add_parser('show', help='print the field at a tick')
+    show_parser.add_argument('replay')
+    show_parser.add_argument('--tick', type=int, default=None, help='defaults to the last tick')
+    text_parser = subparsers.add_parser('text', help='print the a2.py input script of a replay')
+    text_parser.add_argument('replay')
+    args = parser.parse_args()
+    state_class = a2.engine_class(args.engine)
+
+    if args.action == 'record':
+        with open(args.script) as script, open(args.replay, 'wb') as replay:
+            ticks = record_script(script.read().splitlines(), replay, args.checkpoint_every, state_class,
+                                  a2.config_from_args(record_parser, args))
+        print(f"{ticks} ticks recorded")
+
+    elif args.action == 'show':
+        with ReplayReader(args.replay, state_class) as reader:
+            tick = reader.ticks if args.tick is None else args.tick
+            game_state = reader.state_at(tick)
+        print(f"tick {min(tick, reader.ticks)} of {reader.ticks}")
+        game_print.print_field(game_state)
+        if game_state.game_over:
+            game_print.game_over()
+        else:
+            game_print.level_cleared(game_state)
+
+    elif args.action == 'text':
+        with ReplayReader(args.replay, state_class) as reader:
+            for line in reader.lines():
+                sys.stdout.write(line + '\n')
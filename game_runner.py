@@ -0,0 +1,123 @@
+import argparse
+import functools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import a2
+import game_logic
+import game_print
+import game_script
+
+
+def play_script(text: str, engine: str = 'list', config: game_logic.GameConfig = game_logic.DEFAULT_CONFIG) -> dict:
+    """
+    Plays one command script (the same input a2.py reads) without printing
+    every frame. The script is compiled once and kept in a cache, see
+    game_script.compile_cached.
+
+    Args:
+        text (str): The field header followed by the commands.
+        engine (str, optional): 'list', 'array', 'sparse' or 'parallel', see a2.engine_class.
+        config (GameConfig, optional): The match length and virus colors to play with.
+
+    Returns:
+        dict: The final field as printed by a2.py, the result ('LEVEL CLEARED',
+        'GAME OVER' or None) and the number of ticks that passed.
+    """
+    script = game_script.compile_cached(text)
+    game_state = game_script.new_state(script, functools.partial(a2.engine_class(engine), config=config))
+    ticks = game_script.execute(script, game_state)
+
+    if game_state.game_over:
+        result = 'GAME OVER'
+    elif not game_state.detect_viruses():
+        result = 'LEVEL CLEARED'
+    else:
+        result = None
+    return {'field': game_print.field_lines(game_state), 'result': result, 'ticks': ticks}
+
+
+def run_script_file(path: str, engine: str = 'list',
+                    config: game_logic.GameConfig = game_logic.DEFAULT_CONFIG) -> dict:
+    """
+    Plays the script stored in a file. Errors are reported in the result
+    instead of being raised, so one bad script does not stop a whole run.
+
+    Args:
+        path (str): Path of the script.
+        engine (str, optional): 'list', 'array', 'sparse' or 'parallel', see a2.engine_class.
+        config (GameConfig, optional): The match length and virus colors to play with.
+
+    Returns:
+        dict: The result of play_script, plus the script path.
+    """
+    try:
+        with open(path) as file:
+            record = play_script(file.read(), engine, config)
+    except Exception as error:
+        record = {'field': None, 'result': 'ERROR', 'ticks': None, 'error': f'{type(error).__name__}: {error}'}
+    return {'script': path, **record}
+
+
+def list_scripts(source: str) -> list[str]:
+    """
+    Finds the scripts to run.
+
+    Args:
+        source (str): A directory of scripts, or a manifest file with one script
+        path per line (relative paths are relative to the manifest).
+
+    Returns:
+        list[str]: The script paths, in a stable order.
+    """
+    if os.path.isdir(source):
+        return sorted(os.path.join(source, name) for name in os.listdir(source)
+                      if os.path.isfile(os.path.join(source, name)))
+
+    base = os.path.dirname(source)
+    with open(source) as file:
+        return [os.path.join(base, line.strip()) for line in file
+                if line.strip() and not line.startswith('#')]
+
+
+def run_scripts(paths: list[str], results_path: str, engine: str = 'list', workers: int = None,
+                config: game_logic.GameConfig = game_logic.DEFAULT_CONFIG) -> int:
+    """
+    Plays the scripts on a process pool and writes one JSON line per game,
+    in the order of paths.
+
+    Args:
+        paths (list[str]): The script paths.
+        results_path (str): The file the results are written to.
+        engine (str, optional): 'list', 'array', 'sparse' or 'parallel', see a2.engine_class.
+        workers (int, optional): Number of processes, defaults to the CPU count.
+        config (GameConfig, optional): The match length and virus colors to play with.
+
+    Returns:
+        int: The number of scripts that could not be played.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(paths) // (workers * 8))
+    errors = 0
+    with ProcessPoolExecutor(workers) as executor, open(results_path, 'w') as results:
+        for record in executor.map(run_script_file, paths, [engine] * len(paths), [config] * len(paths),
+                                   chunksize=chunksize):
+            errors += record['result'] == 'ERROR'
+            results.write(json.dumps(record) + '\n')
+    return errors
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Plays many a2.py command scripts in parallel.')
+    parser.add_argument('source', help='a directory of scripts or a manifest file listing them')
+    parser.add_argument('-o', '--output', default='results.jsonl', help='where to write the results')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='number of processes')
+    parser.add_argument('--engine', choices=a2.ENGINES, default='list')
+    a2.add_config_arguments(parser)
+    args = parser.parse_args()
+    config = a2.config_from_args(parser, args)
+
+    scripts = list_scripts(args.source)
+    failed = run_scripts(scripts, args.output, args.engine, args.workers, config)
+    print(f'{len(scripts)} scripts played, {failed} failed, results in {args.output}')
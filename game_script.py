@@ -0,0 +1,186 @@
+import hashlib
+import re
+import shlex
+from array import array
+from typing import NamedTuple
+
+import game_logic
+from game_replay import (COMMAND_OPS, OP_END, OP_FALLER, OP_METHODS, OP_TICKS, OP_VIRUS, new_game,
+                         read_header)
+
+
+OP_ERROR = 10  # index into CompiledScript.errors: a line a2.py fails on
+SCRIPT_CACHE_SIZE = 256  # compiled scripts kept by compile_cached
+OPERAND_MIN, OPERAND_MAX = -1 << 31, (1 << 31) - 1  # operands are 32-bit
+PLAIN_LINE = re.compile(r"[^'\"\\\x0b\x0c\x1c-\x1f]*")  # ASCII lines that str.split() splits like shlex.split
+
+_cache = game_logic.TranspositionTable(SCRIPT_CACHE_SIZE)  # content hash -> CompiledScript
+
+
+class CompiledScript(NamedTuple):
+    """
+    An a2.py input script turned into opcodes, see compile_script.
+    """
+    rows: int
+    columns: int
+    contents: tuple[str, ...] | None  # None for an EMPTY field
+    code: array  # opcodes of game_replay followed by their arguments, as 32-bit integers
+    strings: tuple[str, ...]  # colors, referenced from code by index
+    errors: tuple[Exception, ...]  # what each OP_ERROR raises
+
+
+def compile_script(text: str) -> CompiledScript:
+    """
+    Parses an a2.py input script once into a flat opcode array: OP_TICKS
+    with a count for every run of empty lines, OP_FALLER with two color
+    indices, OP_VIRUS with row, column and a color index, one opcode per
+    move or rotation, and OP_END for Q. Lines a2.py ignores are left out.
+    A line a2.py would fail on becomes OP_ERROR, so the error is raised at
+    the same point of the game by execute().
+
+    Args:
+        text (str): The field header followed by the commands.
+
+    Returns:
+        CompiledScript: The compiled script.
+
+    Raises:
+        ValueError: If the field header is not valid.
+    """
+    lines = iter(text.splitlines())
+    rows, columns, contents = read_header(lambda: next(lines))
+    code = array('i')
+    strings = {}  # color -> index
+    errors = []
+
+    def string(value: str) -> int:
+        index = strings.get(value)
+        if index is None:
+            index = strings[value] = len(strings)
+        return index
+
+    def flush_ticks(count: int) -> None:
+        while count:
+            step = min(count, OPERAND_MAX)
+            code.extend((OP_TICKS, step))
+            count -= step
+
+    ticks = 0
+    for line in lines:
+        op = COMMAND_OPS.get(line)  # the usual one-character lines
+        if op is None and line.strip() == '':
+            ticks += 1
+            continue
+        if ticks:
+            flush_ticks(ticks)
+            ticks = 0
+        if op is not None:
+            code.append(op)
+            continue
+        if line.strip().upper() == 'Q':
+            code.append(OP_END)
+            break
+
+        try:
+            if line.isascii() and PLAIN_LINE.fullmatch(line):
+                command_lst = line.split()
+            else:
+                command_lst = shlex.split(line)
+            if command_lst[0] in COMMAND_OPS:
+                code.append(COMMAND_OPS[command_lst[0]])
+            elif command_lst[0] == 'F':
+                code.extend((OP_FALLER, string(command_lst[1]), string(command_lst[2])))
+            elif command_lst[0] == 'V':
+                row, column = int(command_lst[1]), int(command_lst[2])
+                if not (OPERAND_MIN <= row <= OPERAND_MAX and OPERAND_MIN <= column <= OPERAND_MAX):
+                    row = column = -1  # off the field either way, so create_virus ignores it
+                code.extend((OP_VIRUS, row, column, string(command_lst[3])))
+        except (ValueError, IndexError) as error:
+            code.extend((OP_ERROR, len(errors)))
+            errors.append(error)
+    flush_ticks(ticks)
+
+    return CompiledScript(rows, columns, tuple(contents) if contents is not None else None,
+                          code, tuple(strings), tuple(errors))
+
+
+def compile_cached(text: str) -> CompiledScript:
+    """
+    Returns the compiled script for a text, compiling it only the first time
+    the same content is seen.
+
+    Args:
+        text (str): The field header followed by the commands.
+
+    Returns:
+        CompiledScript: The compiled script, shared by all callers.
+    """
+    key = hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+    script = _cache.get(key)
+    if script is None:
+        script = compile_script(text)
+        _cache.put(key, script)
+    return script
+
+
+def new_state(script: CompiledScript, state_class: type = game_logic.GameState) -> game_logic.GameState:
+    """
+    Args:
+        script (CompiledScript): The compiled script.
+        state_class (type, optional): The GameState class used as the engine.
+
+    Returns:
+        GameState: The game state a2.py starts the script from.
+    """
+    return new_game(script.rows, script.columns,
+                    list(script.contents) if script.contents is not None else None, state_class)
+
+
+def execute(script: CompiledScript, game_state: game_logic.GameState) -> int:
+    """
+    Plays a compiled script on a game state by calling its methods directly,
+    the way a2.py plays the script text: the faller state is checked before
+    every command and the game stops at Q or when it is over. Runs of empty
+    lines are played with one time_passed call.
+
+    Args:
+        script (CompiledScript): The compiled script.
+        game_state (GameState): The game state, usually from new_state.
+
+    Returns:
+        int: The number of ticks that passed.
+    """
+    code = script.code
+    strings = script.strings
+    methods = [None] * (max(OP_METHODS) + 1)
+    for op, name in OP_METHODS.items():
+        methods[op] = getattr(game_state, name)
+    test_faller_state = game_state.test_faller_state
+    ticks = 0
+    i = 0
+    size = len(code)
+    while i < size:
+        op = code[i]
+        test_faller_state()
+        if op == OP_TICKS:
+            game_state.time_passed(code[i + 1])
+            ticks += code[i + 1]
+            i += 2
+        elif op == OP_FALLER:
+            game_state.create_faller(strings[code[i + 1]], strings[code[i + 2]])
+            i += 3
+            if game_state.game_over:  # only create_faller can end the game
+                break
+        elif op == OP_VIRUS:
+            game_state.create_virus(code[i + 1], code[i + 2], strings[code[i + 3]])
+            i += 4
+        elif op == OP_ERROR:
+            error = script.errors[code[i + 1]]
+            raise type(error)(*error.args)
+        elif op == OP_END:
+            break
+        else:
+            methods[op]()
+            i += 1
+    test_faller_state()
+    return ticks
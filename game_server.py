@@ -0,0 +1,256 @@
+import argparse
+import asyncio
+import functools
+
+import a2
+import game_logic
+import game_print
+
+
+HIGH_WATER = 64 * 1024  # bytes queued for a client before its frames are skipped
+SESSIONS_PER_YIELD = 256  # sessions ticked before the clock lets other tasks run
+LINGER = 5.0  # seconds to wait for a client to stop sending after its session ended
+
+
+async def read_frame(reader: asyncio.StreamReader, previous: list[str] | None) -> tuple[int, list[str]] | None:
+    """
+    Reads one frame sent by the server, for clients. Frames are encoded with
+    game_print.format_frame.
+
+    Args:
+        reader (asyncio.StreamReader): The connection.
+        previous (list[str] | None): The lines of the last frame read, if any.
+
+    Returns:
+        tuple[int, list[str]] | None: The frame number and lines, None when the server closed the session.
+
+    Raises:
+        ValueError: If the server reported an error.
+    """
+    header = (await reader.readline()).decode()
+    if not header:
+        return None
+    kind, *fields = header.rstrip('\n').split(' ', 3)
+    if kind == 'E':
+        raise ValueError(' '.join(fields))
+    number, count = int(fields[0]), int(fields[1])
+    body = [(await reader.readline()).decode().rstrip('\n') for _ in range(count)]
+    if kind == 'F':
+        return number, body
+    lines = (previous or [])[:int(fields[2])]
+    lines += [''] * (int(fields[2]) - len(lines))
+    for line in body:
+        index, _, text = line.partition(' ')
+        lines[int(index)] = text
+    return number, lines
+
+
+class Session:
+    """
+    One game played by one client.
+
+    Args:
+        game_state (GameState): The game.
+        writer (asyncio.StreamWriter): The connection to the client.
+    """
+    def __init__(self, game_state: game_logic.GameState, writer: asyncio.StreamWriter) -> None:
+        self.game_state = game_state
+        self.writer = writer
+        self.frame = 0  # number of frames rendered, sent or not
+        self.skipped = 0  # frames not sent because the client was too slow
+        self._sent = None  # lines of the last frame sent
+        self._sent_key = None  # zobrist and game over of the last frame sent
+
+    def congested(self) -> bool:
+        """
+        Returns:
+            bool: Whether more than HIGH_WATER bytes are waiting to be sent to the client.
+        """
+        return self.writer.transport.get_write_buffer_size() > HIGH_WATER
+
+    def send_frame(self, game_over: bool = False, force: bool = False) -> bool:
+        """
+        Sends the current frame as a delta from the last frame the client got.
+        Unless forced, the frame is not sent if the board has the same Zobrist
+        hash as in that frame, or if the client is congested, so a slow client
+        gets fewer frames instead of an ever growing queue.
+
+        Args:
+            game_over (bool, optional): Whether to end the frame with GAME OVER.
+            force (bool, optional): Send even if nothing changed or the client is congested.
+
+        Returns:
+            bool: Whether the frame was sent.
+        """
+        self.frame += 1
+        key = (self.game_state.zobrist, game_over)
+        if not force:
+            if key == self._sent_key:
+                return False
+            if self.congested():
+                self.skipped += 1
+                return False
+        lines = game_print.frame_lines(self.game_state, game_over)
+        self.writer.write(game_print.format_frame(self.frame, lines, self._sent).encode())
+        self._sent = lines
+        self._sent_key = key
+        return True
+
+
+class GameServer:
+    """
+    Runs many a2.py games in one process. Every connection is one session: the
+    client sends the field header and then commands, in the same language as
+    a2.py, and gets a frame after each command. Without a tick interval time
+    only passes on empty lines, as in a2.py; with one, a single clock task also
+    lets one tick pass in every session each interval.
+
+    Args:
+        tick_interval (float, optional): Seconds between clock ticks, None for no clock.
+        state_class (type, optional): The GameState class used as the engine.
+    """
+    def __init__(self, tick_interval: float = None, state_class: type = game_logic.GameState) -> None:
+        self.tick_interval = tick_interval
+        self.state_class = state_class
+        self.sessions = {}  # used as an ordered set of Session
+        self.late_ticks = 0  # clock ticks dropped because a round took longer than the interval
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Plays the session of one connection until Q, game over or the end of input.
+
+        Args:
+            reader (asyncio.StreamReader): Commands from the client.
+            writer (asyncio.StreamWriter): Frames to the client.
+        """
+        writer.transport.set_write_buffer_limits(high=HIGH_WATER)
+        session = None
+        try:
+            async def read_line() -> str:
+                line = await reader.readline()
+                if not line:
+                    raise EOFError
+                return line.decode().rstrip('\r\n')
+
+            header = [await read_line(), await read_line(), await read_line()]
+            if header[2].strip().upper() == 'CONTENTS':
+                header += [await read_line() for _ in range(int(header[0]))]
+            lines = iter(header)
+            game_state = a2.get_input_set_field(self.state_class, lambda: next(lines))
+            session = Session(game_state, writer)
+            self.sessions[session] = None
+            session.send_frame(force=True)
+
+            while True:
+                command = await read_line()
+                game_state.test_faller_state()
+                if command.strip().upper() == 'Q':
+                    break
+                a2.run_command(game_state, command)
+                game_state.test_faller_state()
+                if game_state.game_over:  # only create_faller can end the game
+                    session.send_frame(game_over=True, force=True)
+                    break
+                session.send_frame(force=True)
+                await writer.drain()  # stop reading commands while the client does not read frames
+
+        except EOFError:  # the end of the input counts as Q
+            pass
+        except (ValueError, IndexError, StopIteration) as error:
+            writer.write(f"E {type(error).__name__}: {error}\n".encode())
+        except ConnectionError:
+            pass
+        finally:
+            if session is not None:
+                self.sessions.pop(session, None)
+        await self._close(reader, writer)
+
+    async def _close(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Ends a connection. Commands the client sent after the end of the game
+        are read and dropped first: closing a TCP socket with unread input
+        resets it, and the client could lose its last frames.
+
+        Args:
+            reader (asyncio.StreamReader): Commands from the client.
+            writer (asyncio.StreamWriter): Frames to the client.
+        """
+        try:
+            if writer.can_write_eof():
+                writer.write_eof()
+            await asyncio.wait_for(self._discard(reader), LINGER)
+        except (ConnectionError, asyncio.TimeoutError):
+            pass
+        writer.close()
+
+    @staticmethod
+    async def _discard(reader: asyncio.StreamReader) -> None:
+        while await reader.read(1 << 16):
+            pass
+
+    async def run_clock(self) -> None:
+        """
+        Lets one tick pass in every session each tick_interval seconds. A
+        round that takes longer than the interval drops the ticks it missed
+        instead of running them in a burst.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while True:
+            deadline += self.tick_interval
+            for i, session in enumerate(list(self.sessions)):
+                if session not in self.sessions:  # closed during this round
+                    continue
+                game_state = session.game_state
+                game_state.test_faller_state()
+                game_state.time_passed()
+                game_state.test_faller_state()
+                session.send_frame()
+                if i % SESSIONS_PER_YIELD == SESSIONS_PER_YIELD - 1:
+                    await asyncio.sleep(0)
+            now = loop.time()
+            if now > deadline:
+                missed = int((now - deadline) / self.tick_interval) + 1
+                self.late_ticks += missed
+                deadline += missed * self.tick_interval
+            await asyncio.sleep(deadline - now)
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 7777, path: str = None,
+                    backlog: int = 4096) -> None:
+        """
+        Accepts connections until cancelled.
+
+        Args:
+            host (str, optional): TCP host.
+            port (int, optional): TCP port.
+            path (str, optional): Listen on this Unix socket instead of TCP.
+            backlog (int, optional): Connections that may wait to be accepted.
+        """
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle, path, backlog=backlog)
+        else:
+            server = await asyncio.start_server(self.handle, host, port, backlog=backlog)
+        clock = asyncio.create_task(self.run_clock()) if self.tick_interval else None
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if clock is not None:
+                clock.cancel()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serves many a2.py games over TCP or a Unix socket.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7777)
+    parser.add_argument('--unix', help='listen on this Unix socket path instead of TCP')
+    parser.add_argument('--tick-interval', type=float, default=None,
+                        help='seconds between ticks in every session, by default time only passes on empty lines')
+    parser.add_argument('--engine', choices=a2.ENGINES, default='list')
+    a2.add_config_arguments(parser)
+    args = parser.parse_args()
+    state_class = functools.partial(a2.engine_class(args.engine), config=a2.config_from_args(parser, args))
+    try:
+        asyncio.run(GameServer(args.tick_interval, state_class).serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
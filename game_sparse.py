@@ -0,0 +1,220 @@
+from typing import Iterator
+
+import game_logic
+
+
+class SparseFieldRow(dict):
+    """
+    One row of a SparseField: a dict of column -> character holding only the
+    non-empty cells, that reads like a list of characters. Missing columns
+    read as ' ', writing ' ' removes the cell, and len() and iteration cover
+    every column. Columns must be in range, negative ones are not supported.
+
+    Args:
+        columns (int): Number of columns.
+    """
+    __slots__ = ('columns',)
+
+    def __init__(self, columns: int) -> None:
+        super().__init__()
+        self.columns = columns
+
+    def __missing__(self, col: int) -> str:
+        return ' '
+
+    def __setitem__(self, col: int, character: str) -> None:
+        if character == ' ':
+            self.pop(col, None)
+        else:
+            dict.__setitem__(self, col, character)
+
+    def __len__(self) -> int:
+        return self.columns
+
+    def __iter__(self):
+        line = [' '] * self.columns
+        for col, character in self.items():
+            line[col] = character
+        return iter(line)
+
+
+class EmptyFieldRow(SparseFieldRow):
+    """
+    The row a SparseField returns for every row without cells. It is shared
+    and read-only; cells are written with SparseField.set_cell.
+    """
+    __slots__ = ()
+
+    def __setitem__(self, col: int, character: str) -> None:
+        if character != ' ':
+            raise TypeError("Rows without cells are read-only, use SparseField.set_cell.")
+
+
+class SparseField(dict):
+    """
+    A list-of-lists compatible field that only stores its non-empty cells, so
+    that GameState methods and game_print can keep reading field[row][col] as
+    characters. It is a dict of row -> SparseFieldRow holding only the rows
+    that have cells; the other rows read as one shared empty row. Rows must
+    be in range, negative ones are not supported.
+
+    Args:
+        rows (int): Number of rows.
+        columns (int): Number of columns.
+    """
+    __slots__ = ('rows', 'columns', '_empty')
+
+    def __init__(self, rows: int, columns: int) -> None:
+        super().__init__()
+        self.rows = rows
+        self.columns = columns
+        self._empty = EmptyFieldRow(columns)
+
+    def __missing__(self, row: int) -> SparseFieldRow:
+        return self._empty
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __iter__(self):
+        return (self.get(r, self._empty) for r in range(self.rows))
+
+    def set_cell(self, row: int, col: int, character: str) -> None:
+        """
+        Writes a cell. A row is stored when its first cell is written and
+        removed when its last cell is emptied.
+
+        Args:
+            row (int): Row position.
+            col (int): Column position.
+            character (str): The new content of the cell, ' ' to empty it.
+        """
+        line = self.get(row)
+        if character == ' ':
+            if line is not None:
+                line.pop(col, None)
+                if not dict.__len__(line):
+                    del self[row]
+        else:
+            if line is None:
+                line = self[row] = SparseFieldRow(self.columns)
+            dict.__setitem__(line, col, character)
+
+    def copy(self) -> 'SparseField':
+        """
+        Returns:
+            SparseField: An independent copy.
+        """
+        field = SparseField(self.rows, self.columns)
+        for r, line in self.items():
+            copy = field[r] = SparseFieldRow(self.columns)
+            copy.update(line)
+        return field
+
+    def tolist(self) -> list[list[str]]:
+        """
+        Returns:
+            list[list[str]]: A plain copy of the field as characters.
+        """
+        return [list(row) for row in self]
+
+
+class SparseGameState(game_logic.GameState):
+    """
+    A GameState whose field only stores the occupied cells, for very tall or
+    wide boards that are mostly empty. Setting up the field, hashing it,
+    counting viruses and rescanning it for matches take time in the number of
+    occupied cells instead of the area of the board. Printing the field and
+    snapshot() still go over every cell.
+
+    Args:
+        config (GameConfig, optional): The match length and virus colors to play with.
+    """
+    def __init__(self, config: game_logic.GameConfig = game_logic.DEFAULT_CONFIG) -> None:
+        self._field = SparseField(0, 0)
+        super().__init__(config)
+
+    @property
+    def field(self) -> SparseField:
+        return self._field
+
+    @field.setter
+    def field(self, value) -> None:
+        if not isinstance(value, SparseField):
+            field = SparseField(len(value), len(value[0]) if value else 0)
+            for r, row in enumerate(value):
+                for c, character in enumerate(row):
+                    if character != ' ':
+                        field.set_cell(r, c, character)
+            value = field
+        self._field = value
+
+    def _empty_field(self, rows: int, columns: int) -> SparseField:
+        """
+        Args:
+            rows (int): Number of rows.
+            columns (int): Number of columns.
+
+        Returns:
+            SparseField: An empty field of the given size, without any cell stored.
+        """
+        return SparseField(rows, columns)
+
+    def _write_cell(self, row: int, col: int, value: str) -> None:
+        """
+        Stores a character in the field, adding or removing its row as needed.
+
+        Args:
+            row (int): Row position.
+            col (int): Column position.
+            value (str): The new content of the cell.
+        """
+        self._field.set_cell(row, col, value)
+
+    def _copy_field(self) -> SparseField:
+        """
+        Returns:
+            SparseField: A copy of the field that can be assigned to another state.
+        """
+        return self._field.copy()
+
+    def _occupied_cells(self) -> Iterator[tuple[int, int, str]]:
+        """
+        Yields:
+            tuple[int, int, str]: Row, column and character of every non-empty cell.
+        """
+        for r, row in self._field.items():
+            for c, character in row.items():
+                yield r, c, character
+
+    def _match_key(self, r: int, c: int) -> str | None:
+        """
+        Args:
+            r (int): Row position.
+            c (int): Column position.
+
+        Returns:
+            str | None: The upper-case color of the cell, None if it is empty or may not be matched.
+        """
+        row = self._field.get(r)
+        character = row.get(c) if row is not None else None
+        if character is None or (r, c) in self._unmatchable:
+            return None
+        return character.upper()
+
+    def find_matching(self) -> set[tuple[int, int]]:
+        """
+        Finds all matched positions on the field. A run never goes through an
+        empty cell, so a full rescan only scans the runs through occupied
+        cells, the same way changed cells are rescanned.
+
+        Returns:
+            set[tuple[int, int]]: Positions that is matched and should be cleared.
+        """
+        if self._rescan_all:
+            self._rescan_all = False
+            self._row_windows = {}
+            self._col_windows = {}
+            self.matched_set = set()
+            self._dirty_cells.update((r, c) for r, c, _ in self._occupied_cells())
+        return super().find_matching()
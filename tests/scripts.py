@@ -0,0 +1,107 @@
+import asyncio
+import random
+
+import a2
+import game_logic
+import game_server
+
+
+def random_script(seed: int, colors: str = 'rby') -> str:
+    """
+    Generates a seeded a2.py input script: a small EMPTY or CONTENTS field,
+    then fallers with a few moves, rotations, hard drops and viruses, each
+    followed by enough empty lines for most of them to land and clear.
+
+    Args:
+        seed (int): Seed of the random generator.
+        colors (str, optional): The virus colors; capsules get the upper-case ones.
+
+    Returns:
+        str: The script, ending with Q.
+    """
+    rnd = random.Random(seed)
+    rows, columns = rnd.randint(6, 16), rnd.randint(2, 7)
+    capsule_colors = colors.upper()
+    lines = [str(rows), str(columns)]
+    if rnd.random() < 0.3:
+        lines.append('EMPTY')
+    else:
+        lines.append('CONTENTS')
+        fill = rnd.random() * 0.7
+        for r in range(rows):
+            lines.append(''.join(rnd.choice(colors + capsule_colors) if r >= rows // 2 and rnd.random() < fill
+                                 else ' ' for _ in range(columns)))
+    for _ in range(rnd.randint(5, 40)):
+        color = rnd.choice(capsule_colors)
+        other = color if rnd.random() < 0.5 else rnd.choice(capsule_colors)
+        lines.append(f'F {color} {other}')
+        for _ in range(rnd.randint(0, 4)):
+            lines.append(rnd.choice(['A', 'B', '<', '>', '<', '>', '', 'D']))
+        if rnd.random() < 0.1:
+            lines.append(f'V {rnd.randint(-1, rows)} {rnd.randint(-1, columns)} {rnd.choice(colors)}')
+        lines.extend([''] * rnd.randint(rows // 2, rows + 4))
+    lines.append('Q')
+    return '\n'.join(lines) + '\n'
+
+
+def split_script(script: str) -> tuple[list[str], list[str]]:
+    """
+    Args:
+        script (str): An a2.py input script.
+
+    Returns:
+        tuple[list[str], list[str]]: The field header lines and the commands before Q.
+    """
+    lines = script.splitlines()
+    header = 3 + (int(lines[0]) if lines[2] == 'CONTENTS' else 0)
+    commands = lines[header:]
+    if 'Q' in commands:
+        commands = commands[:commands.index('Q')]
+    return lines[:header], commands
+
+
+def new_game(header: list[str], state_class: type = game_logic.GameState) -> game_logic.GameState:
+    """
+    Args:
+        header (list[str]): The field header lines of a script.
+        state_class (type, optional): The GameState class used as the engine.
+
+    Returns:
+        GameState: The game state a2.py starts the script from.
+    """
+    game_state = state_class()
+    game_state.initialize_field(int(header[0]), int(header[1]), header[2], header[3:] or None)
+    return game_state
+
+
+def run_command(game_state: game_logic.GameState, command: str) -> None:
+    """
+    Checks the faller state and applies one command line, as the a2.py loop does.
+
+    Args:
+        game_state (GameState): The game state.
+        command (str): The command line, anything but Q.
+    """
+    game_state.test_faller_state()
+    a2.run_command(game_state, command)
+
+
+def decode_frames(data: bytes) -> list[tuple[int, list[str]]]:
+    """
+    Args:
+        data (bytes): Frames written by game_print.format_frame.
+
+    Returns:
+        list[tuple[int, list[str]]]: The frame numbers and lines, read with game_server.read_frame.
+    """
+    async def read() -> list[tuple[int, list[str]]]:
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        frames, previous = [], None
+        while (frame := await game_server.read_frame(reader, previous)) is not None:
+            frames.append(frame)
+            previous = frame[1]
+        return frames
+
+    return asyncio.run(read())
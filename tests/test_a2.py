@@ -0,0 +1,73 @@
+import functools
+import io
+import os
+import subprocess
+import sys
+
+import pytest
+
+import a2
+import game_logic
+from scripts import random_script
+
+A2 = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'a2.py')
+SCRIPTS = [random_script(seed) for seed in range(8)] + ['4\n4\nEMPTY\n\nF R R\nQ\n', '2\n4\nEMPTY\nF R B\nF Y Y\n']
+
+
+def run_a2(script: str, *options: str) -> str:
+    return subprocess.run([sys.executable, A2, *options], input=script, capture_output=True, text=True,
+                          check=True).stdout
+
+
+def frame_count(text: str) -> int:
+    return sum(line.startswith(' -') for line in text.splitlines())
+
+
+@pytest.mark.parametrize('script', SCRIPTS)
+def test_stream_prints_like_the_interactive_loop(script):
+    if not script.rstrip('\n').endswith('Q'):
+        script += 'Q\n'  # the interactive loop needs a Q at the end
+    out = io.StringIO()
+    a2.stream_game(script.splitlines(), out)
+    assert out.getvalue() == run_a2(script) == run_a2(script, '--stream')
+
+
+def test_final_frame_is_the_last_frame():
+    for seed in range(20):
+        script = random_script(seed)
+        everything, final = io.StringIO(), io.StringIO()
+        a2.stream_game(script.splitlines(), everything)
+        a2.stream_game(script.splitlines(), final, 'final')
+        assert frame_count(final.getvalue()) == 1
+        assert everything.getvalue().endswith(final.getvalue())
+
+
+def test_every_nth_frame_and_the_last():
+    script = '4\n4\nEMPTY\n' + '\n' * 9 + 'Q\n'
+    out = io.StringIO()
+    a2.stream_game(script.splitlines(), out, 4)
+    assert frame_count(out.getvalue()) == 4  # frames 0, 4 and 8, then the last one
+
+
+def test_end_of_input_counts_as_q():
+    with_q, without_q = io.StringIO(), io.StringIO()
+    a2.stream_game(['4', '4', 'EMPTY', '', 'Q'], with_q)
+    a2.stream_game(['4', '4', 'EMPTY', ''], without_q)
+    assert with_q.getvalue() == without_q.getvalue()
+
+
+def test_events_report_clears_and_game_over():
+    out = io.StringIO()
+    a2.stream_game(['2', '4', 'EMPTY', 'F R B', 'V 0 0 r', '', '', '', 'F Y Y', ''], out, 'events')
+    assert out.getvalue() == 'LEVEL CLEARED\nGAME OVER\n'
+
+
+def test_match_length_and_colors_options():
+    config = game_logic.GameConfig(3, ('r', 'g'))
+    for seed in range(6):
+        script = random_script(seed, 'rg')
+        out = io.StringIO()
+        a2.stream_game(script.splitlines(), out, 'all', functools.partial(game_logic.GameState, config=config))
+        assert run_a2(script, '--match-length', '3', '--colors', 'RG') == out.getvalue(), f"seed {seed}"
+    with pytest.raises(subprocess.CalledProcessError):
+        run_a2('3\n4\nEMPTY\nQ\n', '--match-length', '1')
@@ -0,0 +1,119 @@
+import contextlib
+import io
+import random
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import game_batch
+import game_logic
+import game_print
+
+CONFIGS = [game_logic.DEFAULT_CONFIG, game_logic.GameConfig(3), game_logic.GameConfig(5, ('r', 'b', 'y', 'g'))]
+COMMANDS = ['', '', '', '', 'F', 'F', 'A', 'B', '<', '>', 'D', 'V']
+METHODS = {'': 'time_passed', 'A': 'rotate_clockwise', 'B': 'rotate_counterclockwise', '<': 'move_left',
+           '>': 'move_right', 'D': 'hard_drop'}
+
+
+def frame(game_state: game_logic.GameState) -> str:
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        game_print.print_field(game_state)
+    return out.getvalue()
+
+
+def random_board(rnd: random.Random, rows: int, columns: int, config: game_logic.GameConfig) -> game_logic.GameState:
+    colors = ''.join(config.colors)
+    fill = rnd.random() * 0.6
+    contents = [''.join(rnd.choice(colors + colors.upper()) if r >= rows // 2 and rnd.random() < fill else ' '
+                        for _ in range(columns)) for r in range(rows)]
+    game_state = game_logic.GameState(config)
+    game_state.initialize_field(rows, columns, 'CONTENTS', contents)
+    return game_state
+
+
+@pytest.mark.parametrize('config', CONFIGS, ids=lambda config: f"{config.match_length}-{''.join(config.colors)}")
+def test_batch_steps_like_one_game_state_per_board(config):
+    rnd = random.Random(config.match_length)
+    capsule_colors = ''.join(config.colors).upper()
+    for _ in range(4):
+        rows, columns = rnd.randint(6, 14), rnd.randint(3, 7)
+        states = [random_board(rnd, rows, columns, config) for _ in range(12)]
+        batch = game_batch.GameBatch.from_states(states)
+        over = set()  # boards whose game ended, they are compared once
+        for step in range(150):
+            groups = {}
+            for board in range(len(states)):
+                groups.setdefault(rnd.choice(COMMANDS), []).append(board)
+            batch.test_faller_state()
+            for game_state in states:
+                if not game_state.game_over:  # the batch leaves boards alone once they are over
+                    game_state.test_faller_state()
+
+            for command, boards in groups.items():
+                live = [board for board in boards if not states[board].game_over]
+                if command == 'F':
+                    colors = [(rnd.choice(capsule_colors), rnd.choice(capsule_colors)) for _ in boards]
+                    batch.create_faller([color1 for color1, _ in colors], [color2 for _, color2 in colors], boards)
+                    for board, (color1, color2) in zip(boards, colors):
+                        if board in live:
+                            states[board].create_faller(color1, color2)
+                elif command == 'V':
+                    viruses = [(rnd.randint(-1, rows), rnd.randint(-1, columns), rnd.choice(config.colors))
+                               for _ in boards]
+                    batch.create_virus(*zip(*viruses), boards)
+                    for board, virus in zip(boards, viruses):
+                        if board in live:
+                            states[board].create_virus(*virus)
+                else:
+                    getattr(batch, METHODS[command])(boards)
+                    for board in live:
+                        getattr(states[board], METHODS[command])()
+
+            viruses = batch.detect_viruses()
+            for board, game_state in enumerate(states):
+                if board in over:
+                    continue
+                copy = batch.to_game_state(board)
+                assert copy.game_over == game_state.game_over, (board, step)
+                if game_state.game_over:
+                    # the new faller may cover a capsule, and a batch holds one piece per cell
+                    assert copy.field == game_state.field, (board, step)
+                    over.add(board)
+                    continue
+                assert frame(copy) == frame(game_state), (board, step)
+                assert viruses[board] == game_state.detect_viruses(), (board, step)
+
+
+def test_empty_boards_stay_empty():
+    batch = game_batch.GameBatch(3, 5, 4)
+    for _ in range(3):
+        batch.test_faller_state()
+        batch.time_passed()
+    assert not batch.detect_viruses().any()
+    assert batch.find_matching().sum() == 0
+    for board in range(batch.count):
+        assert batch.to_game_state(board).field == [[' '] * 4 for _ in range(5)]
+
+
+def test_faller_lands_on_the_bottom_row_of_a_two_row_board():
+    game_state = game_logic.GameState()
+    game_state.initialize_field(2, 4, 'EMPTY')
+    batch = game_batch.GameBatch.from_states([game_state, game_state])
+    batch.create_faller(['R'], ['B'], [1])
+    for _ in range(3):
+        batch.test_faller_state()
+        batch.time_passed()
+    batch.test_faller_state()
+    assert batch.to_game_state(0).field[1] == [' '] * 4
+    assert batch.to_game_state(1).field[1] == [' ', 'R', 'B', ' ']
+
+
+def test_batch_clears_runs_of_the_configured_length():
+    game_state = game_logic.GameState(game_logic.GameConfig(3))
+    game_state.initialize_field(4, 4, 'CONTENTS', ['    ', '    ', '    ', 'RRR '])
+    batch = game_batch.GameBatch.from_states([game_state])
+    game_state.time_passed()
+    batch.time_passed()
+    assert batch.to_game_state(0).field[3] == game_state.field[3] == [' '] * 4
@@ -0,0 +1,52 @@
+import io
+import json
+
+import pytest
+
+import game_bench
+
+
+def results(*rows: tuple[str, float, int]) -> dict:
+    return {'results': [{'case': case, 'phase': 'time_passed', 'seconds': seconds, 'peak_bytes': peak}
+                        for case, seconds, peak in rows]}
+
+
+@pytest.fixture
+def baseline(tmp_path):
+    path = tmp_path / 'baseline.json'
+    path.write_text(json.dumps(results(('a', 1.0, 1000), ('b', 2.0, 1000))))
+    return str(path)
+
+
+def test_no_regression_within_the_threshold(baseline, capsys):
+    game_bench.check_regressions(baseline, results(('a', 1.09, 1090), ('b', 1.0, 500), ('new', 9.0, 9)), 0.1)
+    assert 'REGRESSION' not in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('current', [results(('a', 1.11, 1000)), results(('b', 2.0, 1200))], ids=['time', 'memory'])
+def test_regression_beyond_the_threshold_exits(baseline, current, capsys):
+    with pytest.raises(SystemExit) as raised:
+        game_bench.check_regressions(baseline, current, 0.1)
+    assert raised.value.code == 1
+    assert '1 regression(s) beyond 10%' in capsys.readouterr().err
+
+
+def test_boards_are_seeded():
+    board = game_bench.make_board(16, 8, 0.5, seed=3, capsules=6)
+    assert board.snapshot() == game_bench.make_board(16, 8, 0.5, seed=3, capsules=6).snapshot()
+    assert board.snapshot() != game_bench.make_board(16, 8, 0.5, seed=4, capsules=6).snapshot()
+    assert len(board.capsules) == 7  # the capsules and the faller
+
+
+def test_cascade_clears_every_level():
+    board = game_bench.make_board(14, 4, 0.0, cascade=3)
+    viruses = sum(board.virus_counts.values())
+    game_bench.settle(board)
+    assert viruses == 2 * (3 * 2 + 4) and not board.detect_viruses()
+
+
+def test_suite_reports_every_phase():
+    out = io.StringIO()
+    run = game_bench.run_suite([game_bench.BenchCase(8, 4, cascade=1)], repeat=1, min_time=0, out=out)
+    assert [result['phase'] for result in run['results']] == list(game_bench.PHASES)
+    assert game_bench.compare_results(run, run, out=out) == []
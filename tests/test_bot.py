@@ -0,0 +1,118 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import game_bot
+import game_logic
+from scripts import run_command
+
+
+def virus_board(seed: int) -> game_logic.GameState:
+    """
+    Returns:
+        GameState: A settled board with viruses in its bottom half and a new faller.
+    """
+    rnd = random.Random(seed)
+    rows, columns = rnd.randint(4, 12), rnd.randint(2, 8)
+    contents = [''.join(rnd.choice('rby') if r >= rows // 2 and rnd.random() < 0.4 else ' ' for _ in range(columns))
+                for r in range(rows)]
+    game_state = game_logic.GameState()
+    game_state.initialize_field(rows, columns, 'CONTENTS', contents)
+    game_state.test_faller_state()
+    game_state.create_faller(rnd.choice('RBY'), rnd.choice('RBY'))
+    return game_state
+
+
+def test_placement_commands_reach_the_placement():
+    for seed in range(40):
+        game_state = virus_board(seed)
+        before = game_state.snapshot()
+        placements = game_bot.find_placements(game_state)
+        assert placements, f"seed {seed}"
+        assert game_state.snapshot() == before  # the search works on clones
+        for placement in placements:
+            replayed = game_state.clone()
+            for command in placement.commands:
+                run_command(replayed, command)
+            assert replayed.faller is None
+            assert replayed.snapshot() == placement.game_state.snapshot(), f"seed {seed} {placement.commands}"
+
+
+def test_replayed_search_finds_what_simulation_finds():
+    for seed in range(40):
+        game_state = virus_board(seed)
+        replayed = game_bot._replay_placements(game_state)
+        assert replayed is not None, f"seed {seed}"
+        simulated = game_bot._simulate_placements(game_state)
+        assert {placement.game_state.zobrist: len(placement.commands) for placement in replayed} == \
+            {placement.game_state.zobrist: len(placement.commands) for placement in simulated}, f"seed {seed}"
+
+
+def test_every_orientation_on_a_two_by_two_board():
+    game_state = game_logic.GameState()
+    game_state.initialize_field(2, 2, 'EMPTY')
+    game_state.create_faller('R', 'B')
+    placements = {''.join(map(''.join, placement.game_state.field)): placement.commands
+                  for placement in game_bot.find_placements(game_state)}
+    assert placements == {'  RB': ('',), 'R B ': ('A', ''), ' R B': ('A', '>', ''), '  BR': ('A', 'A', ''),
+                          'B R ': ('B', ''), ' B R': ('B', '>', '')}
+
+
+def test_no_placements_without_a_faller():
+    game_state = game_logic.GameState()
+    game_state.initialize_field(4, 4, 'EMPTY')
+    assert game_bot.find_placements(game_state) == []
+
+
+def test_bot_clears_a_single_virus():
+    game_state = game_logic.GameState()
+    game_state.initialize_field(8, 4, 'EMPTY')
+    game_state.create_virus(7, 1, 'r')
+    with game_bot.Bot(time_budget=5.0) as bot:
+        commands = list(bot.play(game_state, [('R', 'R')] * 4))
+    assert commands[0] == 'F R R'
+    assert not game_state.detect_viruses()
+
+
+def test_snapshots_are_scored_under_their_rules():
+    game_state = game_logic.GameState(game_logic.GameConfig(3))
+    game_state.initialize_field(4, 4, 'CONTENTS', ['    ', '    ', 'b   ', 'RRRb'])
+    settled = game_state.clone()
+    settled.resolve()
+    assert settled.field[3] == [' ', ' ', ' ', 'b']
+    assert game_bot.score_snapshot(game_state.snapshot(), game_bot.evaluate) == game_bot.evaluate(settled)
+
+
+def test_pool_stops_sending_placements_at_the_deadline():
+    started = []
+    lock = threading.Lock()
+
+    def slow_heuristic(game_state: game_logic.GameState) -> float:
+        with lock:
+            started.append(time.perf_counter())
+        time.sleep(0.05)
+        return game_bot.evaluate(game_state)
+
+    game_state = virus_board(3)
+    placements = game_bot.find_placements(game_state)
+    assert len(placements) > 12
+    with game_bot.Bot(slow_heuristic, workers=2) as bot:
+        bot._executor = ThreadPoolExecutor(2)  # the heuristic is not picklable, the pool is only driven
+        deadline = time.perf_counter() + 0.12
+        scores = bot._score_in_pool(placements, deadline)
+        bot._executor.shutdown(wait=True)
+    assert scores and len(scores) < len(placements)
+    assert all(start < deadline for start in started)
+    assert len(started) <= len(scores) + 4  # two per worker in flight at the deadline
+    assert scores == {i: game_bot.score_snapshot(placements[i].game_state.snapshot(), game_bot.evaluate)
+                      for i in scores}
+
+
+def test_pool_waits_for_one_score_after_the_deadline():
+    game_state = virus_board(3)
+    placements = game_bot.find_placements(game_state)
+    with game_bot.Bot(workers=2) as bot:
+        bot._executor = ThreadPoolExecutor(2)
+        scores = bot._score_in_pool(placements, time.perf_counter() - 1)
+    assert 1 <= len(scores) <= 4
@@ -0,0 +1,201 @@
+import copy
+import functools
+import io
+import random
+
+import pytest
+
+import a2
+import game_history
+import game_logic
+import game_print
+from scripts import new_game, random_script, run_command, split_script
+
+CONFIGS = [game_logic.DEFAULT_CONFIG, game_logic.GameConfig(3), game_logic.GameConfig(2, ('r', 'b')),
+           game_logic.GameConfig(5, ('r', 'b', 'y', 'g'))]
+ENGINE_OPTIONS = {'parallel': {'workers': 2, 'threshold': 1}}  # every scan goes to the worker processes
+SEEDS = {'array': 40, 'sparse': 40, 'parallel': 6}
+
+
+def play(script: str, state_class: type) -> str:
+    out = io.StringIO()
+    a2.stream_game(script.splitlines(), out, 'all', state_class)
+    return out.getvalue()
+
+
+def from_contents(state_class: type, contents: list[str]) -> game_logic.GameState:
+    game_state = state_class()
+    game_state.initialize_field(len(contents), len(contents[0]), 'CONTENTS', contents)
+    return game_state
+
+
+@pytest.mark.parametrize('config', CONFIGS, ids=lambda config: f"{config.match_length}-{''.join(config.colors)}")
+@pytest.mark.parametrize('engine', ['array', 'sparse', 'parallel'])
+def test_engine_plays_like_the_list_engine(engine, config):
+    if engine != 'sparse':
+        pytest.importorskip('numpy')
+    state_class = functools.partial(a2.engine_class(engine), config=config, **ENGINE_OPTIONS.get(engine, {}))
+    reference = functools.partial(game_logic.GameState, config=config)
+    for seed in range(SEEDS[engine]):
+        script = random_script(seed, ''.join(config.colors))
+        assert play(script, state_class) == play(script, reference), f"seed {seed}"
+
+
+@pytest.mark.parametrize('script', ['3\n4\nEMPTY\n\n\nQ\n', '2\n4\nEMPTY\nF R B\n\n\n\nQ\n',
+                                    '6\n2\nEMPTY\nF R B\nA\n>\n<\nB\n\n\n\n\n\n\nQ\n',
+                                    '4\n4\nEMPTY\nF R B\nA\nA\nB\n\n\n\n\nQ\n'],
+                         ids=['empty', 'bottom row', 'two columns', 'rotations'])
+@pytest.mark.parametrize('engine', ['array', 'sparse', 'parallel'])
+def test_engines_agree_on_small_boards(engine, script):
+    if engine != 'sparse':
+        pytest.importorskip('numpy')
+    state_class = functools.partial(a2.engine_class(engine), **ENGINE_OPTIONS.get(engine, {}))
+    assert play(script, state_class) == play(script, game_logic.GameState)
+
+
+def test_array_engine_matches_runs_of_four():
+    game_array = pytest.importorskip('game_array')
+    contents = ['y     ', 'y     ', 'Yrrr  ', 'ybRRRr', 'bbbryy']
+    expected = {(0, 0), (1, 0), (2, 0), (3, 0), (3, 2), (3, 3), (3, 4), (3, 5)}
+    game_state = from_contents(game_array.ArrayGameState, contents)
+    assert game_state.find_matching() == from_contents(game_logic.GameState, contents).find_matching() == expected
+
+
+def test_array_engine_ignores_falling_capsules():
+    game_array = pytest.importorskip('game_array')
+    game_state = from_contents(game_array.ArrayGameState, ['    ', '    ', '    ', 'rr  '])
+    game_state.create_faller('R', 'R')
+    game_state.move_right()
+    for _ in range(2):
+        game_state.test_faller_state()
+        game_state.time_passed()
+    game_state.test_faller_state()
+    assert game_state.find_matching() == set()
+    game_state.time_passed()
+    game_state.test_faller_state()
+    assert game_state.find_matching() == {(3, 0), (3, 1), (3, 2), (3, 3)}
+
+
+@pytest.mark.parametrize('config', CONFIGS[:2], ids=['default', '3'])
+def test_incremental_matching_equals_a_full_scan(config):
+    for seed in range(40):
+        header, commands = split_script(random_script(seed))
+        game_state = new_game(header, functools.partial(game_logic.GameState, config=config))
+        for command in commands:
+            if game_state.game_over:
+                break
+            run_command(game_state, command)
+            rescanned = copy.deepcopy(game_state)
+            rescanned.invalidate_matching()
+            assert game_state.find_matching() == rescanned.find_matching(), f"seed {seed}"
+            game_state.check_consistency()
+
+
+@pytest.mark.parametrize('engine', ['list', 'array', 'sparse'])
+def test_runs_of_the_match_length_are_matched(engine):
+    if engine == 'array':
+        pytest.importorskip('numpy')
+    config = game_logic.GameConfig(3, ('r', 'g'))
+    contents = ['g    ', 'g    ', 'gRR  ', 'rrgg ', 'rgrrr']
+    game_state = from_contents(functools.partial(a2.engine_class(engine), config=config), contents)
+    assert game_state.find_matching() == {(0, 0), (1, 0), (2, 0), (4, 2), (4, 3), (4, 4)}
+    assert game_state.virus_counts == {'r': 6, 'g': 6}
+
+
+def test_matches_follow_cells_changed_between_scans():
+    game_state = from_contents(game_logic.GameState, ['    ', 'b   ', 'b   ', 'brrr'])
+    assert game_state.find_matching() == set()
+    game_state.create_virus(0, 0, 'b')
+    assert game_state.find_matching() == {(0, 0), (1, 0), (2, 0), (3, 0)}
+    game_state.clear_matching()
+    assert game_state.find_matching() == set()
+    game_state.create_virus(3, 0, 'r')
+    assert game_state.find_matching() == {(3, 0), (3, 1), (3, 2), (3, 3)}
+
+
+def test_half_capsule_index_follows_every_command():
+    for seed in range(40):
+        header, commands = split_script(random_script(seed))
+        game_state = new_game(header)
+        for command in commands:
+            run_command(game_state, command)
+            if game_state.game_over:  # the new faller may cover a capsule
+                break
+            indexed = {(r, c): game_state.half_capsule_at(r, c) for r in range(len(game_state.field))
+                       for c in range(len(game_state.field[0]))}
+            pieces = [*game_state.half_capsules, *(half for capsule in game_state.capsules for half in capsule),
+                      *(game_state.faller or ())]
+            assert {cell: half for cell, half in indexed.items() if half is not None} == \
+                {(half.row, half.col): half for half in pieces}, f"seed {seed}"
+            for half in pieces:
+                assert game_state.field[half.row][half.col].lower() == half.color.lower()
+
+
+@pytest.mark.parametrize('engine', ['list', 'array', 'sparse', 'parallel'])
+def test_every_engine_takes_the_config_first(engine):
+    if engine in ('array', 'parallel'):
+        pytest.importorskip('numpy')
+    config = game_logic.GameConfig(3)
+    game_state = a2.engine_class(engine)(config)
+    assert game_state.config == config
+    assert game_state.clone().config == config
+
+
+def test_sparse_field_stores_only_occupied_rows():
+    import game_sparse
+
+    game_state = game_sparse.SparseGameState()
+    game_state.initialize_field(1000, 20, 'EMPTY')
+    game_state.create_virus(900, 3, 'r')
+    game_state.create_virus(950, 5, 'b')
+    game_state.invalidate_matching()
+    game_state.find_matching()
+    game_print.print_field(game_state, io.StringIO())
+    game_state.detect_viruses()
+    assert sorted(game_state.field.keys()) == [900, 950]
+
+    game_state.create_faller('R', 'Y')
+    game_state.time_passed(20)
+    assert len(game_state.field.keys()) == 3
+
+
+def test_array_engine_keeps_the_runs_and_mask_of_the_list_engine():
+    game_array = pytest.importorskip('game_array')
+    np = pytest.importorskip('numpy')
+    for seed in range(30):
+        rnd = random.Random(seed)
+        header, commands = split_script(random_script(seed))
+        states = [new_game(header, game_array.ArrayGameState), new_game(header)]
+        histories = [game_history.GameHistory(game_state) for game_state in states]
+        for command in commands:
+            if states[1].game_over:
+                break
+            undo = rnd.random() < 0.1
+            for history in histories:
+                if undo:
+                    history.undo(2)
+                else:
+                    history.run(command)
+            array_state, list_state = states
+            assert array_state.find_matching() == list_state.find_matching(), f"seed {seed}"
+            # the same runs of every row and column, not only the same matched cells
+            assert (array_state._row_windows, array_state._col_windows) == \
+                (list_state._row_windows, list_state._col_windows), f"seed {seed}"
+            expected = np.ones(array_state.codes.shape, dtype=bool)
+            for r, c in list_state._unmatchable_cells():
+                expected[r, c] = False
+            assert np.array_equal(array_state.matchable_mask(), expected), f"seed {seed}"
+            assert np.array_equal(array_state.clone().matchable_mask(), expected), f"seed {seed}"
+
+
+def test_array_engine_rescans_only_the_changed_lines():
+    game_array = pytest.importorskip('game_array')
+    game_state = from_contents(game_array.ArrayGameState, ['    ', 'b   ', 'b  y', 'brrr'])
+    game_state.find_matching()
+    game_state._row_windows[0] = {(0, 4)}  # a stale run of a line that does not change
+    game_state.create_virus(0, 0, 'b')
+    assert game_state.find_matching() == {(0, 0), (1, 0), (2, 0), (3, 0)}  # row 0 was rescanned
+    game_state.clear_matching()
+    game_state._col_windows[3] = {(0, 4)}  # column 3 does not change either
+    game_state.create_virus(3, 0, 'r')
+    assert game_state.find_matching() == {(3, 0), (3, 1), (3, 2), (3, 3), *((r, 3) for r in range(4))}
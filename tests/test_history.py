@@ -0,0 +1,113 @@
+import functools
+import random
+
+import pytest
+
+import a2
+import game_history
+import game_logic
+from scripts import new_game, random_script, run_command, split_script
+
+ENGINE_OPTIONS = {'parallel': {'workers': 2, 'threshold': 60}}
+SEEDS = {'list': 20, 'array': 15, 'sparse': 15, 'parallel': 4}
+
+
+def snapshot(game_state: game_logic.GameState) -> game_logic.GameSnapshot:
+    taken = game_state.snapshot()
+    return taken._replace(half_capsules=tuple(taken.half_capsules))
+
+
+@pytest.mark.parametrize('engine', ['list', 'array', 'sparse', 'parallel'])
+def test_undo_and_redo_walk_back_and_forth(engine):
+    if engine in ('array', 'parallel'):
+        pytest.importorskip('numpy')
+    state_class = functools.partial(a2.engine_class(engine), **ENGINE_OPTIONS.get(engine, {}))
+    for seed in range(SEEDS[engine]):
+        rnd = random.Random(seed)
+        header, commands = split_script(random_script(seed))
+        game_state = new_game(header, state_class)
+        history = game_history.GameHistory(game_state, limit=rnd.choice([None, None, 5, 50]))
+        done, snapshots = [], [snapshot(game_state)]  # snapshots[i] is the state after done[:i]
+        undone = []  # (command, snapshot after it), the next one to redo last
+        position = 0
+        undoable = 0  # commands the limit has not forgotten yet
+        for step in range(2 * len(commands)):
+            roll = rnd.random()
+            if roll < 0.55 and position < len(commands):
+                command = commands[position]
+                position += 1
+                history.run(command)
+                done.append(command)
+                snapshots.append(snapshot(game_state))
+                undone.clear()
+                undoable = min(undoable + 1, len(done) if history.limit is None else history.limit)
+                if game_state.game_over:
+                    position = len(commands)
+            elif roll < 0.8:
+                steps = rnd.randint(1, 4)
+                expected = min(steps, undoable)
+                undoable -= expected
+                assert history.undo(steps) == expected, f"seed {seed} step {step}"
+                for _ in range(expected):
+                    undone.append((done.pop(), snapshots.pop()))
+            else:
+                steps = rnd.randint(1, 4)
+                expected = min(steps, len(undone))
+                undoable += expected
+                assert history.redo(steps) == expected, f"seed {seed} step {step}"
+                for _ in range(expected):
+                    command, taken = undone.pop()
+                    done.append(command)
+                    snapshots.append(taken)
+
+            assert history.undo_count == undoable, f"seed {seed} step {step}"
+            assert snapshot(game_state) == snapshots[-1], f"seed {seed} step {step}"
+            assert game_state.zobrist == game_state.compute_zobrist(), f"seed {seed} step {step}"
+            game_state.check_consistency()
+            if step % 7 == 0:
+                replayed = new_game(header, state_class)
+                for command in done:
+                    run_command(replayed, command)
+                assert replayed.snapshot() == game_state.snapshot(), f"seed {seed} step {step}"
+
+
+def test_undo_stops_at_the_history_limit():
+    header, commands = split_script(random_script(1))
+    game_state = new_game(header)
+    history = game_history.GameHistory(game_state, limit=3)
+    oldest = new_game(header)
+    for command in commands[:7]:
+        run_command(oldest, command)
+    for command in commands[:10]:
+        history.run(command)
+    latest = snapshot(game_state)
+    assert history.undo_count == 3
+    assert history.undo(10) == 3
+    assert snapshot(game_state) == snapshot(oldest)  # the limit forgot the first 7 commands
+    assert history.undo() == 0
+    assert snapshot(game_state) == snapshot(oldest)
+    assert history.redo_count == 3
+    assert history.redo(10) == 3
+    assert history.redo_count == 0
+    assert snapshot(game_state) == latest
+
+
+def test_empty_history_undoes_and_redoes_nothing():
+    game_state = new_game(['4', '4', 'EMPTY'])
+    history = game_history.GameHistory(game_state)
+    before = snapshot(game_state)
+    assert (history.undo(), history.redo()) == (0, 0)
+    assert snapshot(game_state) == before
+    history.run('F R B')
+    history.run('')
+    history.undo(2)
+    assert snapshot(game_state) == before
+    history.apply(lambda state: state.create_virus(3, 0, 'y'), 'V 3 0 y')
+    assert history.redo() == 0  # the new command dropped the undone ones
+
+
+def test_commands_cannot_be_recorded_inside_a_command():
+    game_state = new_game(['4', '4', 'EMPTY'])
+    history = game_history.GameHistory(game_state)
+    with pytest.raises(RuntimeError):
+        history.apply(lambda state: history.run('F R B'))
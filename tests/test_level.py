@@ -0,0 +1,169 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import game_level
+import game_logic
+
+GAME_LEVEL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'game_level.py')
+
+CONFIGS = [game_logic.DEFAULT_CONFIG, game_logic.GameConfig(3), game_logic.GameConfig(2, ('r', 'b', 'y')),
+           game_logic.GameConfig(5, ('r', 'b', 'y', 'g'))]
+
+
+def has_run(field: list[list[str]], length: int = 4) -> bool:
+    """
+    Returns:
+        bool: Whether length cells in a row or column hold the same virus.
+    """
+    rows, columns = len(field), len(field[0])
+    for r in range(rows):
+        for c in range(columns):
+            color = field[r][c]
+            if color == ' ':
+                continue
+            if c + length <= columns and all(field[r][c + i] == color for i in range(length)):
+                return True
+            if r + length <= rows and all(field[r + i][c] == color for i in range(length)):
+                return True
+    return False
+
+
+def board(rows: int, columns: int, viruses: list[tuple[int, int, str]]) -> list[list[str]]:
+    field = [[' '] * columns for _ in range(rows)]
+    for row, col, color in viruses:
+        assert field[row][col] == ' '
+        field[row][col] = color
+    return field
+
+
+@pytest.mark.parametrize('rows, columns', [(16, 8), (6, 4), (40, 3), (5, 30)])
+def test_seeded_levels_have_the_count_and_no_run(rows, columns):
+    for seed in range(30):
+        for level in (0, 10, 20):
+            top = game_level.virus_top(level, rows)
+            count = game_level.virus_count(level, rows, columns)
+            viruses = game_level.generate_level(rows, columns, level, seed=seed)
+            assert len(viruses) == count, f"seed {seed} level {level}"
+            assert all(top <= row < rows and 0 <= col < columns for row, col, _ in viruses)
+            assert not has_run(board(rows, columns, viruses)), f"seed {seed} level {level}"
+            assert viruses == game_level.generate_level(rows, columns, level, seed=seed)
+
+
+@pytest.mark.parametrize('config', CONFIGS, ids=lambda config: f"{config.match_length}-{''.join(config.colors)}")
+def test_levels_have_no_run_of_the_match_length(config):
+    colors = ''.join(config.colors)
+    for seed in range(30):
+        viruses = game_level.generate_level(16, 8, 20, seed=seed, colors=colors, match_length=config.match_length)
+        assert len(viruses) == game_level.virus_count(20, 16, 8), f"seed {seed}"
+        assert {color for _, _, color in viruses} <= set(colors)
+        assert not has_run(board(16, 8, viruses), config.match_length), f"seed {seed}"
+
+
+def test_a_full_region_has_no_run():
+    for seed in range(20):
+        viruses = game_level.generate_viruses(10, 7, 56, 2, seed)
+        assert len(viruses) == 56
+        assert not has_run(board(10, 7, viruses)), f"seed {seed}"
+
+
+def test_viruses_that_do_not_fit_are_rejected():
+    with pytest.raises(ValueError):
+        game_level.generate_viruses(4, 4, 9, 2)
+    with pytest.raises(ValueError):
+        game_level.generate_viruses(4, 4, -1, 2)
+    assert game_level.generate_viruses(4, 4, 0, 2) == []
+
+
+def test_levels_need_three_colors():
+    with pytest.raises(ValueError):
+        game_level.generate_viruses(10, 7, 20, 2, 1, 'rb')
+    with pytest.raises(ValueError):
+        game_level.new_level(16, 8, 5, config=game_logic.GameConfig(3, ('r', 'b')))
+    assert game_level.generate_viruses(10, 7, 0, 2, 1, 'rb') == []
+
+
+def test_new_level_holds_the_generated_viruses():
+    game_state = game_level.new_level(16, 8, 5, seed=3)
+    assert game_state.field == board(16, 8, game_level.generate_level(16, 8, 5, seed=3))
+    assert sum(game_state.virus_counts.values()) == game_level.virus_count(5, 16, 8)
+    assert game_state.zobrist == game_state.compute_zobrist()
+    game_state.check_consistency()
+
+
+@pytest.mark.parametrize('config', CONFIGS[1:], ids=lambda config: f"{config.match_length}-{''.join(config.colors)}")
+def test_new_level_follows_the_config(config):
+    for seed in range(10):
+        game_state = game_level.new_level(16, 8, 20, seed=seed, config=config)
+        assert game_state.config == config
+        assert set(game_state.virus_counts) == set(config.colors)
+        assert sum(game_state.virus_counts.values()) == game_level.virus_count(20, 16, 8)
+        assert not game_state.find_matching(), f"seed {seed}"
+
+
+def test_default_levels_keep_their_viruses():
+    assert game_level.new_level(16, 8, 5, seed=3, config=game_logic.GameConfig()).field == \
+        game_level.new_level(16, 8, 5, seed=3).field == board(16, 8, game_level.generate_level(16, 8, 5, seed=3))
+
+
+# runs of two can be left after every redraw, see GameBatch.random_levels
+@pytest.mark.parametrize('config', [config for config in CONFIGS if config.match_length > 2],
+                         ids=lambda config: f"{config.match_length}-{''.join(config.colors)}")
+def test_random_levels_have_the_count_and_no_run(config):
+    np = pytest.importorskip('numpy')
+    import game_batch
+    batch = game_batch.GameBatch.random_levels(50, 16, 8, 20, seed=1, config=config)
+    count = game_level.virus_count(20, 16, 8)
+    for b in range(50):
+        field = batch.to_game_state(b).field
+        assert sum(cell != ' ' for row in field for cell in row) == count, f"board {b}"
+        assert not has_run(field, config.match_length), f"board {b}"
+    again = game_batch.GameBatch.random_levels(50, 16, 8, 20, seed=1, config=config)
+    assert np.array_equal(batch.codes, again.codes)
+
+
+def test_random_levels_follow_the_config_colors():
+    pytest.importorskip('numpy')
+    import game_batch
+    config = game_logic.GameConfig(4, ('r', 'b', 'y', 'g'))
+    batch = game_batch.GameBatch.random_levels(20, 16, 8, 20, seed=2, config=config)
+    colors = {cell for b in range(20) for row in batch.to_game_state(b).field for cell in row}
+    assert colors == {' ', 'r', 'b', 'y', 'g'}
+
+
+def test_random_levels_of_match_length_two_keep_no_run():
+    pytest.importorskip('numpy')
+    import game_batch
+    batch = game_batch.GameBatch.random_levels(50, 16, 8, 20, seed=1, config=game_logic.GameConfig(2))
+    for b in range(50):
+        field = batch.to_game_state(b).field
+        assert 0 < sum(cell != ' ' for row in field for cell in row) <= game_level.virus_count(20, 16, 8)
+        assert not has_run(field, 2), f"board {b}"
+
+
+@pytest.mark.parametrize('options, config', [([], game_logic.DEFAULT_CONFIG),
+                                             (['--match-length', '3', '--colors', 'RBYG'],
+                                              game_logic.GameConfig(3, ('r', 'b', 'y', 'g')))],
+                         ids=['default', '3-rbyg'])
+def test_command_line_writes_levels_under_the_config(options, config):
+    lines = subprocess.run([sys.executable, GAME_LEVEL, '16', '8', '--level', '20', '--seed', '4', *options],
+                           capture_output=True, text=True, check=True).stdout.splitlines()
+    field = [list(line) for line in lines[3:19]]
+    viruses = [(r, c, cell) for r, row in enumerate(field) for c, cell in enumerate(row) if cell != ' ']
+    assert len(viruses) == game_level.virus_count(20, 16, 8)
+    assert {color for _, _, color in viruses} <= set(config.colors)
+    assert not has_run(field, config.match_length)
+    assert all(line[2] in ''.join(config.colors).upper() for line in lines[19:] if line.startswith('F '))
+
+
+def test_command_line_rejects_too_few_colors():
+    result = subprocess.run([sys.executable, GAME_LEVEL, '16', '8', '--colors', 'rb'], capture_output=True, text=True)
+    assert result.returncode == 2
+    assert '--colors' in result.stderr
+
+
+def test_capsule_stream_does_not_depend_on_how_much_is_read():
+    assert game_level.capsule_sequence(300, 7)[:5] == game_level.capsule_sequence(5, 7)
+    assert all(color1 in 'RYB' and color2 in 'RYB' for color1, color2 in game_level.capsule_sequence(50, 2))
@@ -0,0 +1,63 @@
+import io
+
+import pytest
+
+import a2
+import game_logic
+import game_print
+from scripts import decode_frames, random_script
+
+
+def small_game() -> game_logic.GameState:
+    game_state = game_logic.GameState()
+    game_state.initialize_field(4, 4, 'CONTENTS', ['    ', '    ', '    ', ' r  '])
+    return game_state
+
+
+def test_diff_renderer_draws_the_full_frames():
+    for seed in range(30):
+        script = random_script(seed)
+        full, diff = io.StringIO(), io.StringIO()
+        a2.stream_game(script.splitlines(), full)
+        a2.stream_game(script.splitlines(), diff, renderer=game_print.FieldRenderer(diff, 'diff'))
+        frames = decode_frames(diff.getvalue().encode())
+        assert [number for number, _ in frames] == list(range(1, len(frames) + 1))
+        assert ''.join(line + '\n' for _, lines in frames for line in lines) == full.getvalue(), f"seed {seed}"
+        assert len(diff.getvalue()) < len(full.getvalue())
+
+
+def test_diff_renderer_sends_only_changed_lines():
+    game_state = small_game()
+    out = io.StringIO()
+    renderer = game_print.FieldRenderer(out, 'diff')
+    renderer.render(game_state)
+    assert out.getvalue() == 'F 1 5\n|            |\n|            |\n|            |\n|    r       |\n ------------ \n'
+    game_state.create_faller('R', 'B')
+    renderer.render(game_state)
+    assert out.getvalue().endswith('D 2 1 5\n1 |   [R--B]   |\n')
+    renderer.reset()
+    renderer.render(game_state)
+    assert out.getvalue().endswith('F 3 5\n|            |\n|   [R--B]   |\n|            |\n|    r       |\n'
+                                   ' ------------ \n')
+
+
+def test_tty_renderer_redraws_changed_cells():
+    game_state = small_game()
+    out = io.StringIO()
+    renderer = game_print.FieldRenderer(out, 'tty')
+    renderer.render(game_state)
+    assert out.getvalue().startswith('\x1b[H\x1b[2J|            |\n')
+    start = len(out.getvalue())
+    renderer.render(game_state)
+    assert out.getvalue()[start:] == '\x1b[6;1H\x1b[J'  # nothing changed, only the cursor moves
+    start = len(out.getvalue())
+    game_state.create_faller('R', 'B')
+    renderer.render(game_state)
+    assert out.getvalue()[start:] == '\x1b[2;5H[R--B]\x1b[6;1H\x1b[J'
+
+
+def test_renderer_modes():
+    assert game_print.FieldRenderer(io.StringIO()).mode == 'diff'  # not a terminal
+    with pytest.raises(ValueError):
+        game_print.FieldRenderer(io.StringIO(), 'full')
+
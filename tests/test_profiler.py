@@ -0,0 +1,92 @@
+import io
+
+import a2
+import game_logic
+from scripts import random_script
+
+
+def chain() -> game_logic.GameState:
+    """
+    Returns:
+        GameState: A board where an R-Y faller clears a column of r, which
+        splits the capsule and drops the Y half into a row of y.
+    """
+    game_state = game_logic.GameState()
+    game_state.initialize_field(6, 5, 'CONTENTS', ['     ', '     ', '     ', 'r yyy', 'rb   ', 'r    '])
+    game_state.create_faller('R', 'Y')
+    game_state.move_left()
+    game_state.move_left()
+    return game_state
+
+
+def profiled() -> game_logic.GameState:
+    game_state = game_logic.GameState()
+    game_state.profiler = game_logic.TickProfiler()
+    return game_state
+
+
+def test_records_count_a_known_chain():
+    game_state = chain()
+    records = []
+    game_state.profiler = game_logic.TickProfiler(records.append)
+    for _ in range(7):
+        game_state.test_faller_state()
+        game_state.time_passed()
+    assert [(record.matched, record.moved, record.split, record.cascade) for record in records] == [
+        (0, 2, 0, 0),  # the faller falls one row
+        (0, 0, 0, 0),  # it freezes
+        (4, 0, 1, 1),  # the column of r clears and the capsule splits
+        (0, 1, 0, 1),  # the Y half falls
+        (4, 0, 0, 2),  # the row of y clears
+        (0, 0, 0, 2),
+        (0, 0, 0, 0),  # quiet again
+    ]
+    assert [record.tick for record in records] == list(range(1, 8))
+    assert all(set(record.times) == set(game_logic.TICK_PHASES) for record in records)
+
+    profiler = game_state.profiler
+    assert profiler.counts == {'matched': 8, 'moved': 3, 'split': 1}
+    assert (profiler.ticks, profiler.max_cascade) == (7, 2)
+    report = profiler.report()
+    assert report.startswith('ticks 7 (+0 skipped)')
+    assert '  split                    1\n' in report and '  max cascade              2\n' in report
+    profiler.reset()
+    assert (profiler.ticks, profiler.counts['matched'], profiler.max_cascade) == (0, 0, 0)
+
+
+def test_skipped_ticks_are_counted():
+    game_state = game_logic.GameState()
+    game_state.initialize_field(100, 4, 'EMPTY')
+    game_state.create_faller('R', 'B')
+    game_state.profiler = game_logic.TickProfiler()
+    game_state.time_passed(150)
+    assert game_state.profiler.ticks + game_state.profiler.skipped_ticks == 150
+    assert game_state.profiler.skipped_ticks > 100
+
+
+def test_clones_are_not_profiled():
+    game_state = chain()
+    game_state.profiler = game_logic.TickProfiler()
+    assert game_state.clone().profiler is None
+
+
+def test_profiling_does_not_change_the_output():
+    for seed in range(60):
+        script = random_script(seed)
+        plain, profiling = io.StringIO(), io.StringIO()
+        a2.stream_game(script.splitlines(), plain)
+        a2.stream_game(script.splitlines(), profiling, state_class=profiled)
+        assert profiling.getvalue() == plain.getvalue(), f"seed {seed}"
+
+
+def test_quiet_board_is_only_checked_during_a_cascade():
+    game_state = chain()
+    game_state.profiler = game_logic.TickProfiler()
+    checks = []
+    is_quiet = game_state._is_quiet
+    game_state._is_quiet = lambda: checks.append(game_state.profiler.ticks) or is_quiet()
+    for _ in range(7):
+        game_state.test_faller_state()
+        game_state.time_passed()
+    assert checks == [3, 5]  # the 4th and 6th ticks, which clear nothing while the cascade goes on
+    assert game_state.profiler.cascade == 0
@@ -0,0 +1,154 @@
+import functools
+import io
+import random
+
+import pytest
+
+import game_logic
+import game_print
+import game_replay
+from scripts import new_game, random_script, run_command, split_script
+
+
+def play_until(script: str, tick: int = None,
+               config: game_logic.GameConfig = game_logic.DEFAULT_CONFIG) -> game_logic.GameState:
+    """
+    Returns:
+        GameState: The game played under config after tick empty lines,
+        before the next command, or at the end of the script if tick is None.
+    """
+    header, commands = split_script(script)
+    game_state = new_game(header, functools.partial(game_logic.GameState, config=config))
+    ticks = 0
+    for command in commands:
+        if tick is not None and ticks >= tick:
+            break
+        run_command(game_state, command)
+        ticks += command == ''
+        if game_state.game_over:
+            break
+    game_state.test_faller_state()
+    return game_state
+
+
+def record(lines: list[str], checkpoint_every: int = 0,
+           config: game_logic.GameConfig = game_logic.DEFAULT_CONFIG) -> bytes:
+    out = io.BytesIO()
+    game_replay.record_script(lines, out, checkpoint_every, config=config)
+    return out.getvalue()
+
+
+def header_size(header: list[str]) -> int:
+    """
+    Returns:
+        int: The bytes a replay of a script with this field header starts with.
+    """
+    out = bytearray(game_replay.MAGIC)
+    out.append(game_replay.VERSION)
+    game_replay.write_config(out, game_logic.DEFAULT_CONFIG)
+    game_replay.write_varint(out, int(header[0]))
+    game_replay.write_varint(out, int(header[1]))
+    out.append(header[2] == 'CONTENTS')
+    for line in header[3:]:
+        game_replay.write_text(out, line)
+    return len(out)
+
+
+@pytest.fixture
+def replay_path(tmp_path):
+    def write(data: bytes, name: str = 'game.drr') -> str:
+        path = tmp_path / name
+        path.write_bytes(data)
+        return str(path)
+    return write
+
+
+def test_state_at_matches_playing_the_script(replay_path):
+    rnd = random.Random(5)
+    for seed in range(40):
+        script = random_script(seed)
+        with game_replay.ReplayReader(replay_path(record(script.splitlines(), rnd.choice([0, 3, 10])))) as reader:
+            for tick in sorted(rnd.sample(range(reader.ticks + 1), min(6, reader.ticks + 1))):
+                if tick == reader.ticks:
+                    continue  # the end of the replay, see below
+                expected = play_until(script, tick)
+                assert game_print.format_field(reader.state_at(tick)) == game_print.format_field(expected), \
+                    f"seed {seed} tick {tick}"
+
+
+def test_last_tick_is_the_end_of_the_game(replay_path):
+    for seed in range(60):
+        script = random_script(seed)
+        expected = play_until(script)
+        with game_replay.ReplayReader(replay_path(record(script.splitlines(), 5))) as reader:
+            for tick in (reader.ticks, reader.ticks + 10):
+                game_state = reader.state_at(tick)
+                assert game_print.format_field(game_state) == game_print.format_field(expected), f"seed {seed}"
+                assert game_state.game_over == expected.game_over, f"seed {seed}"
+
+
+def test_replays_keep_the_config_they_were_recorded_with(replay_path):
+    config = game_logic.GameConfig(3, ('r', 'g'))
+    rnd = random.Random(25)
+    for seed in range(20):
+        script = random_script(seed, 'rg')
+        data = record(script.splitlines(), rnd.choice([0, 4]), config)
+        with game_replay.ReplayReader(replay_path(data)) as reader:
+            assert reader.config == config
+            for tick in sorted(rnd.sample(range(reader.ticks + 1), min(5, reader.ticks + 1))) + [reader.ticks]:
+                game_state = reader.state_at(tick)
+                assert game_state.config == config
+                expected = play_until(script, tick if tick < reader.ticks else None, config)
+                assert game_print.format_field(game_state) == game_print.format_field(expected), \
+                    f"seed {seed} tick {tick}"
+            assert record(list(reader.lines()), 0, config) == record(script.splitlines(), 0, config)
+    bound = io.BytesIO()  # the config of the engine is recorded as well
+    game_replay.record_script(script.splitlines(), bound, 0, functools.partial(game_logic.GameState, config=config))
+    assert bound.getvalue() == record(script.splitlines(), 0, config)
+
+
+def test_checkpoints_carry_the_config():
+    game_state = game_logic.GameState(game_logic.GameConfig(5, ('r', 'b', 'y', 'g')))
+    game_state.initialize_field(6, 5, 'CONTENTS', ['     ', '     ', '     ', '  G  ', ' rgg ', 'ggbyr'])
+    restored = game_logic.GameState()
+    game_replay.decode_checkpoint(game_replay.encode_checkpoint(game_state), 0, restored)
+    assert restored.config == game_state.config
+    assert restored.snapshot()[:7] == game_state.snapshot()[:7]
+    assert restored.virus_counts == game_state.virus_counts
+
+
+def test_text_records_the_same_replay(replay_path):
+    for seed in range(20):
+        data = record(random_script(seed).splitlines(), 4)
+        with game_replay.ReplayReader(replay_path(data)) as reader:
+            lines = list(reader.lines())
+        assert record(lines, 4) == data, f"seed {seed}"
+
+
+@pytest.mark.parametrize('data', [b'', b'DRMR', b'not a replay at all', b'DRMR\x01\x10'],
+                         ids=['empty', 'magic only', 'other file', 'header cut off'])
+def test_files_that_are_not_replays_are_rejected(replay_path, data):
+    with pytest.raises(ValueError):
+        game_replay.ReplayReader(replay_path(data))
+
+
+def test_truncated_recordings_play_up_to_the_cut(replay_path):
+    rnd = random.Random(16)
+    for seed in range(20):
+        script = random_script(seed)
+        data = record(script.splitlines(), 3)
+        header = header_size(split_script(script)[0])
+        with game_replay.ReplayReader(replay_path(data, 'full.drr')) as full:
+            full_lines = list(full.lines())
+            for cut in sorted(rnd.sample(range(len(data) - 1), 6)):
+                if cut < header:
+                    with pytest.raises(ValueError):
+                        game_replay.ReplayReader(replay_path(data[:cut]))
+                    continue
+                with game_replay.ReplayReader(replay_path(data[:cut])) as reader:
+                    lines = list(reader.lines())
+                    assert lines == full_lines[:len(lines)], f"seed {seed} cut {cut}"
+                    assert reader.ticks <= full.ticks
+                    for tick in range(0, reader.ticks, 7):
+                        assert game_print.format_field(reader.state_at(tick)) == \
+                            game_print.format_field(full.state_at(tick)), f"seed {seed} cut {cut} tick {tick}"
@@ -0,0 +1,111 @@
+import functools
+import io
+import random
+
+import pytest
+
+import a2
+import game_logic
+import game_print
+import game_runner
+import game_script
+from scripts import random_script
+
+CONFIGS = [game_logic.DEFAULT_CONFIG, game_logic.GameConfig(3, ('r', 'b'))]
+BAD_LINES = ['F R', 'V 1', 'V x 2 r', 'V 1 2', '"F R Y', 'F', "V 1 'x"]
+
+
+def final_frame(game_state: game_logic.GameState) -> str:
+    out = io.StringIO()
+    game_print.print_field(game_state, out)
+    if game_state.game_over:
+        game_print.game_over(out)
+    else:
+        game_print.level_cleared(game_state, out)
+    return out.getvalue()
+
+
+def outcome(play):
+    """
+    Returns:
+        tuple: The game state play() left and the type and arguments of what it raised, if anything.
+    """
+    states = []
+
+    def state_class(*args, **kwargs):
+        states.append(game_logic.GameState(*args, **kwargs))
+        return states[-1]
+
+    try:
+        play(state_class)
+    except (ValueError, IndexError) as error:
+        return states[-1], (type(error), error.args)
+    return states[-1], None
+
+
+def execute(script: str, state_class: type = game_logic.GameState) -> game_logic.GameState:
+    compiled = game_script.compile_script(script)
+    game_state = game_script.new_state(compiled, state_class)
+    game_script.execute(compiled, game_state)
+    return game_state
+
+
+@pytest.mark.parametrize('script', ['3\n4\nEMPTY\n', '3\n4\nEMPTY\nQ\n', '2\n4\nEMPTY\nF R B\n\n\n',
+                                    '2\n2\nCONTENTS\nr \n b\n\n\nQ\nF R B\n'],
+                         ids=['no commands', 'only Q', 'bottom row without Q', 'lines after Q'])
+def test_small_scripts_end_like_stream_game(script):
+    out = io.StringIO()
+    a2.stream_game(script.splitlines(), out, 'final', game_logic.GameState)
+    assert final_frame(execute(script)) == out.getvalue()
+
+
+@pytest.mark.parametrize('config', CONFIGS, ids=['default', '3-rb'])
+def test_execute_ends_like_stream_game(config):
+    state_class = functools.partial(game_logic.GameState, config=config)
+    for seed in range(60):
+        script = random_script(seed, ''.join(config.colors))
+        out = io.StringIO()
+        a2.stream_game(script.splitlines(), out, 'final', state_class)
+        assert final_frame(execute(script, state_class)) == out.getvalue(), f"seed {seed}"
+
+
+def test_errors_are_raised_where_a2_raises_them():
+    rnd = random.Random(2)
+    for seed in range(60):
+        lines = random_script(seed).splitlines()
+        lines.insert(rnd.randrange(3 if lines[2] == 'EMPTY' else 3 + int(lines[0]), len(lines)),
+                     rnd.choice(BAD_LINES))
+        script = '\n'.join(lines)
+        streamed, streamed_error = outcome(lambda state_class: a2.stream_game(lines, io.StringIO(), 'final',
+                                                                              state_class))
+
+        def play(state_class):
+            compiled = game_script.compile_script(script)
+            game_script.execute(compiled, game_script.new_state(compiled, state_class))
+
+        executed, executed_error = outcome(play)
+        assert executed_error == streamed_error, f"seed {seed}"
+        assert game_print.field_lines(executed) == game_print.field_lines(streamed), f"seed {seed}"
+
+
+@pytest.mark.parametrize('engine', ['list', 'array', 'sparse'])
+def test_play_script_reports_the_final_frame(engine):
+    if engine == 'array':
+        pytest.importorskip('numpy')
+    config = game_logic.GameConfig(3)
+    for seed in range(30):
+        script = random_script(seed)
+        reference = game_script.new_state(game_script.compile_script(script),
+                                          functools.partial(game_logic.GameState, config=config))
+        ticks = game_script.execute(game_script.compile_script(script), reference)
+        played = game_runner.play_script(script, engine, config)
+        assert played['field'] == game_print.field_lines(reference), f"seed {seed}"
+        assert played['ticks'] == ticks
+        assert played['result'] == ('GAME OVER' if reference.game_over else
+                                    'LEVEL CLEARED' if not reference.detect_viruses() else None)
+
+
+def test_compile_cached_compiles_once():
+    script = random_script(0)
+    assert game_script.compile_cached(script) is game_script.compile_cached(script)
+    assert game_script.compile_cached(script) == game_script.compile_script(script)
@@ -0,0 +1,61 @@
+import asyncio
+import io
+import random
+
+import pytest
+
+import a2
+import game_print
+import game_server
+from scripts import decode_frames, random_script
+
+
+def test_frames_round_trip_as_full_frames_and_deltas():
+    rnd = random.Random(17)
+    frames, data, previous, kinds = [], b'', None, set()
+    lines = [f"|{' ' * 8}|" for _ in range(10)]
+    for number in range(1, 60):
+        size = rnd.randint(8, 12)  # the frame may get shorter or longer
+        lines = lines[:size] + ['| R--B   |'] * (size - len(lines))
+        for _ in range(rnd.choice([0, 1, 2, 12])):
+            lines[rnd.randrange(len(lines))] = ''.join(rnd.choice(' rbyRBY*') for _ in range(10))
+        encoded = game_print.format_frame(number, list(lines), previous).encode()
+        kinds.add(encoded[:1])
+        frames.append((number, list(lines)))
+        data += encoded
+        previous = list(lines)
+    assert decode_frames(data) == frames
+    assert kinds == {b'F', b'D'}
+
+
+def test_errors_are_raised_by_the_reader():
+    with pytest.raises(ValueError, match='IndexError: list index out of range'):
+        decode_frames(b'F 1 1\nx\nE IndexError: list index out of range\n')
+
+
+async def play(server: game_server.GameServer, path: str, script: str) -> list[list[str]]:
+    reader, writer = await asyncio.open_unix_connection(path)
+    writer.write(script.encode())
+    await writer.drain()
+    frames, previous = [], None
+    while (frame := await game_server.read_frame(reader, previous)) is not None:
+        frames.append(frame[1])
+        previous = frame[1]
+    writer.close()
+    return frames
+
+
+def test_sessions_play_like_a2(tmp_path):
+    scripts = [random_script(seed) for seed in range(20)]
+    path = str(tmp_path / 'server.sock')
+
+    async def run() -> list[list[list[str]]]:
+        server = game_server.GameServer()
+        listener = await asyncio.start_unix_server(server.handle, path)
+        async with listener:
+            return await asyncio.gather(*(play(server, path, script) for script in scripts))
+
+    for script, frames in zip(scripts, asyncio.run(run())):
+        out = io.StringIO()
+        a2.stream_game(script.splitlines(), out)
+        assert ''.join(line + '\n' for frame in frames for line in frame) == out.getvalue()
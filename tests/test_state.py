@@ -0,0 +1,297 @@
+import functools
+import random
+
+import pytest
+
+import game_history
+import game_logic
+import game_print
+from scripts import new_game, random_script, run_command, split_script
+
+CONFIGS = [game_logic.DEFAULT_CONFIG, game_logic.GameConfig(3)]
+
+def games(config: game_logic.GameConfig = game_logic.DEFAULT_CONFIG, count: int = 30):
+    """
+    Yields:
+        tuple[GameState, list[str]]: A game played under config after its field header, and its commands.
+    """
+    for seed in range(count):
+        header, commands = split_script(random_script(seed, ''.join(config.colors)))
+        yield new_game(header, functools.partial(game_logic.GameState, config=config)), commands
+
+
+@pytest.mark.parametrize('config', CONFIGS, ids=['default', '3'])
+def test_clone_and_restore_continue_like_the_original(config):
+    rnd = random.Random(7)
+    for game_state, commands in games(config):
+        split = rnd.randrange(len(commands) + 1)
+        for command in commands[:split]:
+            if game_state.game_over:
+                break
+            run_command(game_state, command)
+        snapshot = game_state.snapshot()
+        clone = game_state.clone()
+        restored = game_logic.GameState()
+        restored.restore(snapshot)
+        assert restored.config == clone.config == config
+
+        for command in commands[split:]:
+            if game_state.game_over:
+                break
+            for copy in (clone, restored):
+                run_command(copy, command)
+            assert game_state.snapshot() == snapshot  # the copies share nothing with the original
+            assert game_print.format_field(clone) == game_print.format_field(restored)
+
+
+def test_empty_board_round_trips():
+    game_state = game_logic.GameState()
+    game_state.initialize_field(3, 2, 'EMPTY')
+    restored = game_logic.GameState()
+    restored.restore(game_state.snapshot())
+    assert restored.snapshot() == game_state.clone().snapshot() == game_state.snapshot()
+    assert restored.field == [[' '] * 2 for _ in range(3)]
+
+
+def test_clone_keeps_the_faller():
+    game_state = game_logic.GameState()
+    game_state.initialize_field(4, 4, 'EMPTY')
+    game_state.create_faller('R', 'B')
+    clone = game_state.clone()
+    assert clone.faller in clone.capsules and clone.faller is not game_state.faller
+    clone.move_left()
+    clone.time_passed()
+    assert game_print.format_field(game_state) != game_print.format_field(clone)
+    game_state.move_left()
+    game_state.time_passed()
+    assert game_print.format_field(game_state) == game_print.format_field(clone)
+
+
+def test_snapshot_restores_into_the_array_engine():
+    game_array = pytest.importorskip('game_array')
+    for game_state, commands in games(count=10):
+        for command in commands[:len(commands) // 2]:
+            if game_state.game_over:
+                break
+            run_command(game_state, command)
+        restored = game_array.ArrayGameState()
+        restored.restore(game_state.snapshot())
+        assert restored.snapshot() == game_state.snapshot()
+        assert game_print.format_field(restored) == game_print.format_field(game_state)
+
+
+def test_zobrist_hash_follows_every_command():
+    for game_state, commands in games():
+        for command in commands:
+            if game_state.game_over:
+                break
+            run_command(game_state, command)
+            assert game_state.zobrist == game_state.compute_zobrist()
+
+
+def test_equal_boards_hash_alike():
+    left, right = game_logic.GameState(), game_logic.GameState()
+    left.initialize_field(6, 4, 'EMPTY')
+    right.initialize_field(6, 4, 'EMPTY')
+    assert left.zobrist == right.zobrist
+    left.create_faller('R', 'B')
+    assert left.zobrist != right.zobrist
+    right.create_faller('R', 'B')
+    for game_state in (left, right):
+        game_state.move_right()
+        game_state.time_passed()
+    assert left.zobrist == right.zobrist
+    right.rotate_clockwise()
+    right.rotate_counterclockwise()
+    assert left.zobrist == right.zobrist
+    assert left.clone().zobrist == left.zobrist
+
+
+def test_transposition_table_evicts_the_least_recently_used():
+    table = game_logic.TranspositionTable(2)
+    table.put(1, 'a')
+    table.put(2, 'b')
+    assert table.get(1) == 'a'  # 2 is now the oldest
+    table.put(3, 'c')
+    assert 2 not in table and 1 in table and 3 in table
+    assert table.get(2, 'missing') == 'missing'
+    assert (table.hits, table.misses, len(table)) == (1, 1, 2)
+    with pytest.raises(ValueError):
+        game_logic.TranspositionTable(0)
+
+
+def test_time_passed_n_equals_n_ticks():
+    rnd = random.Random(3)
+    for game_state, commands in games():
+        for command in commands:
+            if game_state.game_over:
+                break
+            run_command(game_state, command)
+            if rnd.random() < 0.2:
+                ticks = rnd.randint(2, 12)
+                jumped, stepped = game_state.clone(), game_state.clone()
+                jumped.test_faller_state()
+                jumped.time_passed(ticks)
+                for _ in range(ticks):
+                    stepped.test_faller_state()
+                    stepped.time_passed()
+                assert game_print.format_field(jumped) == game_print.format_field(stepped)
+                assert jumped.zobrist == stepped.zobrist
+
+
+def test_fast_forward_drops_the_faller_in_one_call():
+    game_state = game_logic.GameState()
+    game_state.initialize_field(200, 4, 'EMPTY')
+    game_state.create_faller('R', 'B')
+    stepped = game_state.clone()
+    passed = game_state.fast_forward()
+    assert passed == 199  # 198 rows of falling, then the tick in which it lands
+    for _ in range(passed):
+        stepped.test_faller_state()
+        stepped.time_passed()
+    assert game_state.snapshot() == stepped.snapshot()
+    assert game_state.field[199] == [' ', 'R', 'B', ' ']
+
+
+def test_fast_forward_stops_when_nothing_moves():
+    game_state = game_logic.GameState()
+    game_state.initialize_field(4, 4, 'CONTENTS', ['    ', '    ', 'r   ', 'b   '])
+    assert game_state.fast_forward() == 0
+    assert game_state.fast_forward(0) == 0
+
+
+def test_time_passed_stops_counting_once_the_board_is_quiet():
+    game_state = game_logic.GameState()
+    game_state.initialize_field(6, 4, 'CONTENTS', ['    ', '    ', '    ', '    ', 'r   ', 'b   '])
+    game_state.create_faller('R', 'B')
+    assert game_state.time_passed(3) == 3
+    game_state.test_faller_state()
+    assert game_state.time_passed(50) == 2  # it lands, then it freezes and nothing moves anymore
+    game_state.test_faller_state()
+    assert game_state.field[5] == ['b', 'R', 'B', ' ']
+    assert game_state.time_passed(10) == 0
+
+
+def test_settled_board_is_only_remembered_while_it_is_settled():
+    rnd = random.Random(11)
+    for game_state, commands in games():
+        history = game_history.GameHistory(game_state)
+        for command in commands:
+            if game_state.game_over:
+                break
+            if rnd.random() < 0.15:
+                history.undo(rnd.randint(1, 3))
+            else:
+                history.run(command)
+            game_state.test_faller_state()
+            expected = not game_state.find_matching() and game_state._pieces_rest()
+            assert game_state._is_quiet() == expected
+            assert game_state.clone()._is_quiet() == expected
+
+
+def test_placed_capsules_play_like_frozen_fallers():
+    game_state = game_logic.GameState()
+    game_state.initialize_field(6, 4, 'CONTENTS', ['    ', '    ', '    ', '    ', '    ', 'b   '])
+    capsules = [(game_logic.HalfCapsule('R', 5, 1, 'frozen', 'horizontal'),
+                 game_logic.HalfCapsule('B', 5, 2, 'frozen', 'horizontal')),
+                (game_logic.HalfCapsule('B', 4, 0, 'frozen', 'vertical'),
+                 game_logic.HalfCapsule('B', 3, 0, 'frozen', 'vertical'))]
+    game_state.place_capsules(capsules)
+    dropped = game_logic.GameState()
+    dropped.initialize_field(6, 4, 'CONTENTS', ['    ', '    ', '    ', '    ', '    ', 'b   '])
+    for command in ('F R B', *[''] * 6, 'F B B', 'A', '<', *[''] * 5):
+        run_command(dropped, command)
+    assert game_print.format_field(game_state) == game_print.format_field(dropped)
+    assert game_state.zobrist == dropped.zobrist == game_state.compute_zobrist()
+    game_state.check_consistency()
+    with pytest.raises(ValueError):
+        game_state.place_capsules([(game_logic.HalfCapsule('R', 4, 1, 'frozen', 'vertical'),
+                                    game_logic.HalfCapsule('R', 3, 0, 'frozen', 'vertical'))])
+    with pytest.raises(ValueError):
+        game_state.place_capsules([(game_logic.HalfCapsule('R', 0, 3, 'frozen', 'horizontal'),
+                                    game_logic.HalfCapsule('R', 0, 4, 'frozen', 'horizontal'))])
+    assert game_state.field[4][1] == ' '  # nothing of a rejected capsule is written
+    game_state.check_consistency()
+
+
+def test_hard_drop_moves_the_faller_to_its_landing_row():
+    game_state = game_logic.GameState()
+    game_state.initialize_field(8, 4, 'CONTENTS', ['    '] * 6 + ['  r ', ' yb '])
+    game_state.create_faller('R', 'B')
+    fallen = game_state.clone()
+    while fallen.faller[0].row < 5:
+        fallen.test_faller_state()
+        fallen.time_passed()
+    game_state.hard_drop()
+    assert game_state.faller[0].row == 5
+    assert game_state.field == fallen.field
+    assert [game_state.next_occupied_row(0, col) for col in range(4)] == game_state.column_tops == [8, 5, 5, 8]
+    game_state.hard_drop()  # already resting on the viruses
+    assert game_state.field == fallen.field
+
+
+def test_hard_drop_on_the_bottom_row_changes_nothing():
+    game_state = game_logic.GameState()
+    game_state.initialize_field(2, 4, 'EMPTY')
+    game_state.create_faller('R', 'B')
+    before = game_state.snapshot()
+    game_state.hard_drop()
+    assert game_state.snapshot() == before
+
+
+def test_virus_counts_follow_clears():
+    game_state = game_logic.GameState()
+    game_state.initialize_field(5, 4, 'CONTENTS', ['    ', '    ', '    ', '   y', 'rrry'])
+    assert game_state.virus_counts == {'r': 3, 'b': 0, 'y': 2}
+    game_state.create_virus(2, 0, 'b')
+    game_state.create_virus(2, 0, 'y')  # the cell is taken
+    assert game_state.virus_counts == {'r': 3, 'b': 1, 'y': 2}
+    game_state.create_faller('Y', 'Y')
+    for command in (game_state.move_right, game_state.rotate_clockwise, game_state.move_right):
+        command()
+    for _ in range(6):
+        game_state.test_faller_state()
+        game_state.time_passed()
+        game_state.check_consistency()
+    assert game_state.virus_counts == {'r': 3, 'b': 1, 'y': 0}
+    assert game_state.field[4] == ['r', 'r', 'r', ' ']
+
+
+def test_half_capsule_copies_keep_every_slot():
+    half = game_logic.HalfCapsule('r', 2, 3, 'landed', 'horizontal')
+    half.delay = True
+    copy = half.copy()
+    assert not hasattr(half, '__dict__')
+    assert copy is not half and copy.to_tuple() == half.to_tuple()
+    assert copy.color is game_logic.HalfCapsule('R', 0, 0, 'falling').color
+
+
+@pytest.mark.parametrize('config', CONFIGS, ids=['default', '3'])
+def test_resolve_settles_like_time_passing(config):
+    for game_state, commands in games(config):
+        for command in commands:
+            if game_state.game_over:
+                break
+            run_command(game_state, command)
+            if game_state.faller:
+                continue
+            resolved, ticked = game_state.clone(), game_state.clone()
+            result = resolved.resolve()
+            ticked.time_passed(result.ticks)
+            assert game_print.format_field(resolved) == game_print.format_field(ticked)
+            assert ticked.fast_forward() == 0
+            resolved.check_consistency()
+
+
+def test_resolve_reports_a_two_step_chain():
+    game_state = game_logic.GameState()
+    game_state.initialize_field(6, 4, 'CONTENTS', ['    ', '   Y', '   R', '   R', '   R', 'yyyR'])
+    result = game_state.resolve()
+    assert result.chains == 2
+    assert result.cleared == (frozenset({(2, 3), (3, 3), (4, 3), (5, 3)}),
+                              frozenset({(5, 0), (5, 1), (5, 2), (5, 3)}))
+    assert game_state.field == [[' '] * 4 for _ in range(6)]
+    assert game_state.resolve() == game_logic.ChainResult(0, (), 0)
+    game_state.create_faller('R', 'B')
+    with pytest.raises(ValueError):
+        game_state.resolve()